@@ -1,22 +1,38 @@
 import os
+import asyncio
 import json
+import logging
+import base64
+import hashlib
 import uuid
 import atexit
+import queue
+import random
 import re
+import select
+import time
+import threading
+import unicodedata
 import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
 import psycopg2.extras
-from psycopg2.pool import SimpleConnectionPool
+from collections import Counter, OrderedDict, defaultdict, deque
+from concurrent.futures import BrokenExecutor, Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
 from contextlib import contextmanager
-from datetime import timedelta, date, datetime
-from urllib.parse import urlparse
+from datetime import timedelta, date, datetime, timezone
+from urllib.parse import urlparse, urlencode
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
-from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
-from werkzeug.security import generate_password_hash, check_password_hash
+import click
 
-from dotenv import load_dotenv
+from flask import Flask, Response, render_template, request, jsonify, session, redirect, url_for
+from flask_login import LoginManager, login_user, logout_user, login_required, current_user
+from werkzeug.security import generate_password_hash, check_password_hash
 
-load_dotenv()
+# Vercel injects the environment; a local .env is only read elsewhere
+if not os.environ.get('VERCEL'):
+    from dotenv import load_dotenv
+    load_dotenv()
 
 app = Flask(__name__, template_folder='../templates', static_folder='../static')
 
@@ -31,6 +47,10 @@ app.secret_key = SECRET_KEY
 # Set the session to last for one year
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=365)
 
+# The platform's per-request limit ("maxDuration" in vercel.json). Long-lived
+# and upstream-bound requests size their own budgets to finish inside it.
+REQUEST_MAX_SECONDS = float(os.environ.get('REQUEST_MAX_SECONDS', '20'))
+
 # Database Connection Pool
 def _with_neon_endpoint_option(dsn: str) -> str:
     """If connecting to Neon and libpq lacks SNI, append options=endpoint%3D<endpoint-id>.
@@ -55,18 +75,264 @@ def _with_neon_endpoint_option(dsn: str) -> str:
     except Exception:
         return dsn
 
-try:
+DB_POOL_MIN = int(os.environ.get('DB_POOL_MIN', '1'))
+DB_POOL_MAX = int(os.environ.get('DB_POOL_MAX', '10'))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', '10'))
+DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', '1800'))
+DB_POOL_PRE_PING_IDLE = float(os.environ.get('DB_POOL_PRE_PING_IDLE', '30'))
+
+class PoolError(Exception):
+    pass
+
+class PoolTimeout(PoolError):
+    """No connection became free within the checkout timeout."""
+
+class PooledConnection(psycopg2.extensions.connection):
+    """psycopg2 connection that remembers when it was opened and last returned.
+
+    Its cursors time every statement into the current request's metrics.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        # Names of the Statements PREPAREd on this session; None when prepared statements are off
+        self.prepared = None
+
+    def cursor(self, *args, **kwargs):
+        base = kwargs.get('cursor_factory') or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs['cursor_factory'] = _timed_cursor_class(base)
+        return super().cursor(*args, **kwargs)
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool.
+
+    Checkout blocks (up to `timeout`) instead of failing when every
+    connection is busy. Connections idle longer than `pre_ping_idle` are
+    pinged before reuse, connections older than `max_lifetime` are
+    rotated, and broken ones are replaced transparently. After a fork
+    (gunicorn --preload) the child starts with an empty pool rather than
+    sharing the parent's sockets. With `prepare_statements`, connections
+    PREPARE each Statement on first use (see run_statement).
+    """
+
+    WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self, dsn, minconn=1, maxconn=10, timeout=10.0, max_lifetime=1800.0, pre_ping_idle=30.0,
+                 prepare_statements=False):
+        self.dsn = dsn
+        self.prepare_statements = prepare_statements
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self.pre_ping_idle = pre_ping_idle
+        self._cond = threading.Condition()
+        self._idle = []
+        self._size = 0
+        self._waiting = 0
+        self._closed = False
+        self._pid = os.getpid()
+        self._orphans = []
+        self._counters = {
+            'checkouts': 0, 'waits': 0, 'timeouts': 0, 'connects': 0,
+            'broken': 0, 'recycled': 0, 'pings': 0,
+        }
+        self._wait_buckets = [0] * (len(self.WAIT_BUCKETS) + 1)
+        self._wait_sum = 0.0
+        for _ in range(minconn):
+            self._idle.append(self._connect())
+            self._size += 1
+
+    def _incr(self, counter):
+        with self._cond:
+            self._counters[counter] += 1
+
+    def _connect(self):
+        conn = psycopg2.connect(self.dsn, connection_factory=PooledConnection)
+        if self.prepare_statements:
+            conn.prepared = set()
+        self._incr('connects')
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _check_fork(self):
+        if os.getpid() == self._pid:
+            return
+        with self._cond:
+            if os.getpid() == self._pid:
+                return
+            # Closing inherited connections would terminate the parent's sessions,
+            # so keep them referenced and start over.
+            self._orphans.extend(self._idle)
+            self._idle = []
+            self._size = 0
+            self._waiting = 0
+            self._pid = os.getpid()
+
+    def _record_wait(self, waited):
+        index = 0
+        while index < len(self.WAIT_BUCKETS) and waited > self.WAIT_BUCKETS[index]:
+            index += 1
+        self._wait_buckets[index] += 1
+        self._wait_sum += waited
+
+    def _healthy(self, conn):
+        now = time.monotonic()
+        if conn.closed:
+            self._incr('broken')
+            return False
+        if now - conn.created_at > self.max_lifetime:
+            self._incr('recycled')
+            self._close_quietly(conn)
+            return False
+        if now - conn.last_used > self.pre_ping_idle:
+            self._incr('pings')
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except psycopg2.Error:
+                self._incr('broken')
+                self._close_quietly(conn)
+                return False
+        return True
+
+    def getconn(self):
+        self._check_fork()
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise PoolError("Connection pool is closed")
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.maxconn:
+                    self._size += 1
+                    conn = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeout(f"No database connection available within {self.timeout:.1f}s")
+                if not waited:
+                    waited = True
+                    self._counters['waits'] += 1
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+            self._counters['checkouts'] += 1
+            self._record_wait(time.monotonic() - start)
+
+        try:
+            if conn is not None and not self._healthy(conn):
+                conn = None
+            if conn is None:
+                conn = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        return conn
+
+    def putconn(self, conn, discard=False):
+        if os.getpid() != self._pid:
+            return
+        if not discard and not conn.closed:
+            if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+        now = time.monotonic()
+        if not discard and (conn.closed or now - conn.created_at > self.max_lifetime):
+            discard = True
+            self._incr('recycled' if not conn.closed else 'broken')
+        elif discard:
+            self._incr('broken')
+        if discard:
+            self._close_quietly(conn)
+        with self._cond:
+            if discard or self._closed:
+                self._size -= 1
+                if self._closed:
+                    self._close_quietly(conn)
+            else:
+                conn.last_used = now
+                self._idle.append(conn)
+            self._cond.notify()
+
+    def closeall(self):
+        with self._cond:
+            self._closed = True
+            for conn in self._idle:
+                self._close_quietly(conn)
+            self._size -= len(self._idle)
+            self._idle = []
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'waiting': self._waiting,
+                'max': self.maxconn,
+                **self._counters,
+                'wait_seconds': {
+                    'buckets': dict(zip([str(b) for b in self.WAIT_BUCKETS] + ['+Inf'], self._wait_buckets)),
+                    'sum': round(self._wait_sum, 6),
+                    'count': self._counters['checkouts'],
+                },
+            }
+
+# Created by the first request that needs the database, so cold starts that
+# only serve static files or cached pages never connect.
+pool = None
+_pool_lock = threading.Lock()
+
+def _create_pool():
     raw_dsn = os.environ.get('POSTGRES_URL')
     if not raw_dsn:
         raise RuntimeError("POSTGRES_URL environment variable is not set.")
-    dsn = _with_neon_endpoint_option(raw_dsn)
-    pool = SimpleConnectionPool(
-        minconn=1,
-        maxconn=10,
-        dsn=dsn
-    )
-except psycopg2.OperationalError as e:
-    raise RuntimeError(f"Could not connect to the database. Check your POSTGRES_URL. Error: {e}")
+    try:
+        return ConnectionPool(
+            _with_neon_endpoint_option(raw_dsn),
+            minconn=DB_POOL_MIN,
+            maxconn=DB_POOL_MAX,
+            timeout=DB_POOL_TIMEOUT,
+            max_lifetime=DB_POOL_MAX_LIFETIME,
+            pre_ping_idle=DB_POOL_PRE_PING_IDLE,
+            prepare_statements=_prepared_statements_supported(raw_dsn)
+        )
+    except psycopg2.OperationalError as e:
+        raise RuntimeError(f"Could not connect to the database. Check your POSTGRES_URL. Error: {e}")
+
+def get_pool(check=True):
+    """Return the process-wide pool, creating it (and checking the schema) on first use."""
+    global pool
+    if pool is None:
+        with _pool_lock:
+            if pool is None:
+                new_pool = _create_pool()
+                if check:
+                    check_schema(new_pool)
+                pool = new_pool
+    return pool
 
 @atexit.register
 def close_pool():
@@ -75,196 +341,1119 @@ def close_pool():
         print("Database connection pool closed.")
 
 @contextmanager
-def get_db_connection():
-    conn = pool.getconn()
+def _pooled_connection(db_pool):
+    with timed('pool'):
+        conn = db_pool.getconn()
+    broken = False
     try:
         yield conn
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        broken = True
+        raise
     finally:
-        pool.putconn(conn)
-
-# Database Schema Migration
-def run_migrations():
-    """Ensure base schema and feature tables for My Netflix data."""
-    required_columns = {
-        'id': "UUID PRIMARY KEY",
-        'username': "TEXT UNIQUE NOT NULL",
-        'password_hash': "TEXT NOT NULL",
-        'email': "TEXT",
-        'created_at': "TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP"
-    }
+        db_pool.putconn(conn, discard=broken or bool(conn.closed))
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            print("Checking database schema...")
+def get_db_connection():
+    return _pooled_connection(get_pool())
 
-            # Create table if missing with minimal schema
-            cur.execute("""
-                SELECT 1 FROM information_schema.tables
-                WHERE table_name='users';
-            """)
-            if cur.fetchone() is None:
-                cols_sql = ",\n                        ".join([f"{name} {ddl}" for name, ddl in required_columns.items()])
-                cur.execute(f"""
-                    CREATE TABLE users (
-                        {cols_sql}
-                    );
-                """)
-                print(" -> Created 'users' table with minimal schema.")
-            else:
-                # Drop extra columns if they exist
-                cur.execute("""
-                    SELECT column_name FROM information_schema.columns
-                    WHERE table_name='users';
-                """)
-                existing = {row[0] for row in cur.fetchall()}
-                to_drop = [c for c in existing if c not in required_columns]
-                for col in to_drop:
-                    cur.execute(f"ALTER TABLE users DROP COLUMN IF EXISTS {col};")
-                    print(f" -> Dropped extra column 'users.{col}'.")
-
-                # Ensure required columns exist
-                for name, ddl in required_columns.items():
-                    if name not in existing:
-                        cur.execute(f"ALTER TABLE users ADD COLUMN {name} {ddl};")
-                        print(f" -> Added missing column 'users.{name}'.")
-
-            # Create my_list table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS my_list (
-                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-                    tmdb_id BIGINT NOT NULL,
-                    media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
-                    data JSONB,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, media_type, tmdb_id)
-                );
-            """)
+@app.errorhandler(PoolTimeout)
+def handle_pool_timeout(e):
+    response = jsonify({'error': 'The server is busy, please retry shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
 
-            # Create likes table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS likes (
-                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-                    tmdb_id BIGINT NOT NULL,
-                    media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
-                    data JSONB,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, media_type, tmdb_id)
-                );
-            """)
+# --- Data Access ---
+# Hot-path SQL is declared once as named Statements. When prepared statements
+# are on, each pooled connection PREPAREs a statement the first time it runs
+# it and from then on sends only `EXECUTE name (args)`, so Postgres skips the
+# parse and plan. Transaction-mode poolers (PgBouncer, Neon and Supabase
+# pooler endpoints) give every transaction a different server session, so
+# they get the plain SQL instead.
+DB_PREPARED_STATEMENTS = os.environ.get('DB_PREPARED_STATEMENTS', 'auto').lower()  # auto | on | off
 
-            # Create trailers_watched table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS trailers_watched (
-                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-                    tmdb_id BIGINT NOT NULL,
-                    media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
-                    data JSONB,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, media_type, tmdb_id)
-                );
-            """)
+def _prepared_statements_supported(dsn):
+    if DB_PREPARED_STATEMENTS in {'1', 'true', 'yes', 'on'}:
+        return True
+    if DB_PREPARED_STATEMENTS != 'auto':
+        return False
+    try:
+        parsed = urlparse(dsn)
+        host, port = parsed.hostname or '', parsed.port
+    except ValueError:
+        return False
+    return not ('pooler' in host or port == 6543 or 'pgbouncer=true' in (parsed.query or ''))
 
-            # Create notifications table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS notifications (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
-                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-                    title TEXT NOT NULL,
-                    message TEXT NOT NULL,
-                    media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
-                    tmdb_id BIGINT,
-                    poster_path TEXT,
-                    notification_type TEXT NOT NULL CHECK (notification_type IN ('new_movie', 'hot_show', 'trending')),
-                    is_read BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    expires_at TIMESTAMPTZ
-                );
-            """)
+_PLACEHOLDER_RE = re.compile(r"%\((\w+)\)s|%s|%%")
 
-            # Create notification settings table
-            cur.execute("""
-                CREATE TABLE IF NOT EXISTS notification_settings (
-                    user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
-                    new_movies_enabled BOOLEAN DEFAULT TRUE,
-                    hot_shows_enabled BOOLEAN DEFAULT TRUE,
-                    trending_enabled BOOLEAN DEFAULT TRUE,
-                    email_notifications BOOLEAN DEFAULT FALSE,
-                    push_notifications BOOLEAN DEFAULT TRUE,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
-                );
-            """)
+STATEMENTS = {}
+
+class Statement:
+    """A named SQL statement using psycopg2 placeholders, either all `%s` or all `%(name)s`.
+
+    `prepare_sql` is the same text with $n parameters, for PREPARE.
+    """
+    __slots__ = ('name', 'sql', 'prepare_sql', 'param_names', 'execute_sql')
+
+    def __init__(self, name, sql):
+        if name in STATEMENTS:
+            raise ValueError(f"Duplicate statement name: {name}")
+        self.name = name
+        self.sql = sql
+        self.param_names = []
+        positional = 0
+
+        def number(match):
+            nonlocal positional
+            if match.group(0) == '%%':
+                return '%'
+            if match.group(1) is None:
+                positional += 1
+                return f'${positional}'
+            if match.group(1) not in self.param_names:
+                self.param_names.append(match.group(1))
+            return f'${self.param_names.index(match.group(1)) + 1}'
+
+        self.prepare_sql = _PLACEHOLDER_RE.sub(number, sql)
+        if positional and self.param_names:
+            raise ValueError(f"Statement {name} mixes %s and %(name)s placeholders")
+        arity = positional or len(self.param_names)
+        self.execute_sql = f"EXECUTE {name}" + (f" ({', '.join(['%s'] * arity)})" if arity else "")
+        STATEMENTS[name] = self
+
+    def args(self, params):
+        if self.param_names:
+            return [params[name] for name in self.param_names]
+        return params or ()
+
+def run_statement(cur, statement, params=None):
+    """Execute `statement` on `cur`, through the connection's prepared copy when it has one.
+
+    Returns the cursor, so `run_statement(cur, ...).fetchone()` reads naturally.
+    """
+    prepared = getattr(cur.connection, 'prepared', None)
+    if prepared is None:
+        cur.execute(statement.sql, params)
+        return cur
+    if statement.name not in prepared:
+        # Prepared statements outlive rollbacks, so the name stays valid for the session
+        cur.execute(f"PREPARE {statement.name} AS {statement.prepare_sql}")
+        prepared.add(statement.name)
+    try:
+        cur.execute(statement.execute_sql, statement.args(params))
+    except psycopg2.errors.InvalidSqlStatementName:
+        # Session reset behind our back (e.g. an undetected pooler); prepare again next time
+        prepared.discard(statement.name)
+        raise
+    return cur
+
+def tuple_cursor(conn):
+    """Cursor returning namedtuples: attribute access without a dict per row."""
+    return conn.cursor(cursor_factory=psycopg2.extras.NamedTupleCursor)
+
+# --- Request Instrumentation ---
+# Each request thread collects {kind: [count, seconds]} for 'db' (SQL
+# statements), 'pool' (connection checkouts) and 'tmdb' (waits on upstream
+# calls). after_request turns them into a Server-Timing header, a JSON log
+# line and the /metrics histograms.
+REQUEST_LOG = os.environ.get('REQUEST_LOG', '1').lower() in {'1', 'true', 'yes'}
+# Requests running more SQL statements than this are logged as warnings
+REQUEST_QUERY_WARN = int(os.environ.get('REQUEST_QUERY_WARN', '20'))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TIMING_KINDS = ('db', 'pool', 'tmdb')
+
+request_logger = logging.getLogger('netflix.requests')
+if not request_logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter('%(message)s'))
+    request_logger.addHandler(_handler)
+    request_logger.setLevel(logging.INFO)
+    request_logger.propagate = False
+
+_request_timings = threading.local()
+
+def record_timing(kind, seconds):
+    """Add one timed operation to the current request, if there is one."""
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None:
+        entry = timings[kind]
+        entry[0] += 1
+        entry[1] += seconds
+
+@contextmanager
+def timed(kind):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_timing(kind, time.perf_counter() - started)
+
+_timed_cursor_classes = {}
+
+def _timed_cursor_class(base):
+    """Subclass of cursor class `base` whose execute/executemany are timed as 'db'."""
+    cls = _timed_cursor_classes.get(base)
+    if cls is None:
+        class TimedCursor(base):
+            def execute(self, query, vars=None):
+                with timed('db'):
+                    return super().execute(query, vars)
+
+            def executemany(self, query, vars_list):
+                with timed('db'):
+                    return super().executemany(query, vars_list)
+
+        TimedCursor.__name__ = f"Timed{base.__name__}"
+        cls = _timed_cursor_classes.setdefault(base, TimedCursor)
+    return cls
+
+class RequestMetrics:
+    """Per-route latency histograms and DB / TMDB totals, in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._latency = {}   # (method, route, status) -> [bucket counts..., sum, count]
+        self._totals = {}    # (method, route) -> {kind: [count, seconds]}
+
+    def observe(self, method, route, status, seconds, timings):
+        index = 0
+        while index < len(self.buckets) and seconds > self.buckets[index]:
+            index += 1
+        with self._lock:
+            series = self._latency.setdefault((method, route, status), [0] * (len(self.buckets) + 3))
+            series[index] += 1
+            series[-2] += seconds
+            series[-1] += 1
+            totals = self._totals.setdefault((method, route), {kind: [0, 0.0] for kind in TIMING_KINDS})
+            for kind, (count, spent) in timings.items():
+                totals[kind][0] += count
+                totals[kind][1] += spent
+
+    @staticmethod
+    def _labels(**labels):
+        def escape(value):
+            return str(value).replace('\\', '\\\\').replace('"', '\\"')
+        return ','.join(f'{name}="{escape(value)}"' for name, value in labels.items())
+
+    def render(self):
+        lines = [
+            '# HELP http_request_duration_seconds Request wall time by route.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        with self._lock:
+            latency = {key: list(series) for key, series in self._latency.items()}
+            totals = {key: {k: list(v) for k, v in kinds.items()} for key, kinds in self._totals.items()}
+        for (method, route, status), series in sorted(latency.items()):
+            labels = self._labels(method=method, route=route, status=status)
+            cumulative = 0
+            for bound, count in zip([str(b) for b in self.buckets] + ['+Inf'], series):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {series[-2]:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {series[-1]}')
+        for kind, what in (('db', 'SQL statements'), ('pool', 'connection checkouts'), ('tmdb', 'TMDB waits')):
+            lines.append(f'# HELP http_request_{kind}_total {what} made while serving requests.')
+            lines.append(f'# TYPE http_request_{kind}_total counter')
+            for (method, route), kinds in sorted(totals.items()):
+                lines.append(f'http_request_{kind}_total{{{self._labels(method=method, route=route)}}} {kinds[kind][0]}')
+            lines.append(f'# HELP http_request_{kind}_seconds_total Time spent on {what} while serving requests.')
+            lines.append(f'# TYPE http_request_{kind}_seconds_total counter')
+            for (method, route), kinds in sorted(totals.items()):
+                lines.append(f'http_request_{kind}_seconds_total{{{self._labels(method=method, route=route)}}} {kinds[kind][1]:.6f}')
+        return lines
+
+request_metrics = RequestMetrics()
+
+@app.before_request
+def _start_request_timing():
+    _request_timings.current = {kind: [0, 0.0] for kind in TIMING_KINDS}
+    _request_timings.started = time.perf_counter()
+
+@app.after_request
+def _finish_request_timing(response):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is None:
+        return response
+    _request_timings.current = None
+    elapsed = time.perf_counter() - _request_timings.started
+    response.headers['Server-Timing'] = ', '.join(
+        [f'{kind};dur={spent * 1000:.1f};desc="{count}"' for kind, (count, spent) in timings.items() if count]
+        + [f'app;dur={elapsed * 1000:.1f}']
+    )
+    if request.endpoint in {'static', 'metrics'}:
+        return response
+
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    request_metrics.observe(request.method, route, response.status_code, elapsed, timings)
+    queries = timings['db'][0]
+    if REQUEST_LOG or queries > REQUEST_QUERY_WARN:
+        request_logger.log(logging.WARNING if queries > REQUEST_QUERY_WARN else logging.INFO, json.dumps({
+            'method': request.method,
+            'route': route,
+            'path': request.path,
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            **{f'{kind}_count': count for kind, (count, _) in timings.items()},
+            **{f'{kind}_ms': round(spent * 1000, 1) for kind, (_, spent) in timings.items()},
+        }, separators=(',', ':')))
+    return response
+
+@app.teardown_request
+def _clear_request_timing(exc):
+    _request_timings.current = None
+
+# TMDB fields kept in `titles`; everything the cards render. Detail views
+# fetch the full object from TMDB on demand.
+TITLE_FIELDS = (
+    'title', 'name', 'original_title', 'original_name', 'overview',
+    'poster_path', 'backdrop_path', 'release_date', 'first_air_date',
+    'vote_average', 'genres', 'genre_ids', 'runtime', 'episode_run_time',
+    'number_of_seasons', 'original_language', 'adult',
+)
+
+# --- Schema Migrations ---
+# Versioned schema steps, applied in order and recorded in schema_migrations.
+# Startup only compares the recorded version with SCHEMA_VERSION; DDL runs
+# when something is pending (or via `flask migrate`), never on every boot.
+DB_MIGRATE_ON_START = os.environ.get('DB_MIGRATE_ON_START', 'auto').lower()  # auto | check | off
+MIGRATION_LOCK_ID = 0x6e666c78  # pg_advisory_xact_lock key shared by all instances
+
+USERS_REQUIRED_COLUMNS = {
+    'id': "UUID PRIMARY KEY",
+    'username': "TEXT UNIQUE NOT NULL",
+    'password_hash': "TEXT NOT NULL",
+    'email': "TEXT",
+    'created_at': "TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP"
+}
+
+def _migrate_base_schema(cur):
+    """users, the per-user collections, notifications and reminders."""
+    cols_sql = ",\n                ".join(f"{name} {ddl}" for name, ddl in USERS_REQUIRED_COLUMNS.items())
+    cur.execute(f"""
+        CREATE TABLE IF NOT EXISTS users (
+            {cols_sql}
+        );
+    """)
+    # Older databases may predate some columns; extra columns are left alone
+    for name, ddl in USERS_REQUIRED_COLUMNS.items():
+        if name != 'id':
+            cur.execute(f"ALTER TABLE users ADD COLUMN IF NOT EXISTS {name} {ddl};")
+
+    # Create my_list table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS my_list (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            tmdb_id BIGINT NOT NULL,
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            data JSONB,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, media_type, tmdb_id)
+        );
+    """)
+
+    # Create likes table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS likes (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            tmdb_id BIGINT NOT NULL,
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            data JSONB,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, media_type, tmdb_id)
+        );
+    """)
+
+    # Create trailers_watched table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS trailers_watched (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            tmdb_id BIGINT NOT NULL,
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            data JSONB,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, media_type, tmdb_id)
+        );
+    """)
+
+    # Create notifications table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notifications (
+            id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            tmdb_id BIGINT,
+            poster_path TEXT,
+            notification_type TEXT NOT NULL CHECK (notification_type IN ('new_movie', 'hot_show', 'trending')),
+            is_read BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            expires_at TIMESTAMPTZ
+        );
+    """)
+
+    # Create notification settings table
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notification_settings (
+            user_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+            new_movies_enabled BOOLEAN DEFAULT TRUE,
+            hot_shows_enabled BOOLEAN DEFAULT TRUE,
+            trending_enabled BOOLEAN DEFAULT TRUE,
+            email_notifications BOOLEAN DEFAULT FALSE,
+            push_notifications BOOLEAN DEFAULT TRUE,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+    # Create reminders table for upcoming releases
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS reminders (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            tmdb_id BIGINT NOT NULL,
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            title TEXT,
+            poster_path TEXT,
+            release_date DATE NOT NULL,
+            notified BOOLEAN DEFAULT FALSE,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, media_type, tmdb_id)
+        );
+    """)
+
+    # Create indexes for notifications
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_type
+        ON notifications(user_id, notification_type, created_at DESC);
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_unread
+        ON notifications(user_id, is_read, created_at DESC);
+    """)
+
+def _migrate_tmdb_cache(cur):
+    # Shared TMDB response cache (used when TMDB_SHARED_CACHE is enabled)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS tmdb_cache (
+            cache_key TEXT PRIMARY KEY,
+            body JSONB NOT NULL,
+            expires_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+def _migrate_catalog_snapshots(cur):
+    # Precomputed browse / New & Hot rows per region
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS catalog_snapshots (
+            region TEXT PRIMARY KEY,
+            payload JSONB NOT NULL,
+            etag TEXT NOT NULL,
+            built_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
+        );
+    """)
+
+def _migrate_notification_indexes(cur):
+    # Global reminder dispatch scans due, unnotified reminders
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_reminders_due
+        ON reminders(notified, release_date);
+    """)
+
+    # Keyset pagination over a user's whole feed
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_created
+        ON notifications(user_id, created_at DESC, id DESC);
+    """)
+
+def _migrate_notification_events(cur):
+    # Shared TMDB feed items, fetched once and fanned out to users
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notification_events (
+            id BIGSERIAL PRIMARY KEY,
+            feed TEXT NOT NULL,
+            notification_type TEXT NOT NULL CHECK (notification_type IN ('new_movie', 'hot_show', 'trending')),
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            tmdb_id BIGINT NOT NULL,
+            title TEXT NOT NULL,
+            message TEXT NOT NULL,
+            poster_path TEXT,
+            created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            last_seen_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (notification_type, media_type, tmdb_id)
+        );
+    """)
+
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS notification_feeds (
+            feed TEXT PRIMARY KEY,
+            fetched_at TIMESTAMPTZ NOT NULL
+        );
+    """)
+
+    # Fan-out rows reference the shared event instead of copying its text
+    cur.execute("""
+        ALTER TABLE notifications
+            ADD COLUMN IF NOT EXISTS event_id BIGINT REFERENCES notification_events(id) ON DELETE CASCADE,
+            ALTER COLUMN title DROP NOT NULL,
+            ALTER COLUMN message DROP NOT NULL;
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_event
+        ON notifications(user_id, event_id) WHERE event_id IS NOT NULL;
+    """)
+
+def _migrate_collection_versions(cur):
+    # Per-user change counters for my_list, likes and trailers_watched
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS collection_versions (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            collection TEXT NOT NULL,
+            version BIGINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, collection)
+        );
+    """)
+
+def _migrate_titles(cur):
+    # TMDB metadata stored once per title; the user tables keep only keys
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS titles (
+            media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
+            tmdb_id BIGINT NOT NULL,
+            data JSONB NOT NULL,
+            updated_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (media_type, tmdb_id)
+        );
+    """)
+
+    # Move legacy per-row blobs into titles (newest copy wins); the columns
+    # themselves are dropped by drop_collection_data
+    cur.execute("""
+        INSERT INTO titles (media_type, tmdb_id, data)
+        SELECT DISTINCT ON (media_type, tmdb_id)
+               media_type, tmdb_id,
+               (SELECT COALESCE(jsonb_object_agg(key, value), '{}'::jsonb)
+                FROM jsonb_each(data) WHERE key = ANY(%s))
+        FROM (
+            SELECT media_type, tmdb_id, data, created_at FROM my_list WHERE data IS NOT NULL
+            UNION ALL
+            SELECT media_type, tmdb_id, data, created_at FROM likes WHERE data IS NOT NULL
+            UNION ALL
+            SELECT media_type, tmdb_id, data, created_at FROM trailers_watched WHERE data IS NOT NULL
+        ) legacy
+        WHERE jsonb_typeof(data) = 'object'
+        ORDER BY media_type, tmdb_id, created_at DESC
+        ON CONFLICT (media_type, tmdb_id) DO NOTHING;
+    """, (list(TITLE_FIELDS),))
+
+def _migrate_collection_changes(cur):
+    # Adds/removes per collection version, for ?since_version= deltas
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS collection_changes (
+            user_id UUID REFERENCES users(id) ON DELETE CASCADE,
+            collection TEXT NOT NULL,
+            version BIGINT NOT NULL,
+            media_type TEXT NOT NULL,
+            tmdb_id BIGINT NOT NULL,
+            op TEXT NOT NULL CHECK (op IN ('add', 'remove')),
+            PRIMARY KEY (user_id, collection, version, media_type, tmdb_id)
+        );
+    """)
+
+def _migrate_title_neighbors(cur):
+    # Top-K similar titles per title, rebuilt by `flask build-recommendations`
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS title_neighbors (
+            media_type TEXT NOT NULL,
+            tmdb_id BIGINT NOT NULL,
+            rank SMALLINT NOT NULL,
+            neighbor_media_type TEXT NOT NULL,
+            neighbor_tmdb_id BIGINT NOT NULL,
+            score REAL NOT NULL,
+            PRIMARY KEY (media_type, tmdb_id, rank)
+        );
+    """)
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS recommender_builds (
+            id SERIAL PRIMARY KEY,
+            built_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
+            interactions BIGINT NOT NULL,
+            titles INTEGER NOT NULL,
+            neighbors BIGINT NOT NULL,
+            seconds REAL NOT NULL
+        );
+    """)
+
+def _migrate_notification_retention(cur):
+    # Stamp an expiry on existing rows so the sweeper can reach them
+    cur.execute(
+        "UPDATE notifications SET expires_at = " + _expires_at_sql('notification_type', 'created_at')
+        + " WHERE expires_at IS NULL;"
+    )
+
+    # Keep the first notification per user and title; the inserts now skip repeats
+    cur.execute("""
+        WITH removed AS (
+            DELETE FROM notifications n
+            USING notifications d
+            WHERE n.user_id = d.user_id AND n.notification_type = d.notification_type
+              AND n.media_type = d.media_type AND n.tmdb_id = d.tmdb_id
+              AND (n.created_at, n.id) > (d.created_at, d.id)
+            RETURNING n.user_id
+        )
+        INSERT INTO collection_versions (user_id, collection, version)
+        SELECT DISTINCT user_id, 'notifications', 1 FROM removed WHERE user_id IS NOT NULL
+        ON CONFLICT (user_id, collection)
+        DO UPDATE SET version = collection_versions.version + 1;
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_title
+        ON notifications(user_id, tmdb_id, notification_type);
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_expires
+        ON notifications(expires_at);
+    """)
+
+def _migrate_user_lookup_indexes(cur):
+    # get_user_by_identifier matches emails case-insensitively
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_email_lower
+        ON users (LOWER(email));
+    """)
+
+    # Prefix scans (LIKE 'base%') when allocating a username suffix
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_users_username_prefix
+        ON users (username text_pattern_ops);
+    """)
+
+def _migrate_notification_feed_leases(cur):
+    # A claim is a lease; fetched_at only moves once the fetch has succeeded
+    cur.execute("""
+        ALTER TABLE notification_feeds
+            ADD COLUMN IF NOT EXISTS claimed_at TIMESTAMPTZ;
+    """)
 
-            # Create reminders table for upcoming releases
+def _migrate_notification_poll_xid(cur):
+    # Polls page by the inserting transaction, which, unlike created_at, a
+    # late commit cannot slip behind
+    cur.execute("""
+        ALTER TABLE notifications
+            ADD COLUMN IF NOT EXISTS created_xid xid8 NOT NULL DEFAULT pg_current_xact_id();
+    """)
+
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_xid
+        ON notifications(user_id, created_xid, id);
+    """)
+
+def _migrate_notification_expiry_index(cur):
+    # Notification ETags include the user's next expiry (one index probe)
+    cur.execute("""
+        CREATE INDEX IF NOT EXISTS idx_notifications_user_expires
+        ON notifications(user_id, expires_at);
+    """)
+
+def _migrate_unique_user_email(cur):
+    # Emails are unique case-insensitively from now on. Accounts that already
+    # share an email keep working: all but the oldest are marked and left out
+    # of the index, which new signups still cannot slip past.
+    cur.execute("""
+        ALTER TABLE users
+            ADD COLUMN IF NOT EXISTS email_duplicate_of UUID;
+    """)
+
+    cur.execute("""
+        UPDATE users u
+        SET email_duplicate_of = d.keep
+        FROM (
+            SELECT id, FIRST_VALUE(id) OVER (PARTITION BY LOWER(email) ORDER BY created_at NULLS LAST, id) AS keep
+            FROM users
+            WHERE email IS NOT NULL
+        ) d
+        WHERE u.id = d.id AND d.id <> d.keep;
+    """)
+
+    cur.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_users_email_unique
+        ON users (LOWER(email)) WHERE email_duplicate_of IS NULL;
+    """)
+
+def _migrate_drop_collection_data(cur):
+    # Nothing reads the per-row blobs since titles took them over (step 7).
+    # Dropping the column is a catalog change; the space returns as rows are
+    # rewritten or vacuumed, with no full-table UPDATE.
+    for table in ('my_list', 'likes', 'trailers_watched'):
+        cur.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS data;")
+
+# (version, name, step). Append only; never edit a step that has shipped.
+MIGRATIONS = [
+    (1, 'base_schema', _migrate_base_schema),
+    (2, 'tmdb_cache', _migrate_tmdb_cache),
+    (3, 'catalog_snapshots', _migrate_catalog_snapshots),
+    (4, 'notification_indexes', _migrate_notification_indexes),
+    (5, 'notification_events', _migrate_notification_events),
+    (6, 'collection_versions', _migrate_collection_versions),
+    (7, 'titles', _migrate_titles),
+    (8, 'collection_changes', _migrate_collection_changes),
+    (9, 'title_neighbors', _migrate_title_neighbors),
+    (10, 'notification_retention', _migrate_notification_retention),
+    (11, 'user_lookup_indexes', _migrate_user_lookup_indexes),
+    (12, 'notification_feed_leases', _migrate_notification_feed_leases),
+    (13, 'notification_poll_xid', _migrate_notification_poll_xid),
+    (14, 'notification_expiry_index', _migrate_notification_expiry_index),
+    (15, 'unique_user_email', _migrate_unique_user_email),
+    (16, 'drop_collection_data', _migrate_drop_collection_data),
+]
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+def current_schema_version(cur):
+    """Highest applied migration, or 0 on a database that predates schema_migrations."""
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cur.fetchone()[0]:
+        return 0
+    cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cur.fetchone()[0]
+
+def apply_migrations(db_pool):
+    """Apply pending migrations in one transaction; returns the versions applied.
+
+    An advisory lock serialises instances that boot at the same time: the
+    first one migrates, the rest wait and then find nothing left to do.
+    """
+    with _pooled_connection(db_pool) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
             cur.execute("""
-                CREATE TABLE IF NOT EXISTS reminders (
-                    user_id UUID REFERENCES users(id) ON DELETE CASCADE,
-                    tmdb_id BIGINT NOT NULL,
-                    media_type TEXT NOT NULL CHECK (media_type IN ('movie','tv')),
-                    title TEXT,
-                    poster_path TEXT,
-                    release_date DATE NOT NULL,
-                    notified BOOLEAN DEFAULT FALSE,
-                    created_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, media_type, tmdb_id)
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMPTZ DEFAULT CURRENT_TIMESTAMP
                 );
             """)
+            current = current_schema_version(cur)
+            applied = []
+            for version, name, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                print(f" -> Applying migration {version} ({name})...")
+                step(cur)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                    (version, name)
+                )
+                applied.append(version)
+        conn.commit()
+    return applied
 
-            # Create indexes for notifications
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_notifications_user_type
-                ON notifications(user_id, notification_type, created_at DESC);
-            """)
-            
-            cur.execute("""
-                CREATE INDEX IF NOT EXISTS idx_notifications_unread
-                ON notifications(user_id, is_read, created_at DESC);
-            """)
+def check_schema(db_pool):
+    """Run when the pool is created: one version query, migrating only when something is pending."""
+    if DB_MIGRATE_ON_START == 'off':
+        return
+    with _pooled_connection(db_pool) as conn:
+        with conn.cursor() as cur:
+            current = current_schema_version(cur)
+        conn.rollback()
+    if current >= SCHEMA_VERSION:
+        return
+    if DB_MIGRATE_ON_START == 'check':
+        print(f"WARNING: database schema is at version {current}, code expects {SCHEMA_VERSION}. "
+              f"Run `flask --app api/main.py migrate`.")
+        return
+    applied = apply_migrations(db_pool)
+    if applied:
+        print(f"Schema migrated to version {applied[-1]}.")
 
-            conn.commit()
-            print("Schema check complete (users, my_list, likes, trailers_watched, notifications, notification_settings).")
+@app.cli.command('migrate')
+@click.option('--status', is_flag=True, help='Show the schema version and pending migrations without applying them.')
+def migrate_command(status):
+    """Apply pending schema migrations."""
+    db_pool = get_pool(check=False)
+    if status:
+        with _pooled_connection(db_pool) as conn:
+            with conn.cursor() as cur:
+                current = current_schema_version(cur)
+            conn.rollback()
+        pending = [f"{version} ({name})" for version, name, _ in MIGRATIONS if version > current]
+        click.echo(f"Schema version {current} of {SCHEMA_VERSION}; pending: {', '.join(pending) or 'none'}")
+        return
+    applied = apply_migrations(db_pool)
+    click.echo(f"Applied migrations: {', '.join(map(str, applied))}" if applied else "Schema is up to date.")
+
+
+# --- Caching ---
+class TTLCache:
+    """Thread-safe LRU cache whose entries expire after a per-entry TTL.
+
+    With `stale_ttl`, expired entries are kept that much longer so callers
+    can fall back to them through `get_stale()`.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300, stale_ttl=0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            now = time.monotonic()
+            if expires_at <= now:
+                if expires_at + self.stale_ttl <= now:
+                    del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def get_stale(self, key, default=None):
+        """Return an entry even if expired, as long as it is within the stale window."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return default
+            value, expires_at = entry
+            if expires_at + self.stale_ttl <= time.monotonic():
+                del self._data[key]
+                return default
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
 
-run_migrations()
+    def __len__(self):
+        return len(self._data)
+
+USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', '300'))
+USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', '4096'))
+# Trust the identity stored in the signed session cookie instead of reloading the user row
+SESSION_IDENTITY = os.environ.get('SESSION_IDENTITY', '').lower() in {'1', 'true', 'yes'}
+
+class User:
+    """Flask-Login user. Uses __slots__ so thousands can sit in the user cache cheaply."""
+    __slots__ = ('id', 'username', 'password_hash', 'email')
+
+    is_authenticated = True
+    is_active = True
+    is_anonymous = False
 
-class User(UserMixin):
     def __init__(self, id, username, password_hash, email=None):
         self.id = id
         self.username = username
         self.password_hash = password_hash
         self.email = email
 
-def get_user_by_username(username):
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT id, username, password_hash, email FROM users WHERE username = %s;", (username,))
-            user_data = cur.fetchone()
-            if user_data:
-                return User(id=user_data['id'], username=user_data['username'], password_hash=user_data['password_hash'], email=user_data.get('email'))
-    return None
+    def get_id(self):
+        return str(self.id)
+
+    def __eq__(self, other):
+        return isinstance(other, User) and self.get_id() == other.get_id()
+
+    def __hash__(self):
+        return hash(self.get_id())
+
+_user_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_TTL)
+
+def _user_from_row(row):
+    return User(id=row.id, username=row.username, password_hash=row.password_hash, email=row.email)
+
+_USER_BY_ID_SQL = Statement('user_by_id', "SELECT id, username, password_hash, email FROM users WHERE id = %s")
+
+# Username or (case-insensitive) email; an exact username match wins
+_USER_BY_IDENTIFIER_SQL = Statement('user_by_identifier', """
+    SELECT id, username, password_hash, email FROM users
+    WHERE username = %(identifier)s OR LOWER(email) = LOWER(%(identifier)s)
+    ORDER BY username = %(identifier)s DESC
+    LIMIT 1
+""")
 
 def get_user_by_id(user_id):
     with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT id, username, password_hash, email FROM users WHERE id = %s;", (user_id,))
-            user_data = cur.fetchone()
-            if user_data:
-                return User(id=user_data['id'], username=user_data['username'], password_hash=user_data['password_hash'], email=user_data.get('email'))
-    return None
-
-def get_user_by_email(email):
-    if not email:
+        with tuple_cursor(conn) as cur:
+            user_data = run_statement(cur, _USER_BY_ID_SQL, (user_id,)).fetchone()
+    return _user_from_row(user_data) if user_data else None
+
+def get_user_by_identifier(identifier):
+    """Find a user by username or (case-insensitive) email in one query; usernames win."""
+    if not identifier:
         return None
     with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute("SELECT id, username, password_hash, email FROM users WHERE LOWER(email) = LOWER(%s);", (email,))
-            user_data = cur.fetchone()
-            if user_data:
-                return User(id=user_data['id'], username=user_data['username'], password_hash=user_data['password_hash'], email=user_data.get('email'))
-    return None
+        with tuple_cursor(conn) as cur:
+            user_data = run_statement(cur, _USER_BY_IDENTIFIER_SQL, {'identifier': identifier}).fetchone()
+    return _user_from_row(user_data) if user_data else None
+
+_EMAIL_TAKEN_SQL = Statement('email_taken', """
+    SELECT EXISTS (SELECT 1 FROM users WHERE LOWER(email) = LOWER(%s))
+""")
+
+def email_taken(email):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            return run_statement(cur, _EMAIL_TAKEN_SQL, (email,)).fetchone()[0]
+
+# Inserts the user unless the email is taken. With %(derive)s the username is
+# the base or, if that is taken, base + the first free numeric suffix (1, 2, ...).
+# A conflict on either unique index inserts nothing; create_user then retries.
+_CREATE_USER_SQL = Statement('create_user', """
+    WITH email_taken AS (
+        SELECT EXISTS (SELECT 1 FROM users WHERE LOWER(email) = LOWER(%(email)s)) AS taken
+    ), used AS (
+        -- One prefix range scan; suffixes are written without leading zeros
+        SELECT substr(username, %(suffix_at)s)::bigint AS suffix
+        FROM users
+        WHERE %(derive)s AND username LIKE %(prefix)s ESCAPE '!'
+          AND substr(username, %(suffix_at)s) ~ '^[1-9][0-9]{0,17}$'
+    ), candidate AS (
+        SELECT CASE
+            WHEN NOT %(derive)s OR NOT EXISTS (SELECT 1 FROM users WHERE username = %(username)s)
+                THEN %(username)s
+            ELSE %(username)s || (
+                SELECT MIN(c.suffix)
+                FROM (SELECT 1::bigint AS suffix UNION ALL SELECT suffix + 1 FROM used) c
+                WHERE NOT EXISTS (SELECT 1 FROM used u WHERE u.suffix = c.suffix)
+            )
+        END AS username
+    ), inserted AS (
+        INSERT INTO users (id, username, password_hash, email)
+        SELECT %(id)s, c.username, %(password_hash)s, %(email)s
+        FROM candidate c, email_taken e
+        WHERE NOT e.taken
+        ON CONFLICT DO NOTHING
+        RETURNING id, username, password_hash, email
+    )
+    SELECT i.id, i.username, i.password_hash, i.email, e.taken AS email_taken,
+           EXISTS (SELECT 1 FROM users u WHERE u.username = c.username) AS username_taken
+    FROM email_taken e
+    CROSS JOIN candidate c
+    LEFT JOIN inserted i ON TRUE
+""")
+
+def create_user(email, password_hash, username=None, attempts=3):
+    """Insert a user in one round trip; returns (User, None) or (None, error message).
+
+    Without a username one is derived from the email. A concurrent signup
+    can claim the same derived name or email first; the insert then does
+    nothing and we try again, which reports the email as taken or picks the
+    next free name.
+    """
+    derive = not username
+    if derive:
+        username = email.split('@')[0] or 'user'
+    prefix = username.replace('!', '!!').replace('%', '!%').replace('_', '!_') + '%'
+    for _ in range(attempts):
+        with get_db_connection() as conn:
+            with tuple_cursor(conn) as cur:
+                row = run_statement(cur, _CREATE_USER_SQL, {
+                    'id': str(uuid.uuid4()), 'email': email, 'password_hash': password_hash,
+                    'username': username, 'derive': derive, 'prefix': prefix, 'suffix_at': len(username) + 1,
+                }).fetchone()
+            conn.commit()
+        if row.id is not None:
+            return _user_from_row(row), None
+        if row.email_taken:
+            return None, 'Email already exists.'
+        if not derive and row.username_taken:
+            return None, 'Username already exists.'
+    return None, 'Could not allocate a username, please try again.'
+
+def invalidate_user(user_id):
+    """Drop a cached user; call after logout or any change to the user's credentials."""
+    _user_cache.pop(str(user_id))
+
+def _remember_identity(user):
+    """Log the user in and, if enabled, carry their identity in the signed session."""
+    login_user(user)
+    session.permanent = True
+    _user_cache.set(str(user.id), user)
+    if SESSION_IDENTITY:
+        session['identity'] = {'id': str(user.id), 'username': user.username, 'email': user.email}
 
 @login_manager.user_loader
 def load_user(user_id):
-    return get_user_by_id(user_id)
+    user = _user_cache.get(user_id)
+    if user is not None:
+        return user
+
+    identity = session.get('identity') if SESSION_IDENTITY else None
+    if identity and identity.get('id') == user_id:
+        user = User(id=user_id, username=identity.get('username'), password_hash=None, email=identity.get('email'))
+    else:
+        user = get_user_by_id(user_id)
+    if user is not None:
+        _user_cache.set(user_id, user)
+    return user
+
+# --- Password Hashing ---
+# Werkzeug method for new hashes, e.g. "scrypt", "scrypt:16384:8:1" or
+# "pbkdf2:sha256:600000". Older hashes are upgraded on the next login.
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', str(os.cpu_count() or 1)))
+# Hashes allowed to wait for a worker before logins are turned away with 503
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', str(PASSWORD_HASH_WORKERS * 4)))
+PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', '10'))
+# Threads by default: hashlib's scrypt and PBKDF2 release the GIL while they run.
+# Set to 1 for a forkserver process pool instead.
+PASSWORD_HASH_PROCESSES = os.environ.get('PASSWORD_HASH_PROCESSES', '0').lower() in {'1', 'true', 'yes'}
+
+class HashingBusy(Exception):
+    """Raised when the password hashing queue is full or a hash took too long."""
+
+class PasswordHasher:
+    """Runs werkzeug hashing on a bounded worker pool off the request thread.
+
+    Workers are threads unless `use_processes` is set. Process workers come
+    from a forkserver started when the hasher is built, at import time and
+    before the app starts any threads. Forking the multi-threaded server
+    itself could hand a child a lock held by another thread. The thread
+    pool is used whenever processes are unavailable (no /dev/shm on some
+    serverless hosts). At most `workers + max_pending` hashes are accepted
+    at once; beyond that `HashingBusy` is raised immediately rather than
+    letting requests pile up behind the CPU.
+    """
+
+    def __init__(self, workers=PASSWORD_HASH_WORKERS, max_pending=PASSWORD_HASH_QUEUE,
+                 use_processes=PASSWORD_HASH_PROCESSES):
+        self.workers = max(1, workers)
+        self.use_processes = use_processes
+        self._slots = threading.BoundedSemaphore(self.workers + max(0, max_pending))
+        self._lock = threading.Lock()
+        self._executor = None
+        self.kind = None
+        self.completed = 0
+        self.rejected = 0
+        self._context = self._start_forkserver() if use_processes else None
+
+    @staticmethod
+    def _start_forkserver():
+        try:
+            import multiprocessing
+            import multiprocessing.forkserver
+            context = multiprocessing.get_context('forkserver')
+            # Workers only need werkzeug, not a re-import of the app's __main__
+            context.set_forkserver_preload(['werkzeug.security'])
+            multiprocessing.forkserver.ensure_running()
+            return context
+        except (ImportError, OSError, ValueError) as e:
+            print(f"Password hashing falls back to threads: {e}")
+            return None
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                if self._context is not None:
+                    try:
+                        from concurrent.futures import ProcessPoolExecutor
+                        self._executor = ProcessPoolExecutor(self.workers, mp_context=self._context)
+                        self.kind = 'process'
+                    except (ImportError, OSError, NotImplementedError) as e:
+                        print(f"Password hashing falls back to threads: {e}")
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix='password-hash')
+                    self.kind = 'thread'
+            return self._executor
+
+    def _discard(self, executor):
+        """Drop a broken pool; the next request starts a fresh one."""
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+        executor.shutdown(wait=False)
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise HashingBusy()
+        executor = None
+        try:
+            executor = self._get_executor()
+            future = executor.submit(fn, *args)
+        except (BrokenExecutor, RuntimeError):
+            # A worker died, or another request already shut this pool down
+            self._slots.release()
+            if executor is not None:
+                self._discard(executor)
+            raise HashingBusy()
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=PASSWORD_HASH_TIMEOUT)
+        except FutureTimeoutError:
+            raise HashingBusy()
+        except BrokenExecutor:
+            self._discard(executor)
+            raise HashingBusy()
+        with self._lock:
+            self.completed += 1
+        return result
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, PASSWORD_HASH_METHOD)
+
+    def verify(self, pwhash, password):
+        return self._run(check_password_hash, pwhash, password)
+
+    def stats(self):
+        return {'kind': self.kind, 'workers': self.workers, 'completed': self.completed, 'rejected': self.rejected}
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+password_hasher = PasswordHasher()
+atexit.register(password_hasher.close)
+
+def password_hash_is_current(pwhash):
+    """True if `pwhash` was made with PASSWORD_HASH_METHOD (or its defaults)."""
+    params = (pwhash or '').split('$', 1)[0]
+    return params == PASSWORD_HASH_METHOD or params.startswith(PASSWORD_HASH_METHOD + ':')
+
+def _upgrade_password_hash(user, password):
+    """Re-hash with the configured method after a successful login."""
+    new_hash = password_hasher.hash(password)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s",
+                (new_hash, str(user.id), user.password_hash)
+            )
+        conn.commit()
+    invalidate_user(user.id)
+    user.password_hash = new_hash
+
+@app.errorhandler(HashingBusy)
+def handle_hashing_busy(e):
+    response = jsonify({'success': False, 'message': 'Too many sign-in attempts right now, please retry shortly.'})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
 
 # Authentication Routes
 @app.route('/login', methods=['GET', 'POST'])
@@ -276,13 +1465,14 @@ def login_page():
                       or data.get('email'))
         password = data.get('password')
 
-        user = None
-        if identifier:
-            # Try username first, then email
-            user = get_user_by_username(identifier) or get_user_by_email(identifier)
-        if user and check_password_hash(user.password_hash, password):
-            login_user(user)
-            session.permanent = True
+        user = get_user_by_identifier(identifier) if password else None
+        if user and password_hasher.verify(user.password_hash, password):
+            if not password_hash_is_current(user.password_hash):
+                try:
+                    _upgrade_password_hash(user, password)
+                except HashingBusy:
+                    pass  # upgrade on a quieter login
+            _remember_identity(user)
             return jsonify({'success': True, 'message': 'Logged in successfully!', 'redirect': '/browse'})
         return jsonify({'success': False, 'message': 'Invalid username or password.'}), 401
     return render_template('auth/login.html')
@@ -301,45 +1491,31 @@ def register():
     if not email or not password:
         return jsonify({'success': False, 'message': 'Email and password are required.'}), 400
 
-    # Check if email already exists
-    if get_user_by_email(email):
+    # Turn away taken emails before spending a hashing slot on them;
+    # create_user checks again atomically
+    if email_taken(email):
         return jsonify({'success': False, 'message': 'Email already exists.'}), 409
 
-    # Derive username from email if not provided
-    if not username:
-        base = email.split('@')[0]
-        candidate = base or 'user'
-        suffix = 1
-        while get_user_by_username(candidate):
-            candidate = f"{base}{suffix}"
-            suffix += 1
-        username = candidate
-    else:
-        if get_user_by_username(username):
-            return jsonify({'success': False, 'message': 'Username already exists.'}), 409
-
-    new_user_id = str(uuid.uuid4())
-    hashed_password = generate_password_hash(password)
-
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            cur.execute(
-                "INSERT INTO users (id, username, password_hash, email) VALUES (%s, %s, %s, %s);",
-                (new_user_id, username, hashed_password, email)
-            )
-        conn.commit()
-
-    new_user = get_user_by_id(new_user_id)
-    login_user(new_user)
-    session.permanent = True
+    # Username is derived from the email when not provided
+    new_user, error = create_user(email, password_hasher.hash(password), username or None)
+    if new_user is None:
+        return jsonify({'success': False, 'message': error}), 409
+    _remember_identity(new_user)
     return jsonify({'success': True, 'message': 'Registration successful!', 'redirect': '/browse'})
 
 @app.route('/logout', methods=['POST'])
 @login_required
 def logout():
+    invalidate_user(current_user.id)
     logout_user()
+    session.pop('identity', None)
     return jsonify({'success': True, 'message': 'Logged out successfully.', 'redirect': '/'})
 
+# Pages only open the notification stream where the server offers one
+@app.context_processor
+def realtime_context():
+    return {'realtime_notifications': REALTIME_NOTIFICATIONS}
+
 # Root route - redirect to browse
 @app.route("/")
 def index():
@@ -355,12 +1531,7 @@ def home():
 @app.route("/my-netflix")
 @login_required
 def my_netflix():
-    user_id = _uuid_str(current_user.id)
-    initial_payload = {
-        'myList': _load_user_collection('my_list', user_id),
-        'likes': _load_user_collection('likes', user_id),
-        'trailers': _load_user_collection('trailers_watched', user_id)
-    }
+    initial_payload = _load_user_library(_uuid_str(current_user.id))
     return render_template("my-netflix.html", initial_payload=initial_payload, username=current_user.username)
 
 # Notifications page
@@ -379,71 +1550,274 @@ def new_hot_page():
 def _uuid_str(u):
     return str(u) if isinstance(u, uuid.UUID) else u
 
-def _load_user_collection(table_name: str, user_id: str):
-    if table_name not in {'my_list', 'likes', 'trailers_watched'}:
-        raise ValueError("Invalid collection table requested")
+# Response key -> table for the per-user title collections
+USER_COLLECTIONS = {'myList': 'my_list', 'likes': 'likes', 'trailers': 'trailers_watched'}
+
+def _collection_items_sql(table_name: str) -> str:
+    """Scalar subquery returning a user's collection as a JSON array, newest first.
 
-    sql = f"""
-        SELECT tmdb_id, media_type, COALESCE(data, '{{}}'::jsonb) AS data
-        FROM {table_name}
-        WHERE user_id = %s
-        ORDER BY created_at DESC
+    Each element is the title's metadata from `titles` with `id` and
+    `media_type` set from the key columns, so the rows need no reshaping in
+    Python.
+    """
+    if table_name not in USER_COLLECTIONS.values():
+        raise ValueError("Invalid collection table requested")
+    return f"""
+        SELECT COALESCE(jsonb_agg(
+                   COALESCE(t.data, '{{}}'::jsonb)
+                   || jsonb_build_object('id', c.tmdb_id, 'media_type', c.media_type)
+                   ORDER BY c.created_at DESC
+               ), '[]'::jsonb)
+        FROM {table_name} c
+        LEFT JOIN titles t ON t.media_type = c.media_type AND t.tmdb_id = c.tmdb_id
+        WHERE c.user_id = %(user_id)s
     """
 
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(sql, (user_id,))
-            rows = cur.fetchall()
+_COLLECTION_ITEMS_SQL = {
+    table: Statement(f'{table}_items', _collection_items_sql(table)) for table in USER_COLLECTIONS.values()
+}
 
-    items = []
-    for row in rows:
-        payload = row['data'] or {}
-        if isinstance(payload, str):
-            try:
-                payload = json.loads(payload)
-            except Exception:
-                payload = {}
+# my_list, likes and trailers_watched in a single round trip
+_LIBRARY_SQL = Statement('user_library', "SELECT " + ",\n".join(
+    f"({_collection_items_sql(table)}) AS {table}" for table in USER_COLLECTIONS.values()
+))
 
-        try:
-            payload['id'] = int(row['tmdb_id'])
-        except (TypeError, ValueError):
-            payload['id'] = row['tmdb_id']
-        payload['media_type'] = row['media_type']
-        items.append(payload)
+def _slim_title(data):
+    """Keep only TITLE_FIELDS from a client-supplied TMDB object."""
+    if not isinstance(data, dict):
+        return None
+    return {k: data[k] for k in TITLE_FIELDS if k in data}
 
-    return items
+def _save_collection_items(cur, table_name: str, user_id: str, items):
+    """Upsert (tmdb_id, media_type, data) items into a collection table.
 
-@app.route('/api/me/my-list', methods=['GET', 'POST', 'DELETE'])
-@login_required
-def api_my_list():
-    user_id = _uuid_str(current_user.id)
-    if request.method == 'GET':
-        return jsonify(_load_user_collection('my_list', user_id))
+    Metadata goes to `titles` once per title; the collection row is just the key.
+    """
+    if table_name not in USER_COLLECTIONS.values():
+        raise ValueError("Invalid collection table requested")
+    titles = {}
+    for tmdb_id, media_type, data in items:
+        slim = _slim_title(data)
+        if slim:
+            titles[(media_type, tmdb_id)] = json.dumps(slim)
+    if titles:
+        # Sorted so concurrent writers lock title rows in the same order
+        psycopg2.extras.execute_values(
+            cur,
+            """
+            INSERT INTO titles (media_type, tmdb_id, data)
+            VALUES %s
+            ON CONFLICT (media_type, tmdb_id)
+            DO UPDATE SET data = EXCLUDED.data, updated_at = CURRENT_TIMESTAMP
+            """,
+            [(media_type, tmdb_id, data) for (media_type, tmdb_id), data in sorted(titles.items())],
+            template="(%s, %s, %s::jsonb)"
+        )
+    psycopg2.extras.execute_values(
+        cur,
+        f"""
+        INSERT INTO {table_name} (user_id, tmdb_id, media_type)
+        VALUES %s
+        ON CONFLICT (user_id, media_type, tmdb_id)
+        DO UPDATE SET created_at = CURRENT_TIMESTAMP
+        """,
+        [(user_id, tmdb_id, media_type) for tmdb_id, media_type, _ in items],
+        template="(%s::uuid, %s, %s)"
+    )
 
-    payload = request.get_json() or {}
-    tmdb_id = payload.get('tmdb_id')
-    media_type = (payload.get('media_type') or '').lower()
-    data = payload.get('data')
-    if not tmdb_id or media_type not in {'movie','tv'}:
-        return jsonify({'error': 'tmdb_id and valid media_type required'}), 400
+# Versions of change history kept per collection; older deltas get a full reset
+COLLECTION_CHANGES_KEEP = 1000
 
-    with get_db_connection() as conn:
-        with conn.cursor() as cur:
-            if request.method == 'POST':
-                cur.execute(
-                    """
-                    INSERT INTO my_list (user_id, tmdb_id, media_type, data)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (user_id, media_type, tmdb_id)
-                    DO UPDATE SET data = EXCLUDED.data, created_at = CURRENT_TIMESTAMP
-                    """,
-                    (user_id, tmdb_id, media_type, json.dumps(data) if data is not None else None)
-                )
+_BUMP_VERSIONS_SQL = Statement('bump_versions', """
+    INSERT INTO collection_versions (user_id, collection, version)
+    SELECT %s, unnest(%s::text[]), 1
+    ON CONFLICT (user_id, collection)
+    DO UPDATE SET version = collection_versions.version + 1
+    RETURNING collection, version
+""")
+
+_TRIM_CHANGES_SQL = Statement('trim_collection_changes', """
+    DELETE FROM collection_changes c
+    USING unnest(%s::text[], %s::bigint[]) AS v(collection, version)
+    WHERE c.user_id = %s AND c.collection = v.collection
+      AND c.version <= v.version - %s
+""")
+
+_COLLECTION_VERSIONS_SQL = Statement(
+    'collection_versions',
+    "SELECT collection, version FROM collection_versions WHERE user_id = %s AND collection = ANY(%s)"
+)
+
+def _bump_versions(cur, user_id: str, collections):
+    """Increment the version of each changed collection for a user.
+
+    Collections are the title tables plus 'reminders' and 'notifications'.
+    Returns {collection: new version}.
+    """
+    run_statement(cur, _BUMP_VERSIONS_SQL, (user_id, sorted(set(collections))))
+    return dict(cur.fetchall())
+
+def _log_collection_changes(cur, user_id: str, changes):
+    """Bump versions and record {table: [(media_type, tmdb_id, 'add'|'remove')]}."""
+    versions = _bump_versions(cur, user_id, changes)
+    rows = [
+        (user_id, table, versions[table], media_type, tmdb_id, op)
+        for table, keys in changes.items()
+        for media_type, tmdb_id, op in keys
+    ]
+    psycopg2.extras.execute_values(
+        cur,
+        """
+        INSERT INTO collection_changes (user_id, collection, version, media_type, tmdb_id, op)
+        VALUES %s
+        ON CONFLICT DO NOTHING
+        """,
+        rows,
+        template="(%s::uuid, %s, %s, %s, %s, %s)"
+    )
+    run_statement(cur, _TRIM_CHANGES_SQL, (list(versions), list(versions.values()), user_id, COLLECTION_CHANGES_KEEP))
+    return versions
+
+def _collection_versions(cur, user_id: str, collections):
+    """Current version per collection; collections never written are at 0."""
+    versions = dict(run_statement(cur, _COLLECTION_VERSIONS_SQL, (user_id, list(collections))).fetchall())
+    return {collection: versions.get(collection, 0) for collection in collections}
+
+def _version_etag(user_id: str, versions, variant=b''):
+    """Strong ETag for a per-user versioned resource.
+
+    The digest ties it to the user, path and query (`variant`) so one browser
+    shared by two accounts never revalidates the wrong body.
+    """
+    scope = hashlib.sha1(f"{user_id}|{request.path}|".encode() + variant).hexdigest()[:16]
+    return f"{scope}-{'.'.join(str(v) for v in versions)}"
+
+def _conditional_response(etag, build):
+    """304 when the client already holds `etag`, else the response from `build()`."""
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = build()
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+_FIRST_CHANGE_SQL = Statement('first_collection_change', """
+    SELECT MIN(version) FROM collection_changes
+    WHERE user_id = %s AND collection = %s AND version > %s
+""")
+
+_COLLECTION_DELTA_SQL = Statement('collection_delta', """
+    WITH latest AS (
+        SELECT DISTINCT ON (media_type, tmdb_id) media_type, tmdb_id, op
+        FROM collection_changes
+        WHERE user_id = %s AND collection = %s AND version > %s
+        ORDER BY media_type, tmdb_id, version DESC
+    )
+    SELECT l.op,
+           COALESCE(t.data, '{}'::jsonb)
+           || jsonb_build_object('id', l.tmdb_id, 'media_type', l.media_type)
+    FROM latest l
+    LEFT JOIN titles t ON t.media_type = l.media_type AND t.tmdb_id = l.tmdb_id
+""")
+
+def _collection_delta(cur, table_name: str, user_id: str, since: int):
+    """Net adds and removes after `since`, or None if the history is incomplete."""
+    first = run_statement(cur, _FIRST_CHANGE_SQL, (user_id, table_name, since)).fetchone()[0]
+    if first is not None and first != since + 1:
+        return None
+    run_statement(cur, _COLLECTION_DELTA_SQL, (user_id, table_name, since))
+    added, removed = [], []
+    for op, item in cur.fetchall():
+        if op == 'add':
+            added.append(item)
+        else:
+            removed.append({'id': item['id'], 'media_type': item['media_type']})
+    return {'added': added, 'removed': removed}
+
+def _collection_response(table_name: str, user_id: str):
+    """GET handler shared by the collection endpoints.
+
+    The body is the full list, tagged with the collection version as a strong
+    ETag. `?since_version=N` instead returns {"version", "added", "removed"}
+    relative to N, or {"version", "reset": true, "items"} when the change log
+    no longer reaches back that far.
+    """
+    since = request.args.get('since_version')
+    if since is not None:
+        try:
+            since = int(since)
+        except ValueError:
+            return jsonify({'error': 'since_version must be an integer'}), 400
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            version = _collection_versions(cur, user_id, [table_name])[table_name]
+            etag = _version_etag(user_id, [version], request.query_string)
+            if request.if_none_match.contains(etag):
+                response = _conditional_response(etag, None)
+                response.headers['X-Collection-Version'] = str(version)
+                return response
+
+            delta = None
+            if since is not None and 0 <= since <= version:
+                delta = _collection_delta(cur, table_name, user_id, since)
+            if delta is None:
+                items = run_statement(cur, _COLLECTION_ITEMS_SQL[table_name], {'user_id': user_id}).fetchone()[0]
+
+    if since is None:
+        body = items
+    elif delta is None:
+        body = {'version': version, 'reset': True, 'items': items}
+    else:
+        body = {'version': version, **delta}
+    response = _conditional_response(etag, lambda: jsonify(body))
+    response.headers['X-Collection-Version'] = str(version)
+    return response
+
+def _load_user_library(user_id: str):
+    """Load my_list, likes and trailers_watched in a single round trip."""
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            row = run_statement(cur, _LIBRARY_SQL, {'user_id': user_id}).fetchone()
+    return {key: row[index] for index, key in enumerate(USER_COLLECTIONS)}
+
+@app.route('/api/me/library', methods=['GET'])
+@login_required
+def api_library():
+    """My List, likes and watched trailers in one response."""
+    user_id = _uuid_str(current_user.id)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            versions = _collection_versions(cur, user_id, list(USER_COLLECTIONS.values()))
+    etag = _version_etag(user_id, versions.values())
+    return _conditional_response(etag, lambda: jsonify(_load_user_library(user_id)))
+
+@app.route('/api/me/my-list', methods=['GET', 'POST', 'DELETE'])
+@login_required
+def api_my_list():
+    user_id = _uuid_str(current_user.id)
+    if request.method == 'GET':
+        return _collection_response('my_list', user_id)
+
+    payload = request.get_json() or {}
+    tmdb_id = payload.get('tmdb_id')
+    media_type = (payload.get('media_type') or '').lower()
+    data = payload.get('data')
+    if not tmdb_id or media_type not in {'movie','tv'}:
+        return jsonify({'error': 'tmdb_id and valid media_type required'}), 400
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            if request.method == 'POST':
+                _save_collection_items(cur, 'my_list', user_id, [(tmdb_id, media_type, data)])
             else:  # DELETE
                 cur.execute(
                     "DELETE FROM my_list WHERE user_id = %s AND tmdb_id = %s AND media_type = %s",
                     (user_id, tmdb_id, media_type)
                 )
+            op = 'add' if request.method == 'POST' else 'remove'
+            _log_collection_changes(cur, user_id, {'my_list': [(media_type, tmdb_id, op)]})
         conn.commit()
     return jsonify({'success': True})
 
@@ -452,7 +1826,7 @@ def api_my_list():
 def api_likes():
     user_id = _uuid_str(current_user.id)
     if request.method == 'GET':
-        return jsonify(_load_user_collection('likes', user_id))
+        return _collection_response('likes', user_id)
 
     payload = request.get_json() or {}
     tmdb_id = payload.get('tmdb_id')
@@ -464,20 +1838,14 @@ def api_likes():
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             if request.method == 'POST':
-                cur.execute(
-                    """
-                    INSERT INTO likes (user_id, tmdb_id, media_type, data)
-                    VALUES (%s, %s, %s, %s)
-                    ON CONFLICT (user_id, media_type, tmdb_id)
-                    DO UPDATE SET data = EXCLUDED.data, created_at = CURRENT_TIMESTAMP
-                    """,
-                    (user_id, tmdb_id, media_type, json.dumps(data) if data is not None else None)
-                )
+                _save_collection_items(cur, 'likes', user_id, [(tmdb_id, media_type, data)])
             else:
                 cur.execute(
                     "DELETE FROM likes WHERE user_id = %s AND tmdb_id = %s AND media_type = %s",
                     (user_id, tmdb_id, media_type)
                 )
+            op = 'add' if request.method == 'POST' else 'remove'
+            _log_collection_changes(cur, user_id, {'likes': [(media_type, tmdb_id, op)]})
         conn.commit()
     return jsonify({'success': True})
 
@@ -486,7 +1854,7 @@ def api_likes():
 def api_trailers():
     user_id = _uuid_str(current_user.id)
     if request.method == 'GET':
-        return jsonify(_load_user_collection('trailers_watched', user_id))
+        return _collection_response('trailers_watched', user_id)
 
     payload = request.get_json() or {}
     tmdb_id = payload.get('tmdb_id')
@@ -495,59 +1863,1423 @@ def api_trailers():
     if not tmdb_id or media_type not in {'movie','tv'}:
         return jsonify({'error': 'tmdb_id and valid media_type required'}), 400
 
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            _save_collection_items(cur, 'trailers_watched', user_id, [(tmdb_id, media_type, data)])
+            _log_collection_changes(cur, user_id, {'trailers_watched': [(media_type, tmdb_id, 'add')]})
+        conn.commit()
+    return jsonify({'success': True})
+
+COLLECTIONS_BATCH_MAX = 500
+
+def _parse_collection_op(op):
+    """Validate one batch op, returning (table, media_type, tmdb_id, action, data) or None."""
+    if not isinstance(op, dict):
+        return None
+    table = USER_COLLECTIONS.get(op.get('collection'))
+    action = op.get('op')
+    media_type = (op.get('media_type') or '').lower()
+    try:
+        tmdb_id = int(op.get('tmdb_id'))
+    except (TypeError, ValueError):
+        return None
+    if not table or action not in {'add', 'remove'} or media_type not in {'movie', 'tv'} or tmdb_id <= 0:
+        return None
+    return table, media_type, tmdb_id, action, op.get('data')
+
+@app.route('/api/me/collections/batch', methods=['POST'])
+@login_required
+def api_collections_batch():
+    """Apply add/remove ops across My List, likes and trailers in one transaction.
+
+    Body: {"ops": [{"op": "add"|"remove", "collection": "myList"|"likes"|"trailers",
+    "tmdb_id": 123, "media_type": "movie", "data": {...}}, ...]}. Ops are applied
+    in order, so the last op for a title wins. Returns the new version of every
+    collection.
+    """
+    user_id = _uuid_str(current_user.id)
+    payload = request.get_json(silent=True) or {}
+    ops = payload.get('ops')
+    if not isinstance(ops, list) or not ops:
+        return jsonify({'error': 'ops must be a non-empty list'}), 400
+    if len(ops) > COLLECTIONS_BATCH_MAX:
+        return jsonify({'error': f'At most {COLLECTIONS_BATCH_MAX} ops per request'}), 400
+
+    # Collapse to the final state per title so each statement touches a row once
+    final = {}
+    for index, op in enumerate(ops):
+        parsed = _parse_collection_op(op)
+        if parsed is None:
+            return jsonify({'error': f'Invalid op at index {index}'}), 400
+        table, media_type, tmdb_id, action, data = parsed
+        final.pop((table, media_type, tmdb_id), None)
+        final[(table, media_type, tmdb_id)] = (action, data)
+
+    adds, removes = {}, {}
+    for (table, media_type, tmdb_id), (action, data) in final.items():
+        if action == 'add':
+            adds.setdefault(table, []).append((tmdb_id, media_type, data))
+        else:
+            removes.setdefault(table, []).append((tmdb_id, media_type))
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            for table, items in adds.items():
+                _save_collection_items(cur, table, user_id, items)
+            for table, keys in removes.items():
+                cur.execute(
+                    f"""
+                    DELETE FROM {table} t
+                    USING unnest(%s::bigint[], %s::text[]) AS k(tmdb_id, media_type)
+                    WHERE t.user_id = %s AND t.tmdb_id = k.tmdb_id AND t.media_type = k.media_type
+                    """,
+                    ([k[0] for k in keys], [k[1] for k in keys], user_id)
+                )
+            changes = {}
+            for (table, media_type, tmdb_id), (action, _) in final.items():
+                changes.setdefault(table, []).append((media_type, tmdb_id, action))
+            _log_collection_changes(cur, user_id, changes)
+            versions = _collection_versions(cur, user_id, list(USER_COLLECTIONS.values()))
+        conn.commit()
+
+    versions = {key: versions[table] for key, table in USER_COLLECTIONS.items()}
+    return jsonify({'success': True, 'applied': len(final), 'versions': versions})
+
+# --- TMDB Proxy ---
+TMDB_API_BASE = os.environ.get('TMDB_API_BASE', 'https://api.themoviedb.org/3').rstrip('/')
+# Per attempt; short enough that a retry still fits in TMDB_DEADLINE
+TMDB_TIMEOUT = float(os.environ.get('TMDB_TIMEOUT', '4'))
+TMDB_CACHE_SIZE = int(os.environ.get('TMDB_CACHE_SIZE', '2048'))
+TMDB_SHARED_CACHE = os.environ.get('TMDB_SHARED_CACHE', '').lower() in {'1', 'true', 'yes'}
+TMDB_MAX_WORKERS = int(os.environ.get('TMDB_MAX_WORKERS', '8'))
+# Upstream requests in flight per host, shared by every request thread
+TMDB_MAX_CONCURRENCY = int(os.environ.get('TMDB_MAX_CONCURRENCY', '32'))
+TMDB_RETRIES = int(os.environ.get('TMDB_RETRIES', '2'))
+TMDB_RETRY_BASE = float(os.environ.get('TMDB_RETRY_BASE', '0.25'))
+TMDB_RETRY_MAX_DELAY = 5.0
+# Overall budget for one call, from the caller's side: queueing for tokens,
+# every attempt and the backoff between them all come out of it. A user request
+# waits at most TMDB_DEADLINE + _TMDB_HANDOFF_GRACE (7.5 s by default), well
+# inside REQUEST_MAX_SECONDS, so the handler still answers with its own 504 or a
+# stale copy before the platform gives up.
+TMDB_DEADLINE = float(os.environ.get('TMDB_DEADLINE', '7'))
+TMDB_BACKGROUND_DEADLINE = float(os.environ.get('TMDB_BACKGROUND_DEADLINE', '15'))
+# Slack for the hop between the request thread and the TMDB loop
+_TMDB_HANDOFF_GRACE = 0.5
+_TMDB_RETRY_STATUSES = {429, 500, 502, 503, 504}
+# Shared request budget for the API key (TMDB allows roughly 50 requests/s)
+TMDB_RATE_LIMIT = float(os.environ.get('TMDB_RATE_LIMIT', '40'))
+TMDB_BURST = float(os.environ.get('TMDB_BURST', '40'))
+# Tokens background work must leave in the bucket for interactive requests
+TMDB_INTERACTIVE_RESERVE = float(os.environ.get('TMDB_INTERACTIVE_RESERVE', str(TMDB_BURST * 0.25)))
+TMDB_INTERACTIVE = 'interactive'
+TMDB_BACKGROUND = 'background'
+# How long a request may queue for budget before it is served stale or refused;
+# a cap within its deadline, not extra time on top of it
+TMDB_QUEUE_TIMEOUTS = {
+    TMDB_INTERACTIVE: float(os.environ.get('TMDB_QUEUE_TIMEOUT', '2')),
+    TMDB_BACKGROUND: float(os.environ.get('TMDB_BACKGROUND_QUEUE_TIMEOUT', '10')),
+}
+# Expired responses kept for serving when TMDB is throttled or unavailable
+TMDB_STALE_TTL = int(os.environ.get('TMDB_STALE_TTL', str(24 * 60 * 60)))
+TITLES_BATCH_MAX = 50
+
+# Per-endpoint cache lifetimes in seconds; the first matching pattern wins.
+TMDB_CACHE_TTLS = [
+    (re.compile(r'^trending/'), 10 * 60),
+    (re.compile(r'^(movie|tv)/(now_playing|upcoming|popular|top_rated|on_the_air|airing_today)$'), 30 * 60),
+    (re.compile(r'^search/'), 15 * 60),
+    (re.compile(r'^discover/'), 60 * 60),
+    (re.compile(r'^tv/\d+/season/\d+'), 12 * 60 * 60),
+    (re.compile(r'^(movie|tv|person)/\d+'), 6 * 60 * 60),
+]
+TMDB_DEFAULT_TTL = 30 * 60
+
+_TMDB_PATH_RE = re.compile(r'^[a-z_]+(/[A-Za-z0-9_\-]+)*$')
+_TMDB_APPEND_RE = re.compile(r'^[a-z_,]*$')
+
+class TMDBError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+_tmdb_cache = TTLCache(maxsize=TMDB_CACHE_SIZE, ttl=TMDB_DEFAULT_TTL, stale_ttl=TMDB_STALE_TTL)
+_tmdb_inflight = {}
+_tmdb_inflight_lock = threading.Lock()
+# Blocking work (shared cache queries) started from the event loop runs here
+_tmdb_executor = ThreadPoolExecutor(max_workers=TMDB_MAX_WORKERS, thread_name_prefix='tmdb')
+
+class AsyncRunner:
+    """A private asyncio loop on a daemon thread, shared by all request threads.
+
+    Sync code submits coroutines with `run()`; while a request thread waits,
+    the loop overlaps every other in-flight upstream call on one keep-alive
+    client. The loop is recreated after a fork.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._lock = threading.Lock()
+        self._loop = None
+        self._pid = None
+        self.state = {}  # loop-bound objects (clients, semaphores), reset with the loop
+
+    def _ensure_loop(self):
+        if self._loop is not None and self._pid == os.getpid():
+            return self._loop
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name=self.name, daemon=True).start()
+                self._loop, self._pid, self.state = loop, os.getpid(), {}
+        return self._loop
+
+    def run(self, coro, timeout=None):
+        """Run `coro` on the loop and block the calling thread for its result."""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            raise
+
+_tmdb_runner = AsyncRunner('tmdb-loop')
+
+class UpstreamScheduler:
+    """Token-bucket budget for TMDB with an interactive and a background lane.
+
+    Lives on the TMDB loop, so it needs no locks. Interactive waiters are
+    always granted first, and background work may not dip into the last
+    `reserve` tokens. A 429 pauses every lane until its Retry-After.
+    """
+
+    def __init__(self, rate, burst, reserve):
+        self.rate = rate
+        self.burst = burst
+        self.reserve = min(reserve, burst - 1)
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiters = {TMDB_INTERACTIVE: deque(), TMDB_BACKGROUND: deque()}
+        self._wakeup = None
+        self.counters = {
+            'granted_interactive': 0, 'granted_background': 0,
+            'queued_interactive': 0, 'queued_background': 0,
+            'budget_timeouts': 0, 'throttled': 0, 'stale_served': 0,
+        }
+        self.wait_seconds = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def _can_grant(self, priority, now):
+        if now < self.paused_until:
+            return False
+        floor = 1 if priority == TMDB_INTERACTIVE else 1 + self.reserve
+        return self.tokens >= floor
+
+    def _grant(self, priority):
+        self.tokens -= 1
+        self.counters[f'granted_{priority}'] += 1
+
+    def _dispatch(self):
+        self._wakeup = None
+        now = time.monotonic()
+        self._refill(now)
+        for priority in (TMDB_INTERACTIVE, TMDB_BACKGROUND):
+            queue_ = self.waiters[priority]
+            while queue_ and self._can_grant(priority, now):
+                waiter = queue_.popleft()
+                if not waiter.done():
+                    self._grant(priority)
+                    waiter.set_result(True)
+            if queue_:
+                break  # lower lanes wait until this one drains
+        self._schedule(now)
+
+    def _schedule(self, now):
+        if self._wakeup is not None or not any(self.waiters.values()):
+            return
+        needed = 1 if self.waiters[TMDB_INTERACTIVE] else 1 + self.reserve
+        delay = max(self.paused_until - now, (needed - self.tokens) / self.rate, 0.001)
+        self._wakeup = asyncio.get_running_loop().call_later(delay, self._dispatch)
+
+    async def acquire(self, priority, timeout):
+        """Wait for a token; returns False if none was granted within `timeout`."""
+        now = time.monotonic()
+        self._refill(now)
+        ahead = self.waiters[TMDB_INTERACTIVE] or (priority == TMDB_BACKGROUND and self.waiters[TMDB_BACKGROUND])
+        if not ahead and self._can_grant(priority, now):
+            self._grant(priority)
+            return True
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters[priority].append(waiter)
+        self.counters[f'queued_{priority}'] += 1
+        self._schedule(now)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+            return True
+        except asyncio.TimeoutError:
+            self.counters['budget_timeouts'] += 1
+            return False
+        finally:
+            self.wait_seconds += time.monotonic() - now
+            if not waiter.done():
+                waiter.cancel()
+
+    def throttle(self, retry_after):
+        """TMDB answered 429: spend the bucket and pause until Retry-After."""
+        now = time.monotonic()
+        self.counters['throttled'] += 1
+        self.tokens = 0
+        self.updated = now
+        self.paused_until = max(self.paused_until, now + retry_after)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'interactive_reserve': self.reserve,
+            'tokens': round(min(self.burst, self.tokens + (now - self.updated) * self.rate), 2),
+            'paused_for': round(max(0.0, self.paused_until - now), 3),
+            'waiting_interactive': len(self.waiters[TMDB_INTERACTIVE]),
+            'waiting_background': len(self.waiters[TMDB_BACKGROUND]),
+            'wait_seconds': round(self.wait_seconds, 3),
+            **self.counters,
+        }
+
+def _tmdb_scheduler():
+    """The loop's upstream scheduler (call on the loop)."""
+    scheduler = _tmdb_runner.state.get('scheduler')
+    if scheduler is None:
+        scheduler = _tmdb_runner.state['scheduler'] = UpstreamScheduler(
+            TMDB_RATE_LIMIT, TMDB_BURST, TMDB_INTERACTIVE_RESERVE
+        )
+    return scheduler
+
+def _tmdb_deadline(priority):
+    """Monotonic deadline for a TMDB call starting now."""
+    return time.monotonic() + (TMDB_DEADLINE if priority == TMDB_INTERACTIVE else TMDB_BACKGROUND_DEADLINE)
+
+def _tmdb_remaining(deadline):
+    return max(0.0, deadline - time.monotonic())
+
+def _tmdb_ttl(path: str) -> int:
+    for pattern, ttl in TMDB_CACHE_TTLS:
+        if pattern.match(path):
+            return ttl
+    return TMDB_DEFAULT_TTL
+
+def _tmdb_cache_key(path: str, params=None) -> str:
+    params = {k: v for k, v in (params or {}).items() if k != 'api_key' and v is not None}
+    query = urlencode(sorted((k, str(v)) for k, v in params.items()))
+    return f"{path}?{query}" if query else path
+
+def _get_tmdb_client():
+    """Return the loop's keep-alive async HTTP client for TMDB (call on the loop)."""
+    client = _tmdb_runner.state.get('client')
+    if client is None:
+        import httpx
+        client = _tmdb_runner.state['client'] = httpx.AsyncClient(
+            base_url=TMDB_API_BASE,
+            timeout=TMDB_TIMEOUT,
+            limits=httpx.Limits(max_connections=TMDB_MAX_CONCURRENCY, max_keepalive_connections=TMDB_MAX_CONCURRENCY)
+        )
+    return client
+
+def _host_semaphore(url):
+    """Per-host concurrency limit (call on the loop)."""
+    semaphores = _tmdb_runner.state.setdefault('semaphores', {})
+    host = urlparse(url).netloc
+    if host not in semaphores:
+        semaphores[host] = asyncio.Semaphore(TMDB_MAX_CONCURRENCY)
+    return semaphores[host]
+
+def _retry_delay(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(TMDB_RETRY_MAX_DELAY, TMDB_RETRY_BASE * (2 ** attempt)))
+
+def _retry_after(response):
+    try:
+        return min(float(response.headers.get('Retry-After', 1)), TMDB_RETRY_MAX_DELAY)
+    except ValueError:
+        return 1.0
+
+async def _tmdb_request(path, query, priority, deadline):
+    """GET a TMDB resource before `deadline`, retrying transient failures.
+
+    Every attempt takes a token from the scheduler; a 429 pauses the whole
+    scheduler rather than just this request, so retries cannot pile up.
+    Waiting for a token, each attempt and each backoff all spend the same
+    deadline.
+    """
+    import httpx
+    client = _get_tmdb_client()
+    scheduler = _tmdb_scheduler()
+    semaphore = _host_semaphore(TMDB_API_BASE)
+    for attempt in range(TMDB_RETRIES + 1):
+        remaining = _tmdb_remaining(deadline)
+        if remaining <= 0:
+            raise TMDBError(504, 'Timed out waiting for TMDB')
+        if not await scheduler.acquire(priority, min(TMDB_QUEUE_TIMEOUTS[priority], remaining)):
+            raise TMDBError(503, 'TMDB request budget exhausted')
+        response = None
+        try:
+            async with semaphore:
+                # An attempt never outlives the call's overall deadline
+                attempt_timeout = max(0.1, min(TMDB_TIMEOUT, _tmdb_remaining(deadline)))
+                response = await client.get(f"/{path}", params=query, timeout=attempt_timeout)
+            if response.status_code == 429:
+                scheduler.throttle(_retry_after(response))
+            if response.status_code not in _TMDB_RETRY_STATUSES or attempt == TMDB_RETRIES:
+                return response
+        except httpx.HTTPError as e:
+            if attempt == TMDB_RETRIES:
+                raise TMDBError(502, f"TMDB request failed: {e}")
+        if response is None or response.status_code != 429:
+            await asyncio.sleep(min(_retry_delay(attempt), _tmdb_remaining(deadline)))
+
+def _shared_cache_get(key):
     with get_db_connection() as conn:
         with conn.cursor() as cur:
             cur.execute(
                 """
-                INSERT INTO trailers_watched (user_id, tmdb_id, media_type, data)
-                VALUES (%s, %s, %s, %s)
-                ON CONFLICT (user_id, media_type, tmdb_id)
-                DO UPDATE SET data = EXCLUDED.data, created_at = CURRENT_TIMESTAMP
+                SELECT body, EXTRACT(EPOCH FROM expires_at - CURRENT_TIMESTAMP)
+                FROM tmdb_cache
+                WHERE cache_key = %s AND expires_at > CURRENT_TIMESTAMP
                 """,
-                (user_id, tmdb_id, media_type, json.dumps(data) if data is not None else None)
+                (key,)
+            )
+            row = cur.fetchone()
+    # Under a second left would be stored already expired locally: a miss
+    if row is None or int(row[1]) <= 0:
+        return None, 0
+    return row[0], int(row[1])
+
+def _shared_cache_set(key, body, ttl):
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO tmdb_cache (cache_key, body, expires_at)
+                VALUES (%s, %s, CURRENT_TIMESTAMP + make_interval(secs => %s))
+                ON CONFLICT (cache_key)
+                DO UPDATE SET body = EXCLUDED.body, expires_at = EXCLUDED.expires_at
+                """,
+                (key, json.dumps(body), ttl)
             )
         conn.commit()
-    return jsonify({'success': True})
 
-# --- Notification API Endpoints ---
+async def _tmdb_fetch(path, params, key, priority, deadline):
+    """Resolve a cache miss on the loop: shared cache first, then the TMDB API."""
+    loop = asyncio.get_running_loop()
+    ttl = _tmdb_ttl(path)
+    if TMDB_SHARED_CACHE:
+        try:
+            body, remaining = await loop.run_in_executor(_tmdb_executor, _shared_cache_get, key)
+            if body is not None:
+                _tmdb_cache.set(key, body, ttl=remaining)
+                return body
+        except psycopg2.Error as e:
+            print(f"Shared TMDB cache read failed: {e}")
+
+    api_key = os.environ.get('TMDB_API_KEY')
+    if not api_key:
+        raise TMDBError(500, 'TMDB API key not configured')
+
+    query = {k: v for k, v in (params or {}).items() if v is not None}
+    query['api_key'] = api_key
+    try:
+        response = await asyncio.wait_for(_tmdb_request(path, query, priority, deadline), _tmdb_remaining(deadline))
+    except asyncio.TimeoutError:
+        raise TMDBError(504, 'Timed out waiting for TMDB')
+    if response.status_code != 200:
+        raise TMDBError(response.status_code if response.status_code < 500 else 502,
+                        f"TMDB returned HTTP {response.status_code}")
+
+    try:
+        body = response.json()
+    except ValueError:
+        raise TMDBError(502, 'TMDB returned an invalid response')
+    _tmdb_cache.set(key, body, ttl=ttl)
+    if TMDB_SHARED_CACHE:
+        try:
+            await loop.run_in_executor(_tmdb_executor, _shared_cache_set, key, body, ttl)
+        except psycopg2.Error as e:
+            print(f"Shared TMDB cache write failed: {e}")
+    return body
+
+async def tmdb_get_async(path: str, params=None, priority=TMDB_INTERACTIVE, deadline=None):
+    """Fetch a TMDB API resource through the response cache (on the TMDB loop).
+
+    Concurrent misses for the same resource are coalesced so only one
+    request per key reaches TMDB; the others wait for its result. When the
+    request budget is exhausted or TMDB is failing, a stale cached copy is
+    served if one is still held. `deadline` (monotonic) defaults to the
+    priority's budget from now.
+    """
+    if deadline is None:
+        deadline = _tmdb_deadline(priority)
+    path = path.strip('/')
+    key = _tmdb_cache_key(path, params)
+    cached = _tmdb_cache.get(key)
+    if cached is not None:
+        return cached
+
+    with _tmdb_inflight_lock:
+        future = _tmdb_inflight.get(key)
+        leader = future is None
+        if leader:
+            future = Future()
+            _tmdb_inflight[key] = future
+    if not leader:
+        try:
+            return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)), _tmdb_remaining(deadline))
+        except asyncio.TimeoutError:
+            raise TMDBError(504, 'Timed out waiting for TMDB')
+
+    try:
+        # A previous leader may have filled the cache while we were queued.
+        body = _tmdb_cache.get(key)
+        if body is None:
+            try:
+                body = await _tmdb_fetch(path, params, key, priority, deadline)
+            except TMDBError as e:
+                body = _tmdb_cache.get_stale(key) if e.status in _TMDB_RETRY_STATUSES else None
+                if body is None:
+                    raise
+                _tmdb_scheduler().counters['stale_served'] += 1
+        future.set_result(body)
+        return body
+    except BaseException as e:
+        future.set_exception(e if isinstance(e, Exception) else TMDBError(504, 'TMDB request cancelled'))
+        raise
+    finally:
+        with _tmdb_inflight_lock:
+            _tmdb_inflight.pop(key, None)
+
+def tmdb_get(path: str, params=None, priority=TMDB_INTERACTIVE):
+    """Blocking wrapper around tmdb_get_async for request handlers and jobs."""
+    cached = _tmdb_cache.get(_tmdb_cache_key(path.strip('/'), params))
+    if cached is not None:
+        return cached
+    deadline = _tmdb_deadline(priority)
+    try:
+        with timed('tmdb'):
+            return _tmdb_runner.run(tmdb_get_async(path, params, priority, deadline),
+                                    timeout=_tmdb_remaining(deadline) + _TMDB_HANDOFF_GRACE)
+    except FutureTimeoutError:
+        raise TMDBError(504, 'Timed out waiting for TMDB')
+
+def tmdb_get_many(requests, priority=TMDB_INTERACTIVE):
+    """Fetch many (path, params) pairs concurrently on the TMDB loop.
+
+    Returns results in input order, each the payload or a TMDBError. One
+    thread waits while every upstream call overlaps, bounded only by the
+    per-host concurrency limit.
+    """
+    async def gather():
+        return await asyncio.gather(*(tmdb_get_async(path, params, priority, deadline) for path, params in requests),
+                                    return_exceptions=True)
+
+    if not requests:
+        return []
+    deadline = _tmdb_deadline(priority)
+    try:
+        with timed('tmdb'):
+            results = _tmdb_runner.run(gather(), timeout=_tmdb_remaining(deadline) + _TMDB_HANDOFF_GRACE)
+    except FutureTimeoutError:
+        return [TMDBError(504, 'Timed out waiting for TMDB')] * len(requests)
+    return [r if not isinstance(r, Exception) or isinstance(r, TMDBError)
+            else TMDBError(502, f"TMDB request failed: {r}") for r in results]
+
+@app.route('/api/tmdb/<path:tmdb_path>', methods=['GET'])
+@login_required
+def tmdb_proxy(tmdb_path):
+    """Proxy read-only TMDB API calls through the shared response cache."""
+    tmdb_path = tmdb_path.strip('/')
+    if not _TMDB_PATH_RE.match(tmdb_path):
+        return jsonify({'error': 'Invalid TMDB path'}), 400
+
+    params = {k: v for k, v in request.args.items() if k != 'api_key'}
+    try:
+        data = tmdb_get(tmdb_path, params)
+    except TMDBError as e:
+        return jsonify({'error': e.message}), e.status
+
+    response = jsonify(data)
+    response.headers['Cache-Control'] = f"private, max-age={min(_tmdb_ttl(tmdb_path), 300)}"
+    return response
+
+def _parse_batch_item(raw):
+    """Normalise a batch entry given as an object or a (media_type, tmdb_id, append) list."""
+    if isinstance(raw, dict):
+        media_type, tmdb_id, append = raw.get('media_type'), raw.get('tmdb_id'), raw.get('append')
+    elif isinstance(raw, (list, tuple)) and 2 <= len(raw) <= 3:
+        media_type, tmdb_id = raw[0], raw[1]
+        append = raw[2] if len(raw) == 3 else None
+    else:
+        return None
+    media_type = (media_type or '').lower()
+    try:
+        tmdb_id = int(tmdb_id)
+    except (TypeError, ValueError):
+        return None
+    append = append or ''
+    if isinstance(append, (list, tuple)):
+        append = ','.join(append)
+    if media_type not in {'movie', 'tv'} or not _TMDB_APPEND_RE.match(append):
+        return None
+    return media_type, tmdb_id, append
+
+def fetch_title_details(items, priority=TMDB_INTERACTIVE):
+    """Fetch TMDB details for many (media_type, tmdb_id, append) tuples at once.
+
+    Cached entries are answered inline; misses overlap on the TMDB event
+    loop. Returns a dict keyed by the input tuple with either the TMDB
+    payload or a TMDBError.
+    """
+    results = {}
+    pending = {}
+    for item in dict.fromkeys(items):
+        media_type, tmdb_id, append = item
+        path = f"{media_type}/{tmdb_id}"
+        params = {'append_to_response': append} if append else None
+        cached = _tmdb_cache.get(_tmdb_cache_key(path, params))
+        if cached is not None:
+            results[item] = cached
+        else:
+            pending[item] = (path, params)
+
+    results.update(zip(pending, tmdb_get_many(list(pending.values()), priority)))
+    return results
+
+@app.route('/api/titles/batch', methods=['POST'])
+@login_required
+def titles_batch():
+    """Return TMDB details for a list of titles in a single round trip."""
+    payload = request.get_json() or {}
+    raw_items = payload.get('items') if isinstance(payload, dict) else payload
+    if not isinstance(raw_items, list) or not raw_items:
+        return jsonify({'error': 'items must be a non-empty list'}), 400
+    if len(raw_items) > TITLES_BATCH_MAX:
+        return jsonify({'error': f'At most {TITLES_BATCH_MAX} items per batch'}), 400
+
+    items = [_parse_batch_item(raw) for raw in raw_items]
+    if any(item is None for item in items):
+        return jsonify({'error': 'Each item needs a valid media_type and tmdb_id'}), 400
+
+    details = fetch_title_details(items)
+    results = []
+    for media_type, tmdb_id, append in items:
+        entry = {'media_type': media_type, 'tmdb_id': tmdb_id}
+        value = details[(media_type, tmdb_id, append)]
+        if isinstance(value, TMDBError):
+            entry['error'] = value.message
+            entry['status'] = value.status
+        else:
+            entry['data'] = value
+        results.append(entry)
+    return jsonify({'results': results})
+
+# --- Catalog Snapshots ---
+CATALOG_REGIONS = [r.strip().upper() for r in os.environ.get('CATALOG_REGIONS', 'US').split(',') if r.strip()]
+CATALOG_REFRESH_INTERVAL = int(os.environ.get('CATALOG_REFRESH_INTERVAL', '0'))
+CATALOG_RELOAD_INTERVAL = 60
+CRON_SECRET = os.environ.get('CRON_SECRET')
+
+_REGION_RE = re.compile(r'^[A-Z]{2}$')
+
+# Browse rows, mirroring the categories rendered by static/js/script.js
+CATALOG_BROWSE_CATEGORIES = [
+    ("Action Movies", 'movie', {'with_genres': '28', 'sort_by': 'popularity.desc'}),
+    ("Comedy Movies", 'movie', {'with_genres': '35', 'sort_by': 'popularity.desc'}),
+    ("Horror Movies", 'movie', {'with_genres': '27', 'sort_by': 'popularity.desc'}),
+    ("Animation Movies", 'movie', {'with_genres': '16', 'sort_by': 'popularity.desc'}),
+    ("Science Fiction Movies", 'movie', {'with_genres': '878', 'sort_by': 'popularity.desc'}),
+    ("Blockbuster Action Movies", 'movie', {'with_genres': '28', 'sort_by': 'revenue.desc'}),
+    ("Action with a Side of Romance Movies", 'movie', {'with_genres': '28,10749', 'sort_by': 'popularity.desc'}),
+    ("Thrillers with a Side of Action Movies", 'movie', {'with_genres': '53,28', 'sort_by': 'popularity.desc'}),
+]
+
+# region -> (etag, encoded JSON body, monotonic load time)
+_catalog_snapshots = {}
+_catalog_lock = threading.Lock()
+
+def _cron_authorized():
+    """Guard for cron and internal endpoints.
+
+    Vercel Cron sends `Authorization: Bearer $CRON_SECRET`; nothing is allowed without a secret.
+    """
+    return bool(CRON_SECRET) and request.headers.get('Authorization') == f"Bearer {CRON_SECRET}"
+
+def _with_trailer_keys(items, media_type=None):
+    """Attach a YouTube trailer key to each TMDB list item using one batched detail fetch."""
+    keyed = [(media_type or item.get('media_type'), item.get('id'), item) for item in items]
+    keyed = [(mt, tid, item) for mt, tid, item in keyed if mt in {'movie', 'tv'} and tid]
+    details = fetch_title_details([(mt, int(tid), 'videos') for mt, tid, _ in keyed], TMDB_BACKGROUND)
+    enriched = []
+    for mt, tid, item in keyed:
+        data = details.get((mt, int(tid), 'videos'))
+        trailer_key = None
+        if isinstance(data, dict):
+            for video in (data.get('videos') or {}).get('results', []):
+                if video.get('site') == 'YouTube' and video.get('type') == 'Trailer':
+                    trailer_key = video.get('key')
+                    break
+        enriched.append({**item, 'media_type': mt, 'trailer_key': trailer_key})
+    return enriched
+
+def build_catalog_snapshot(region: str):
+    """Fetch every browse and New & Hot row for a region from TMDB."""
+    requests_by_key = {
+        'trending_movie': ('trending/movie/day', {'region': region, 'language': 'en-US', 'page': 1}),
+        'trending_tv': ('trending/tv/day', {'region': region, 'language': 'en-US', 'page': 1}),
+        'trending_all': ('trending/all/day', {'region': region, 'language': 'en-US', 'page': 1}),
+    }
+    for index, (_, media_type, params) in enumerate(CATALOG_BROWSE_CATEGORIES):
+        requests_by_key[f"category_{index}"] = (f"discover/{media_type}", params)
+
+    fetched = tmdb_get_many(list(requests_by_key.values()), TMDB_BACKGROUND)
+    results = {}
+    for key, data in zip(requests_by_key, fetched):
+        if isinstance(data, TMDBError):
+            print(f"Catalog snapshot: skipping {key} for {region}: {data}")
+            results[key] = []
+        else:
+            results[key] = (data or {}).get('results') or []
+
+    rows = [
+        {'key': 'trending_movie', 'name': 'Top 10 Movies Today', 'type': 'movie', 'is_ranked': True,
+         'items': results['trending_movie'][:10]},
+        {'key': 'trending_tv', 'name': 'Top 10 TV Shows Today', 'type': 'tv', 'is_ranked': True,
+         'items': results['trending_tv'][:10]},
+    ]
+    for index, (name, media_type, _) in enumerate(CATALOG_BROWSE_CATEGORIES):
+        rows.append({'key': f"category_{index}", 'name': name, 'type': media_type, 'is_ranked': False,
+                     'items': results[f"category_{index}"]})
+
+    return {
+        'region': region,
+        'built_at': datetime.now(timezone.utc).isoformat(),
+        'browse': {'rows': [row for row in rows if row['items']]},
+        'new_hot': {
+            'everyone_watching': _with_trailer_keys(results['trending_all'][:40]),
+            'top_tv': _with_trailer_keys(results['trending_tv'][:10], 'tv'),
+            'top_movies': _with_trailer_keys(results['trending_movie'][:10], 'movie'),
+        },
+    }
+
+def _encode_snapshot(payload):
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return hashlib.sha1(body).hexdigest(), body
+
+def refresh_catalog_snapshots(regions=None):
+    """Rebuild and persist the snapshot for each region; returns the regions refreshed."""
+    refreshed = []
+    for region in regions or CATALOG_REGIONS:
+        payload = build_catalog_snapshot(region)
+        if not payload['browse']['rows']:
+            print(f"Catalog snapshot for {region} came back empty; keeping the previous one.")
+            continue
+        etag, body = _encode_snapshot(payload)
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """
+                    INSERT INTO catalog_snapshots (region, payload, etag, built_at)
+                    VALUES (%s, %s, %s, CURRENT_TIMESTAMP)
+                    ON CONFLICT (region)
+                    DO UPDATE SET payload = EXCLUDED.payload, etag = EXCLUDED.etag, built_at = EXCLUDED.built_at
+                    """,
+                    (region, body.decode('utf-8'), etag)
+                )
+            conn.commit()
+        with _catalog_lock:
+            _catalog_snapshots[region] = (etag, body, time.monotonic())
+        refreshed.append(region)
+    return refreshed
+
+def get_catalog_snapshot(region: str):
+    """Return (etag, body) for a region, reloading from Postgres at most once a minute."""
+    with _catalog_lock:
+        entry = _catalog_snapshots.get(region)
+    if entry and time.monotonic() - entry[2] < CATALOG_RELOAD_INTERVAL:
+        return entry[0], entry[1]
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            if entry:
+                # Only transfer the payload when another instance has rebuilt it
+                cur.execute(
+                    """
+                    SELECT etag, CASE WHEN etag = %s THEN NULL ELSE payload::text END
+                    FROM catalog_snapshots WHERE region = %s
+                    """,
+                    (entry[0], region)
+                )
+            else:
+                cur.execute("SELECT etag, payload::text FROM catalog_snapshots WHERE region = %s", (region,))
+            row = cur.fetchone()
+    if row is None:
+        return None
+    etag, body = row[0], (row[1].encode('utf-8') if row[1] is not None else entry[1])
+    with _catalog_lock:
+        _catalog_snapshots[region] = (etag, body, time.monotonic())
+    return etag, body
+
+@app.route('/api/catalog/<region>', methods=['GET'])
+@login_required
+def catalog_snapshot(region):
+    """Serve the precomputed browse / New & Hot rows for a region."""
+    region = region.upper()
+    if not _REGION_RE.match(region):
+        return jsonify({'error': 'Invalid region'}), 400
+
+    snapshot = get_catalog_snapshot(region)
+    if snapshot is None:
+        return jsonify({'error': 'No snapshot for region'}), 404
+    etag, body = snapshot
+
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+@app.route('/api/cron/refresh-catalog', methods=['GET', 'POST'])
+def cron_refresh_catalog():
+    """Cron entry point that rebuilds the catalog snapshots."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    regions = [r.upper() for r in request.args.getlist('region') if _REGION_RE.match(r.upper())]
+    return jsonify({'success': True, 'regions': refresh_catalog_snapshots(regions or None)})
+
+@app.cli.command('refresh-catalog')
+@click.option('--region', 'regions', multiple=True, help='Region code to rebuild (repeatable). Defaults to CATALOG_REGIONS.')
+def refresh_catalog_command(regions):
+    """Rebuild the precomputed catalog snapshots."""
+    refreshed = refresh_catalog_snapshots([r.upper() for r in regions] or None)
+    click.echo(f"Refreshed catalog snapshots: {', '.join(refreshed) or 'none'}")
+
+def _catalog_refresher():
+    while True:
+        try:
+            refresh_catalog_snapshots()
+        except Exception as e:
+            print(f"Catalog refresh failed: {e}")
+        time.sleep(CATALOG_REFRESH_INTERVAL)
+
+
+# --- Search ---
+SEARCH_INDEX_REFRESH = int(os.environ.get('SEARCH_INDEX_REFRESH', '600'))
+SEARCH_INDEX_MAX_TITLES = int(os.environ.get('SEARCH_INDEX_MAX_TITLES', '100000'))
+# Fewer local hits than this sends the query on to TMDB search/multi
+SEARCH_MIN_HITS = int(os.environ.get('SEARCH_MIN_HITS', '5'))
+SEARCH_CACHE_TTL = 5 * 60
+SEARCH_MAX_LIMIT = 40
+SEARCH_PREFIX_MAX = 12
+SEARCH_FUZZY_THRESHOLD = 0.3
+# Fields kept per indexed title; enough to render a poster card
+SEARCH_ITEM_FIELDS = ('id', 'media_type', 'title', 'name', 'poster_path', 'backdrop_path',
+                      'overview', 'release_date', 'first_air_date', 'vote_average', 'popularity')
+
+def _normalize_text(text):
+    """Lowercase, strip accents and punctuation: 'Amélie!' -> 'amelie'."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class SearchIndex:
+    """In-memory typeahead index over title names.
+
+    Each word of a name is indexed by its prefixes (up to SEARCH_PREFIX_MAX
+    characters) so typed prefixes match by set intersection, and whole
+    names by trigrams for typo-tolerant fallback matching.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.items = {}                     # (media_type, id) -> item
+        self._names = {}                    # (media_type, id) -> normalized names
+        self._prefixes = defaultdict(set)   # word prefix -> keys
+        self._trigrams = defaultdict(set)   # trigram -> keys
+        self._trigram_counts = {}           # (key, name) -> trigram count
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, item, media_type=None):
+        """Index a TMDB title object; returns False if it has no usable name."""
+        media_type = media_type or item.get('media_type')
+        if media_type not in {'movie', 'tv'} or not item.get('id'):
+            return False
+        names = {_normalize_text(item.get(field)) for field in ('title', 'name', 'original_title', 'original_name')}
+        names.discard('')
+        if not names:
+            return False
+        key = (media_type, int(item['id']))
+        slim = {k: item[k] for k in SEARCH_ITEM_FIELDS if item.get(k) is not None}
+        slim.update(id=key[1], media_type=media_type)
+        with self._lock:
+            existing = self.items.get(key)
+            if existing is not None:
+                # Keep richer entries; a later copy only fills in missing fields
+                self.items[key] = {**slim, **existing}
+                names -= self._names[key]
+                if not names:
+                    return True
+                self._names[key] |= names
+            else:
+                self.items[key] = slim
+                self._names[key] = set(names)
+            for name in names:
+                for word in name.split():
+                    for i in range(1, min(len(word), SEARCH_PREFIX_MAX) + 1):
+                        self._prefixes[word[:i]].add(key)
+                grams = _trigrams(name)
+                self._trigram_counts[(key, name)] = len(grams)
+                for gram in grams:
+                    self._trigrams[gram].add(key)
+        return True
+
+    def _rank(self, key, query):
+        """Lower is better: exact name, name starts with the query, then word-prefix match."""
+        names = self._names[key]
+        if query in names:
+            return 0
+        if any(name.startswith(query) for name in names):
+            return 1
+        return 2
+
+    def _fuzzy(self, query, exclude, limit):
+        grams = _trigrams(query)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._trigrams.get(gram, ()))
+        scored = []
+        for key, shared in counts.items():
+            if key in exclude:
+                continue
+            best = max(shared / (len(grams) + self._trigram_counts[(key, name)] - shared)
+                       for name in self._names[key])
+            if best >= SEARCH_FUZZY_THRESHOLD:
+                scored.append((-best, key))
+        scored.sort()
+        return [key for _, key in scored[:limit]]
+
+    def search(self, query, limit=20):
+        """Titles whose words start with every query word, then close trigram matches."""
+        query = _normalize_text(query)
+        words = query.split()
+        if not words:
+            return []
+        with self._lock:
+            postings = sorted((self._prefixes.get(word[:SEARCH_PREFIX_MAX], set()) for word in words), key=len)
+            keys = set(postings[0]).intersection(*postings[1:]) if postings[0] else set()
+            ranked = sorted(
+                keys,
+                key=lambda k: (self._rank(k, query), -(self.items[k].get('popularity') or 0),
+                               -(self.items[k].get('vote_average') or 0))
+            )[:limit]
+            if len(ranked) < limit and len(query) >= 3:
+                ranked += self._fuzzy(query, set(ranked), limit - len(ranked))
+            return [dict(self.items[key]) for key in ranked]
+
+_search_index = None
+# Serves searches (and keeps their TMDB results) until a first build succeeds
+_fallback_search_index = SearchIndex()
+_search_index_built_at = 0.0
+_search_index_lock = threading.Lock()
+_search_index_rebuilding = False
+# After a failed build no search retries it before this monotonic time
+_search_index_retry_at = 0.0
+_search_index_failures = 0
+_search_cache = TTLCache(maxsize=2048, ttl=SEARCH_CACHE_TTL)
+
+def _iter_snapshot_items(payload):
+    for row in (payload.get('browse') or {}).get('rows', []):
+        for item in row.get('items', []):
+            yield item, row.get('type')
+    section_types = {'top_tv': 'tv', 'top_movies': 'movie'}
+    for name, section in (payload.get('new_hot') or {}).items():
+        for item in section if isinstance(section, list) else ():
+            yield item, item.get('media_type') or section_types.get(name)
+
+def build_search_index():
+    """Index every title we already hold: the titles table and catalog snapshots."""
+    index = SearchIndex()
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "SELECT media_type, tmdb_id, data FROM titles ORDER BY updated_at DESC LIMIT %s",
+                (SEARCH_INDEX_MAX_TITLES,)
+            )
+            for media_type, tmdb_id, data in cur:
+                index.add({**(data or {}), 'id': tmdb_id}, media_type)
+            cur.execute("SELECT payload FROM catalog_snapshots")
+            for (payload,) in cur.fetchall():
+                for item, media_type in _iter_snapshot_items(payload or {}):
+                    index.add(item, media_type)
+    return index
+
+def _rebuild_search_index():
+    global _search_index, _search_index_built_at, _search_index_rebuilding
+    global _search_index_retry_at, _search_index_failures
+    try:
+        index = build_search_index()
+        _search_index, _search_index_built_at = index, time.monotonic()
+        _search_index_failures = 0
+        _search_cache.clear()
+    except Exception as e:
+        _search_index_failures += 1
+        delay = min(SEARCH_INDEX_REFRESH, 5 * 2 ** (_search_index_failures - 1))
+        _search_index_retry_at = time.monotonic() + delay
+        print(f"Search index rebuild failed, retrying in {delay}s: {e}")
+    finally:
+        _search_index_rebuilding = False
+
+def get_search_index():
+    """Return the index, building it on first use and refreshing it in the background.
+
+    Failed builds back off, so a database outage costs one attempt per
+    backoff period rather than one per search.
+    """
+    global _search_index_rebuilding
+    now = time.monotonic()
+    if _search_index is None:
+        if now >= _search_index_retry_at:
+            with _search_index_lock:
+                if _search_index is None and time.monotonic() >= _search_index_retry_at:
+                    _rebuild_search_index()
+    elif (now - _search_index_built_at > SEARCH_INDEX_REFRESH and now >= _search_index_retry_at
+          and not _search_index_rebuilding):
+        _search_index_rebuilding = True
+        threading.Thread(target=_rebuild_search_index, name='search-index', daemon=True).start()
+    return _search_index or _fallback_search_index
+
+@app.route('/api/search', methods=['GET'])
+@login_required
+def search_titles():
+    """Typeahead search over titles we already know, falling back to TMDB on a miss.
+
+    Returns {"results": [...], "source": "index" | "index+tmdb"} with items
+    shaped like TMDB search/multi results.
+    """
+    query = (request.args.get('q') or request.args.get('query') or '').strip()
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), SEARCH_MAX_LIMIT))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    normalized = _normalize_text(query)
+    if len(normalized) < 2:
+        return jsonify({'results': [], 'source': 'index'})
+
+    cache_key = (normalized, limit)
+    cached = _search_cache.get(cache_key)
+    if cached is None:
+        index = get_search_index()
+        results = index.search(normalized, limit)
+        source = 'index'
+        if len(results) < min(SEARCH_MIN_HITS, limit):
+            try:
+                data = tmdb_get('search/multi', {'query': query, 'include_adult': 'false', 'language': 'en-US', 'page': 1})
+            except TMDBError as e:
+                print(f"Search fallback to TMDB failed: {e.message}")
+                data = None
+            if data is not None:
+                source = 'index+tmdb'
+                seen = {(r['media_type'], r['id']) for r in results}
+                for item in data.get('results') or []:
+                    if not index.add(item):
+                        continue
+                    key = (item['media_type'], int(item['id']))
+                    if key not in seen and len(results) < limit:
+                        seen.add(key)
+                        results.append(dict(index.items[key]))
+        cached = {'results': results, 'source': source}
+        _search_cache.set(cache_key, cached)
+
+    response = jsonify(cached)
+    response.headers['Cache-Control'] = f"private, max-age={SEARCH_CACHE_TTL}"
+    return response
+
+# --- Realtime Notifications ---
+NOTIFY_CHANNEL = 'user_events'
+# LISTEN needs a session-level connection, which Neon's pgbouncer endpoint cannot provide
+LISTEN_DSN = _with_neon_endpoint_option(
+    os.environ.get('POSTGRES_LISTEN_URL')
+    or os.environ.get('POSTGRES_URL_NON_POOLING')
+    or os.environ.get('POSTGRES_URL')
+)
+# The SSE stream holds a worker thread and a LISTEN connection per instance, so
+# it only pays off on long-lived workers. On serverless each stream would be a
+# function invocation cut at the platform limit; clients poll with `since=` and
+# the unread count instead, which is the default.
+REALTIME_NOTIFICATIONS = os.environ.get('REALTIME_NOTIFICATIONS', '').lower() in {'1', 'true', 'yes'}
+# Streams end cleanly before idle proxies cut them off, so the browser gets a
+# normal close and reconnects after `retry` instead of seeing an error.
+SSE_MAX_SECONDS = float(os.environ.get('SSE_MAX_SECONDS', '300'))
+SSE_HEARTBEAT_SECONDS = 10
+SSE_RETRY_MS = 2000
+_NOTIFY_PAYLOAD_USERS = 150  # keeps pg_notify payloads under the 8000-byte limit
+
+def publish_user_event(cur, user_ids, event, data=None):
+    """Queue a realtime event for the given users.
+
+    Sent with pg_notify on the caller's cursor, so it is delivered to every
+    worker process only when the surrounding transaction commits.
+    """
+    user_ids = [str(u) for u in dict.fromkeys(user_ids)]
+    for start in range(0, len(user_ids), _NOTIFY_PAYLOAD_USERS):
+        payload = json.dumps({'users': user_ids[start:start + _NOTIFY_PAYLOAD_USERS], 'event': event, 'data': data or {}})
+        cur.execute("SELECT pg_notify(%s, %s)", (NOTIFY_CHANNEL, payload))
+
+class EventHub:
+    """Fans Postgres NOTIFY events out to the SSE streams open in this process."""
+
+    def __init__(self, dsn, channel):
+        self.dsn = dsn
+        self.channel = channel
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, user_id):
+        q = queue.Queue(maxsize=100)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(q)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._listen, name='event-hub', daemon=True)
+                self._thread.start()
+        return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def _dispatch(self, payload):
+        try:
+            message = json.loads(payload)
+        except ValueError:
+            return
+        with self._lock:
+            targets = [q for user_id in message.get('users', []) for q in self._subscribers.get(user_id, ())]
+        for q in targets:
+            try:
+                q.put_nowait((message.get('event'), message.get('data') or {}))
+            except queue.Full:
+                pass  # a stalled client resyncs when it reconnects
+
+    def _idle(self):
+        """True, and the listener is marked stopped, once no stream is subscribed."""
+        with self._lock:
+            if self._subscribers:
+                return False
+            self._thread = None
+            return True
+
+    def _listen(self):
+        """LISTEN while any stream in this process is open, then close the connection."""
+        while not self._idle():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+                with conn.cursor() as cur:
+                    cur.execute(f"LISTEN {self.channel};")
+                while True:
+                    if select.select([conn], [], [], SSE_HEARTBEAT_SECONDS) == ([], [], []):
+                        if self._idle():
+                            return
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        self._dispatch(conn.notifies.pop(0).payload)
+            except Exception as e:
+                print(f"Notification listener error, reconnecting: {e}")
+                time.sleep(2)
+            finally:
+                if conn is not None:
+                    conn.close()
+
+event_hub = EventHub(LISTEN_DSN, NOTIFY_CHANNEL)
+
+@app.route('/api/notifications/stream', methods=['GET'])
+@login_required
+def notifications_stream():
+    """Server-Sent Events stream of notification, read-state and reminder events."""
+    if not REALTIME_NOTIFICATIONS:
+        return jsonify({'error': 'Realtime notifications are disabled'}), 404
+    user_id = str(current_user.id)
+
+    def generate():
+        q = event_hub.subscribe(user_id)
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            deadline = time.monotonic() + SSE_MAX_SECONDS
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    event, data = q.get(timeout=min(SSE_HEARTBEAT_SECONDS, remaining))
+                except queue.Empty:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+        finally:
+            event_hub.unsubscribe(user_id, q)
+
+    return Response(generate(), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+# --- Notification API Endpoints ---
+
+NOTIFICATIONS_MAX_LIMIT = 100
+
+# Days a notification is kept, per notification_type. The expiry is stamped
+# into expires_at on insert, so a change applies to new rows only.
+NOTIFICATION_RETENTION_DAYS = {
+    'new_movie': int(os.environ.get('NOTIFICATION_TTL_NEW_MOVIE', '60')),
+    'hot_show': int(os.environ.get('NOTIFICATION_TTL_HOT_SHOW', '30')),
+    'trending': int(os.environ.get('NOTIFICATION_TTL_TRENDING', '14')),
+}
+
+def _expires_at_sql(type_column, start='CURRENT_TIMESTAMP'):
+    """SQL expression for a notification's expiry given its type column."""
+    cases = ' '.join(f"WHEN '{kind}' THEN {int(days)}" for kind, days in NOTIFICATION_RETENTION_DAYS.items())
+    longest = max(NOTIFICATION_RETENTION_DAYS.values())
+    return f"{start} + make_interval(days => CASE {type_column} {cases} ELSE {longest} END)"
+
+def _encode_cursor(created_at, notification_id):
+    raw = f"{created_at.isoformat()}|{notification_id}"
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_cursor(value):
+    """Parse an opaque (created_at, id) cursor; returns None when it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+        created_at, notification_id = raw.split('|', 1)
+        return datetime.fromisoformat(created_at), str(uuid.UUID(notification_id))
+    except ValueError:
+        return None
+
+_NIL_UUID = '00000000-0000-0000-0000-000000000000'
+
+def _encode_poll_cursor(xid, notification_id=_NIL_UUID):
+    return base64.urlsafe_b64encode(f"{xid}|{notification_id}".encode('utf-8')).decode('ascii').rstrip('=')
+
+def _decode_poll_cursor(value):
+    """Parse an opaque (created_xid, id) poll cursor; returns None when it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(value + '=' * (-len(value) % 4)).decode('utf-8')
+        xid, notification_id = raw.split('|', 1)
+        return str(int(xid)), str(uuid.UUID(notification_id))
+    except ValueError:
+        return None
+
+# Every transaction below this xid has finished, so polls only hand out rows
+# from those: a row committed later can then never land behind a poll cursor.
+_POLL_HORIZON_SQL = Statement('notifications_poll_horizon', """
+    SELECT pg_snapshot_xmin(pg_current_snapshot())::text
+""")
+
+_notifications_page_statements = {}
+_notifications_page_lock = threading.Lock()
+
+def _notifications_page_statement(by_type, unread_only, before, after, offset):
+    """The notification list query for one combination of filters, built once."""
+    key = (by_type, unread_only, before, after, offset)
+    statement = _notifications_page_statements.get(key)
+    if statement is not None:
+        return statement
+    # Fan-out rows take their text from the shared event
+    query = """
+        SELECT n.id,
+               COALESCE(n.title, e.title) AS title,
+               COALESCE(n.message, e.message) AS message,
+               n.media_type, n.tmdb_id,
+               COALESCE(n.poster_path, e.poster_path) AS poster_path,
+               n.notification_type, n.is_read, n.created_at{poll_column}
+        FROM notifications n
+        LEFT JOIN notification_events e ON e.id = n.event_id
+        WHERE n.user_id = %(user_id)s
+          AND (n.expires_at IS NULL OR n.expires_at > CURRENT_TIMESTAMP)
+    """
+    if by_type:
+        query += " AND n.notification_type = %(type)s"
+    if unread_only:
+        query += " AND n.is_read = FALSE"
+    if before:
+        query += " AND (n.created_at, n.id) < (%(before_at)s, %(before_id)s::uuid)"
+    query = query.format(poll_column=', n.created_xid::text AS poll_xid' if after else '')
+    if after:
+        # Oldest first, so a full page resumes where it stopped
+        query += """
+          AND (n.created_xid, n.id) > (%(after_xid)s::xid8, %(after_id)s::uuid)
+          AND n.created_xid < %(horizon)s::xid8
+          ORDER BY n.created_xid, n.id LIMIT %(limit)s
+        """
+    else:
+        query += " ORDER BY n.created_at DESC, n.id DESC LIMIT %(limit)s"
+    if offset:
+        # Legacy offset paging; cursors avoid scanning the skipped rows
+        query += " OFFSET %(offset)s"
+    with _notifications_page_lock:
+        if key not in _notifications_page_statements:
+            name = 'notifications_page_' + ''.join('1' if flag else '0' for flag in key)
+            _notifications_page_statements[key] = Statement(name, query)
+        return _notifications_page_statements[key]
+
+_NEXT_EXPIRY_SQL = Statement('notifications_next_expiry', """
+    SELECT MIN(expires_at) FROM notifications
+    WHERE user_id = %s AND expires_at > CURRENT_TIMESTAMP
+""")
+
+def _notification_versions(cur, user_id):
+    """ETag parts for the notification endpoints.
+
+    Rows leave the lists and counts when they expire, which no write marks, so
+    the user's next expiry is part of the tag alongside the collection version.
+    """
+    version = _collection_versions(cur, user_id, ['notifications'])['notifications']
+    next_expiry = run_statement(cur, _NEXT_EXPIRY_SQL, (user_id,)).fetchone()[0]
+    return [version, int(next_expiry.timestamp() * 1_000_000) if next_expiry else 0]
 
 @app.route('/api/notifications', methods=['GET'])
 @login_required
 def get_notifications():
-    """Get user's notifications"""
+    """Get user's notifications, newest first.
+
+    Pages are addressed with keyset cursors rather than OFFSET:
+    `cursor=` returns rows older than the cursor (next page) and `since=`
+    returns only rows added after it (polling). The response carries
+    `X-Next-Cursor` when more rows exist and `X-Poll-Cursor` to pass as
+    `since` on the next poll. A poll may repeat rows the first page already
+    showed but never skips one; clients merge by id.
+    """
     user_id = _uuid_str(current_user.id)
     
     # Get query parameters
-    limit = int(request.args.get('limit', 20))
-    offset = int(request.args.get('offset', 0))
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), NOTIFICATIONS_MAX_LIMIT))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({'error': 'limit and offset must be integers'}), 400
     notification_type = request.args.get('type')
     unread_only = request.args.get('unread_only', 'false').lower() == 'true'
+
+    before = after = None
+    if request.args.get('cursor'):
+        before = _decode_cursor(request.args['cursor'])
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+    if request.args.get('since'):
+        after = _decode_poll_cursor(request.args['since'])
+        if after is None:
+            return jsonify({'error': 'Invalid since cursor'}), 400
     
-    # Build query
-    query = """
-        SELECT id, title, message, media_type, tmdb_id, poster_path,
-               notification_type, is_read, created_at
-        FROM notifications
-        WHERE user_id = %s
-    """
-    params = [user_id]
-    
-    if notification_type:
-        query += " AND notification_type = %s"
-        params.append(notification_type)
-    
-    if unread_only:
-        query += " AND is_read = FALSE"
-    
-    query += " ORDER BY created_at DESC LIMIT %s OFFSET %s"
-    params.extend([limit, offset])
-    
+    statement = _notifications_page_statement(
+        bool(notification_type), unread_only, bool(before), bool(after), bool(offset) and not (before or after)
+    )
+    params = {
+        'user_id': user_id, 'type': notification_type, 'limit': limit, 'offset': offset,
+        'before_at': before and before[0], 'before_id': before and before[1],
+        'after_xid': after and after[0], 'after_id': after and after[1],
+    }
+
     with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            versions = _notification_versions(cur, user_id)
+            # Deeper pages are not a starting point for polling
+            horizon = None if before else run_statement(cur, _POLL_HORIZON_SQL, ()).fetchone()[0]
+        # Same query at the same version means the same page; a poll also
+        # depends on which transactions have finished
+        etag = _version_etag(user_id, versions + ([horizon] if after else []), request.query_string)
+        poll_cursor = horizon and _encode_poll_cursor(horizon)
+        if request.if_none_match.contains(etag):
+            response = _conditional_response(etag, None)
+            if poll_cursor:
+                response.headers['X-Poll-Cursor'] = poll_cursor
+            return response
+        params['horizon'] = horizon
         with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(query, params)
-            notifications = cur.fetchall()
-    
-    return jsonify(notifications)
+            notifications = run_statement(cur, statement, params).fetchall()
+
+    if after:
+        if len(notifications) == limit:
+            # More finished rows are waiting: resume right after this page
+            last = notifications[-1]
+            poll_cursor = _encode_poll_cursor(last['poll_xid'], last['id'])
+        for notification in notifications:
+            del notification['poll_xid']
+        notifications.sort(key=lambda n: (n['created_at'], str(n['id'])), reverse=True)
+
+    response = _conditional_response(etag, lambda: jsonify(notifications))
+    if poll_cursor:
+        response.headers['X-Poll-Cursor'] = poll_cursor
+    if notifications and not after and len(notifications) == limit:
+        oldest = notifications[-1]
+        response.headers['X-Next-Cursor'] = _encode_cursor(oldest['created_at'], oldest['id'])
+    return response
+
+_UNREAD_COUNT_SQL = Statement('unread_notifications', """
+    SELECT COUNT(*) FROM notifications
+    WHERE user_id = %s AND is_read = FALSE
+      AND (expires_at IS NULL OR expires_at > CURRENT_TIMESTAMP)
+""")
+
+@app.route('/api/notifications/unread-count', methods=['GET'])
+@login_required
+def get_unread_notification_count():
+    """Count unread notifications (answered from idx_notifications_unread)."""
+    user_id = _uuid_str(current_user.id)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            etag = _version_etag(user_id, _notification_versions(cur, user_id))
+            if request.if_none_match.contains(etag):
+                return _conditional_response(etag, None)
+            count = run_statement(cur, _UNREAD_COUNT_SQL, (user_id,)).fetchone()[0]
+    return _conditional_response(etag, lambda: jsonify({'count': count}))
+
+_REMINDERS_SQL = Statement('user_reminders', """
+    SELECT tmdb_id, media_type, title, poster_path, release_date, notified
+    FROM reminders
+    WHERE user_id = %s
+    ORDER BY release_date ASC
+""")
+
+_SAVE_REMINDER_SQL = Statement('save_reminder', """
+    INSERT INTO reminders (user_id, tmdb_id, media_type, title, poster_path, release_date)
+    VALUES (%s, %s, %s, %s, %s, %s)
+    ON CONFLICT (user_id, media_type, tmdb_id)
+    DO UPDATE SET title = EXCLUDED.title,
+                  poster_path = EXCLUDED.poster_path,
+                  release_date = EXCLUDED.release_date,
+                  notified = FALSE,
+                  created_at = CURRENT_TIMESTAMP
+""")
+
+_DELETE_REMINDER_SQL = Statement(
+    'delete_reminder', "DELETE FROM reminders WHERE user_id = %s AND tmdb_id = %s AND media_type = %s"
+)
 
 @app.route('/api/me/reminders', methods=['GET', 'POST', 'DELETE'])
 @login_required
@@ -556,18 +3288,14 @@ def reminders_api():
     user_id = _uuid_str(current_user.id)
     if request.method == 'GET':
         with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                version = _collection_versions(cur, user_id, ['reminders'])['reminders']
+            etag = _version_etag(user_id, [version])
+            if request.if_none_match.contains(etag):
+                return _conditional_response(etag, None)
             with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-                cur.execute(
-                    """
-                    SELECT tmdb_id, media_type, title, poster_path, release_date, notified
-                    FROM reminders
-                    WHERE user_id = %s
-                    ORDER BY release_date ASC
-                    """,
-                    (user_id,)
-                )
-                rows = cur.fetchall()
-        return jsonify(rows)
+                rows = run_statement(cur, _REMINDERS_SQL, (user_id,)).fetchall()
+        return _conditional_response(etag, lambda: jsonify(rows))
 
     payload = request.get_json() or {}
     tmdb_id = payload.get('tmdb_id')
@@ -585,64 +3313,122 @@ def reminders_api():
             if request.method == 'POST':
                 if not release_date:
                     return jsonify({'error': 'release_date is required'}), 400
-                cur.execute(
-                    """
-                    INSERT INTO reminders (user_id, tmdb_id, media_type, title, poster_path, release_date)
-                    VALUES (%s, %s, %s, %s, %s, %s)
-                    ON CONFLICT (user_id, media_type, tmdb_id)
-                    DO UPDATE SET title = EXCLUDED.title,
-                                  poster_path = EXCLUDED.poster_path,
-                                  release_date = EXCLUDED.release_date,
-                                  notified = FALSE,
-                                  created_at = CURRENT_TIMESTAMP
-                    """,
-                    (user_id, tmdb_id, media_type, title, poster_path, release_date)
-                )
+                run_statement(cur, _SAVE_REMINDER_SQL,
+                              (user_id, tmdb_id, media_type, title, poster_path, release_date))
             else:  # DELETE
-                cur.execute(
-                    "DELETE FROM reminders WHERE user_id = %s AND tmdb_id = %s AND media_type = %s",
-                    (user_id, tmdb_id, media_type)
-                )
+                run_statement(cur, _DELETE_REMINDER_SQL, (user_id, tmdb_id, media_type))
+            _bump_versions(cur, user_id, ['reminders'])
         conn.commit()
     return jsonify({'success': True})
 
+REMINDER_DISPATCH_CHUNK = int(os.environ.get('REMINDER_DISPATCH_CHUNK', '1000'))
+
+# Fires up to %(limit)s due reminders in one statement: marks them notified,
+# inserts their notifications and publishes one realtime event per user.
+_DISPATCH_REMINDERS_SQL = """
+    WITH due AS (
+        SELECT user_id, media_type, tmdb_id
+        FROM reminders
+        WHERE notified = FALSE AND release_date <= %(today)s {user_filter}
+        ORDER BY release_date
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), fired AS (
+        UPDATE reminders r
+        SET notified = TRUE
+        FROM due
+        WHERE r.user_id = due.user_id AND r.media_type = due.media_type AND r.tmdb_id = due.tmdb_id
+        RETURNING r.user_id, r.tmdb_id, r.media_type, r.title, r.poster_path
+    ), inserted AS (
+        INSERT INTO notifications (user_id, title, message, media_type, tmdb_id, poster_path, notification_type, expires_at)
+        SELECT f.user_id,
+               COALESCE(f.title, 'A title'),
+               COALESCE(f.title, 'A title') || ' is now available',
+               f.media_type, f.tmdb_id, f.poster_path, k.notification_type,
+               """ + _expires_at_sql('k.notification_type') + """
+        -- Not deduped against feed rows: the user asked for this one, and the
+        -- reminder is already marked notified, so skipping it would lose it.
+        -- Feeds skip titles the user already has a notification for instead.
+        FROM fired f
+        CROSS JOIN LATERAL (
+            SELECT CASE WHEN f.media_type = 'movie' THEN 'new_movie' ELSE 'hot_show' END AS notification_type
+        ) k
+        RETURNING user_id
+    ), per_user AS (
+        -- Every fired reminder inserts exactly one notification, so one count
+        -- serves both the chunk loop and the published event
+        SELECT user_id,
+               COUNT(*) AS fired,
+               (array_agg(json_build_object('tmdb_id', tmdb_id, 'media_type', media_type, 'title', title)))[1:20] AS titles
+        FROM fired
+        GROUP BY user_id
+    ), bumped AS (
+        INSERT INTO collection_versions (user_id, collection, version)
+        SELECT user_id, collection, 1
+        FROM per_user, unnest(ARRAY['reminders', 'notifications']) AS collection
+        ON CONFLICT (user_id, collection)
+        DO UPDATE SET version = collection_versions.version + 1
+    )
+    SELECT user_id, fired,
+           pg_notify(%(channel)s, json_build_object(
+               'users', json_build_array(user_id), 'event', 'notification',
+               'data', json_build_object('count', fired))::text),
+           pg_notify(%(channel)s, json_build_object(
+               'users', json_build_array(user_id), 'event', 'reminder',
+               'data', json_build_object('titles', to_json(titles)))::text)
+    FROM per_user
+"""
+
+_DISPATCH_ALL_REMINDERS = Statement('dispatch_reminders', _DISPATCH_REMINDERS_SQL.format(user_filter=''))
+_DISPATCH_USER_REMINDERS = Statement(
+    'dispatch_user_reminders', _DISPATCH_REMINDERS_SQL.format(user_filter='AND user_id = %(user_id)s')
+)
+
+def dispatch_due_reminders(user_id=None, chunk_size=REMINDER_DISPATCH_CHUNK):
+    """Turn due reminders into notifications, one set-based transaction per chunk.
+
+    Processes every user unless `user_id` is given. Returns the number of
+    reminders fired, which is also the number of notifications created.
+    """
+    statement = _DISPATCH_USER_REMINDERS if user_id else _DISPATCH_ALL_REMINDERS
+    params = {'today': date.today(), 'limit': chunk_size, 'user_id': user_id, 'channel': NOTIFY_CHANNEL}
+    total = 0
+    while True:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                fired = sum(row[1] for row in run_statement(cur, statement, params).fetchall())
+            conn.commit()
+        total += fired
+        if fired < chunk_size:
+            return total
+
 @app.route('/api/me/reminders/process', methods=['POST'])
 @login_required
 def process_due_reminders():
     """Create notifications for any reminders whose release_date is today or past and not yet notified."""
-    user_id = _uuid_str(current_user.id)
-    today = date.today()
+    created = dispatch_due_reminders(user_id=_uuid_str(current_user.id))
+    return jsonify({'success': True, 'notifications_created': created})
 
-    created = 0
-    with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
-            cur.execute(
-                """
-                SELECT tmdb_id, media_type, title, poster_path, release_date
-                FROM reminders
-                WHERE user_id = %s AND notified = FALSE AND release_date <= %s
-                """,
-                (user_id, today)
-            )
-            due_rows = cur.fetchall()
+@app.route('/api/cron/dispatch-reminders', methods=['GET', 'POST'])
+def cron_dispatch_reminders():
+    """Cron entry point that fires due reminders for every user."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, 'notifications_created': dispatch_due_reminders()})
 
-            for r in due_rows:
-                message = f"{r['title'] or 'A title'} is now available"
-                cur.execute(
-                    """
-                    INSERT INTO notifications (user_id, title, message, media_type, tmdb_id, poster_path, notification_type)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (user_id, r['title'], message, r['media_type'], r['tmdb_id'], r['poster_path'], 'new_movie' if r['media_type']=='movie' else 'hot_show')
-                )
-                cur.execute(
-                    "UPDATE reminders SET notified = TRUE WHERE user_id = %s AND media_type = %s AND tmdb_id = %s",
-                    (user_id, r['media_type'], r['tmdb_id'])
-                )
-                created += 1
-        conn.commit()
+@app.cli.command('dispatch-reminders')
+@click.option('--chunk-size', default=REMINDER_DISPATCH_CHUNK, show_default=True, help='Reminders fired per transaction.')
+def dispatch_reminders_command(chunk_size):
+    """Fire every due reminder for all users."""
+    click.echo(f"Created {dispatch_due_reminders(chunk_size=chunk_size)} notifications.")
 
-    return jsonify({'success': True, 'notifications_created': created})
+_MARK_READ_SQL = Statement(
+    'mark_notification_read', "UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s"
+)
+_MARK_ALL_READ_SQL = Statement(
+    'mark_all_notifications_read', "UPDATE notifications SET is_read = TRUE WHERE user_id = %s AND is_read = FALSE"
+)
+_DELETE_NOTIFICATION_SQL = Statement('delete_notification', "DELETE FROM notifications WHERE id = %s AND user_id = %s")
 
 @app.route('/api/notifications/<notification_id>/mark-read', methods=['POST'])
 @login_required
@@ -652,10 +3438,10 @@ def mark_notification_read(notification_id):
     
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE notifications SET is_read = TRUE WHERE id = %s AND user_id = %s",
-                (notification_id, user_id)
-            )
+            run_statement(cur, _MARK_READ_SQL, (notification_id, user_id))
+            if cur.rowcount:
+                _bump_versions(cur, user_id, ['notifications'])
+                publish_user_event(cur, [user_id], 'read', {'id': notification_id})
             conn.commit()
     
     return jsonify({'success': True})
@@ -668,10 +3454,10 @@ def mark_all_notifications_read():
     
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "UPDATE notifications SET is_read = TRUE WHERE user_id = %s",
-                (user_id,)
-            )
+            run_statement(cur, _MARK_ALL_READ_SQL, (user_id,))
+            if cur.rowcount:
+                _bump_versions(cur, user_id, ['notifications'])
+            publish_user_event(cur, [user_id], 'read', {'all': True})
             conn.commit()
     
     return jsonify({'success': True})
@@ -684,10 +3470,10 @@ def delete_notification(notification_id):
     
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "DELETE FROM notifications WHERE id = %s AND user_id = %s",
-                (notification_id, user_id)
-            )
+            run_statement(cur, _DELETE_NOTIFICATION_SQL, (notification_id, user_id))
+            if cur.rowcount:
+                _bump_versions(cur, user_id, ['notifications'])
+                publish_user_event(cur, [user_id], 'deleted', {'id': notification_id})
             conn.commit()
     
     return jsonify({'success': True})
@@ -753,100 +3539,710 @@ def notification_settings():
         
         return jsonify({'success': True})
 
+# --- Notification Feeds ---
+NOTIFICATION_FEED_INTERVAL = int(os.environ.get('NOTIFICATION_FEED_INTERVAL', '3600'))
+# Seconds a claimed feed stays reserved for the instance fetching it; a crashed
+# or stuck fetch is retried by someone else after this
+NOTIFICATION_FEED_LEASE = int(os.environ.get('NOTIFICATION_FEED_LEASE', '120'))
+NOTIFICATION_FEED_SIZE = 5
+
+# feed -> (TMDB path, params, notification_type, media_type, message template)
+NOTIFICATION_FEEDS = {
+    'now_playing': ('movie/now_playing', {'language': 'en-US', 'page': 1}, 'new_movie', 'movie', "{title} is now available"),
+    'trending_tv': ('trending/tv/week', {'language': 'en-US'}, 'hot_show', 'tv', "{title} is trending now"),
+}
+
+# Users receive an event when the matching notification_settings flag is on
+_SETTING_ENABLED_SQL = """
+    CASE e.notification_type
+        WHEN 'new_movie' THEN s.new_movies_enabled
+        WHEN 'hot_show' THEN s.hot_shows_enabled
+        ELSE s.trending_enabled
+    END
+"""
+
+_DELIVER_EVENTS_SQL = """
+    WITH delivered AS (
+        INSERT INTO notifications (user_id, media_type, tmdb_id, notification_type, event_id, expires_at)
+        SELECT s.user_id, e.media_type, e.tmdb_id, e.notification_type, e.id,
+               """ + _expires_at_sql('e.notification_type') + """
+        FROM notification_events e
+        JOIN notification_settings s ON """ + _SETTING_ENABLED_SQL + """
+        WHERE e.id = ANY(%(event_ids)s) {user_filter}
+          AND NOT EXISTS (
+              SELECT 1 FROM notifications n
+              WHERE n.user_id = s.user_id AND n.tmdb_id = e.tmdb_id
+                AND n.notification_type = e.notification_type AND n.media_type = e.media_type
+          )
+        RETURNING user_id, event_id
+    ), per_user AS (
+        SELECT user_id, COUNT(*) AS delivered FROM delivered GROUP BY user_id
+    ), bumped AS (
+        INSERT INTO collection_versions (user_id, collection, version)
+        SELECT user_id, 'notifications', 1 FROM per_user
+        ON CONFLICT (user_id, collection)
+        DO UPDATE SET version = collection_versions.version + 1
+    )
+    SELECT user_id, delivered,
+           pg_notify(%(channel)s, json_build_object(
+               'users', json_build_array(user_id), 'event', 'notification',
+               'data', json_build_object('count', delivered))::text)
+    FROM per_user
+"""
+
+def _deliver_events(cur, event_ids, user_id=None):
+    """Fan events out to every subscribed user (or just `user_id`) in one statement."""
+    if not event_ids:
+        return 0
+    cur.execute(
+        _DELIVER_EVENTS_SQL.format(user_filter='AND s.user_id = %(user_id)s' if user_id else ''),
+        {'event_ids': list(event_ids), 'user_id': user_id, 'channel': NOTIFY_CHANNEL}
+    )
+    return sum(row[1] for row in cur.fetchall())
+
+def _claim_due_feeds(force=False):
+    """Lease the due feeds and return the ones this caller should refresh.
+
+    The conditional UPDATE lets exactly one instance win a feed while its
+    lease is live. fetched_at is left alone until _finish_feed_claim.
+    """
+    feeds = list(NOTIFICATION_FEEDS)
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                INSERT INTO notification_feeds (feed, fetched_at)
+                SELECT unnest(%s::text[]), '-infinity'
+                ON CONFLICT (feed) DO NOTHING
+                """,
+                (feeds,)
+            )
+            cur.execute(
+                """
+                UPDATE notification_feeds
+                SET claimed_at = CURRENT_TIMESTAMP
+                WHERE feed = ANY(%s)
+                  AND (%s OR fetched_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                  AND (claimed_at IS NULL OR claimed_at < CURRENT_TIMESTAMP - make_interval(secs => %s))
+                RETURNING feed
+                """,
+                (feeds, force, NOTIFICATION_FEED_INTERVAL, NOTIFICATION_FEED_LEASE)
+            )
+            claimed = [row[0] for row in cur.fetchall()]
+        conn.commit()
+    return claimed
+
+def _finish_feed_claim(feed, fetched):
+    """Release a feed's lease; on success its fetch time becomes the claim time.
+
+    The claim time precedes every last_seen_at the fetch wrote, which is what
+    the per-user catch-up compares against. A failed fetch leaves fetched_at
+    as it was, so the next caller retries instead of waiting out the interval.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                UPDATE notification_feeds
+                SET fetched_at = CASE WHEN %s THEN claimed_at ELSE fetched_at END,
+                    claimed_at = NULL
+                WHERE feed = %s
+                """,
+                (fetched, feed)
+            )
+        conn.commit()
+
+def refresh_notification_feeds(force=False):
+    """Fetch each due TMDB feed once and deliver its new items to subscribed users.
+
+    Returns a dict with the feeds refreshed, new events and deliveries made.
+    """
+    claimed = _claim_due_feeds(force)
+    feeds = tmdb_get_many([NOTIFICATION_FEEDS[feed][:2] for feed in claimed], TMDB_BACKGROUND)
+    new_event_ids = []
+    for feed, data in zip(claimed, feeds):
+        _, _, notification_type, media_type, template = NOTIFICATION_FEEDS[feed]
+        if isinstance(data, TMDBError):
+            print(f"Error fetching notification feed {feed}: {data.message}")
+            _finish_feed_claim(feed, fetched=False)
+            continue
+        results = (data.get('results') or [])[:NOTIFICATION_FEED_SIZE]
+        rows = []
+        for item in results:
+            title = item.get('title') or item.get('name')
+            if not item.get('id') or not title:
+                continue
+            rows.append((feed, notification_type, media_type, item['id'], title,
+                         template.format(title=title), item.get('poster_path')))
+        if not rows:
+            _finish_feed_claim(feed, fetched=True)
+            continue
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                inserted = psycopg2.extras.execute_values(
+                    cur,
+                    """
+                    INSERT INTO notification_events (feed, notification_type, media_type, tmdb_id, title, message, poster_path)
+                    VALUES %s
+                    ON CONFLICT (notification_type, media_type, tmdb_id)
+                    DO UPDATE SET title = EXCLUDED.title,
+                                  message = EXCLUDED.message,
+                                  poster_path = EXCLUDED.poster_path,
+                                  last_seen_at = CURRENT_TIMESTAMP
+                    RETURNING id, (xmax = 0) AS is_new
+                    """,
+                    rows,
+                    fetch=True
+                )
+            conn.commit()
+        _finish_feed_claim(feed, fetched=True)
+        new_event_ids.extend(event_id for event_id, is_new in inserted if is_new)
+
+    delivered = 0
+    if new_event_ids:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                delivered = _deliver_events(cur, new_event_ids)
+            conn.commit()
+    return {'feeds': claimed, 'new_events': len(new_event_ids), 'delivered': delivered}
+
 @app.route('/api/admin/fetch-tmdb-notifications', methods=['POST'])
 @login_required
 def fetch_tmdb_notifications():
-    """Fetch new notifications from TMDB API"""
-    if not current_user.is_authenticated:
-        return jsonify({'error': 'Unauthorized'}), 401
-    
+    """Deliver the current TMDB feed items to the current user.
+
+    Only reads the shared feed state: fetching the feeds and fanning them out
+    to every user is the cron job's work (/api/cron/notification-feeds), not
+    something to do inside one user's request.
+    """
     user_id = _uuid_str(current_user.id)
-    
-    # Get user notification settings
+
     with get_db_connection() as conn:
-        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        with conn.cursor() as cur:
             cur.execute(
-                "SELECT * FROM notification_settings WHERE user_id = %s",
+                "SELECT CURRENT_TIMESTAMP FROM notification_settings WHERE user_id = %s",
                 (user_id,)
             )
-            settings = cur.fetchone()
-    
-    if not settings:
+            row = cur.fetchone()
+    if row is None:
         return jsonify({'error': 'Notification settings not found'}), 404
-    
-    new_notifications = []
-    tmdb_api_key = os.environ.get('TMDB_API_KEY')
-    
-    if not tmdb_api_key:
-        return jsonify({'error': 'TMDB API key not configured'}), 500
-    
-    # Fetch new movies
-    if settings.get('new_movies_enabled', True):
-        try:
-            movie_url = f"https://api.themoviedb.org/3/movie/now_playing?api_key={tmdb_api_key}&language=en-US&page=1"
-            response = requests.get(movie_url)
-            if response.status_code == 200:
-                movies_data = response.json()
-                for movie in movies_data.get('results', [])[:5]:  # Limit to 5 movies
-                    notification = {
-                        'title': movie.get('title', 'New Movie'),
-                        'message': f"{movie.get('title', 'Movie')} is now available",
-                        'media_type': 'movie',
-                        'tmdb_id': movie.get('id'),
-                        'poster_path': movie.get('poster_path'),
-                        'notification_type': 'new_movie'
-                    }
-                    new_notifications.append(notification)
-        except Exception as e:
-            print(f"Error fetching new movies: {e}")
-    
-    # Fetch hot shows
-    if settings.get('hot_shows_enabled', True):
-        try:
-            tv_url = f"https://api.themoviedb.org/3/trending/tv/week?api_key={tmdb_api_key}&language=en-US"
-            response = requests.get(tv_url)
-            if response.status_code == 200:
-                tv_data = response.json()
-                for show in tv_data.get('results', [])[:5]:  # Limit to 5 shows
-                    notification = {
-                        'title': show.get('name', 'Hot Show'),
-                        'message': f"{show.get('name', 'Show')} is trending now",
-                        'media_type': 'tv',
-                        'tmdb_id': show.get('id'),
-                        'poster_path': show.get('poster_path'),
-                        'notification_type': 'hot_show'
-                    }
-                    new_notifications.append(notification)
-        except Exception as e:
-            print(f"Error fetching hot shows: {e}")
-    
-    # Save notifications to database
+
+    started_at = row[0]
+
+    # Catch the user up on each feed's latest fetch, then report everything
+    # delivered to them since this request started
     with get_db_connection() as conn:
         with conn.cursor() as cur:
-            for notification in new_notifications:
-                cur.execute(
-                    """
-                    INSERT INTO notifications (user_id, title, message, media_type, tmdb_id, poster_path, notification_type)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                    """,
-                    (
-                        user_id,
-                        notification['title'],
-                        notification['message'],
-                        notification['media_type'],
-                        notification['tmdb_id'],
-                        notification['poster_path'],
-                        notification['notification_type']
-                    )
-                )
-            conn.commit()
-    
+            cur.execute(
+                """
+                SELECT e.id
+                FROM notification_events e
+                JOIN notification_feeds f ON f.feed = e.feed
+                JOIN notification_settings s ON s.user_id = %(user_id)s AND """ + _SETTING_ENABLED_SQL + """
+                WHERE e.last_seen_at >= f.fetched_at
+                  AND NOT EXISTS (
+                      SELECT 1 FROM notifications n WHERE n.user_id = %(user_id)s AND n.event_id = e.id
+                  )
+                """,
+                {'user_id': user_id}
+            )
+            _deliver_events(cur, [r[0] for r in cur.fetchall()], user_id=user_id)
+        conn.commit()
+
+    with get_db_connection() as conn:
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            cur.execute(
+                """
+                SELECT e.title, e.message, e.media_type, e.tmdb_id, e.poster_path, e.notification_type
+                FROM notifications n
+                JOIN notification_events e ON e.id = n.event_id
+                WHERE n.user_id = %s AND n.created_at >= %s
+                ORDER BY n.created_at, e.id
+                """,
+                (user_id, started_at)
+            )
+            new_notifications = cur.fetchall()
+
     return jsonify({
         'success': True,
         'notifications_added': len(new_notifications),
         'notifications': new_notifications
     })
 
+@app.route('/api/cron/notification-feeds', methods=['GET', 'POST'])
+def cron_notification_feeds():
+    """Cron entry point that refreshes the shared TMDB notification feeds."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, **refresh_notification_feeds()})
+
+@app.cli.command('refresh-notification-feeds')
+@click.option('--force', is_flag=True, help='Refetch feeds even if the interval has not elapsed.')
+def refresh_notification_feeds_command(force):
+    """Fetch TMDB notification feeds and fan new items out to users."""
+    result = refresh_notification_feeds(force=force)
+    click.echo(f"Feeds refreshed: {', '.join(result['feeds']) or 'none'}; "
+               f"new events: {result['new_events']}; notifications delivered: {result['delivered']}")
+
+# --- Notification Retention ---
+NOTIFICATION_SWEEP_CHUNK = int(os.environ.get('NOTIFICATION_SWEEP_CHUNK', '5000'))
+# Seconds one sweep may run; cron invocations are capped at 20 (vercel.json)
+NOTIFICATION_SWEEP_BUDGET = 15
+NOTIFICATION_PARTITION_MONTHS_AHEAD = 2
+
+# Deletes up to %(limit)s expired rows and bumps each affected user's version
+_SWEEP_NOTIFICATIONS_SQL = """
+    WITH doomed AS (
+        SELECT id, created_at FROM notifications
+        WHERE expires_at <= CURRENT_TIMESTAMP
+        ORDER BY expires_at
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ), deleted AS (
+        DELETE FROM notifications n
+        USING doomed d
+        WHERE n.id = d.id AND n.created_at = d.created_at
+        RETURNING n.user_id
+    ), bumped AS (
+        INSERT INTO collection_versions (user_id, collection, version)
+        SELECT DISTINCT user_id, 'notifications', 1 FROM deleted WHERE user_id IS NOT NULL
+        ON CONFLICT (user_id, collection)
+        DO UPDATE SET version = collection_versions.version + 1
+    )
+    SELECT COUNT(*) FROM deleted
+"""
+
+# Constraints and indexes recreated on the partitioned table; the primary
+# key must include the partition column
+_PARTITIONED_NOTIFICATIONS_DDL = [
+    "ALTER TABLE notifications ADD PRIMARY KEY (id, created_at)",
+    "ALTER TABLE notifications ADD FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE",
+    "ALTER TABLE notifications ADD FOREIGN KEY (event_id) REFERENCES notification_events(id) ON DELETE CASCADE",
+    "CREATE INDEX idx_notifications_user_type ON notifications(user_id, notification_type, created_at DESC)",
+    "CREATE INDEX idx_notifications_unread ON notifications(user_id, is_read, created_at DESC)",
+    "CREATE INDEX idx_notifications_user_created ON notifications(user_id, created_at DESC, id DESC)",
+    "CREATE INDEX idx_notifications_user_event ON notifications(user_id, event_id) WHERE event_id IS NOT NULL",
+    "CREATE INDEX idx_notifications_user_title ON notifications(user_id, tmdb_id, notification_type)",
+    "CREATE INDEX idx_notifications_expires ON notifications(expires_at)",
+]
+
+def _next_month(day):
+    return (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def _notifications_partitioned(cur):
+    cur.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'notifications'::regclass)")
+    return cur.fetchone()[0]
+
+def _ensure_notification_partitions(cur, start):
+    """Create monthly partitions (UTC bounds) from `start` until a few months ahead."""
+    month, last = start.replace(day=1), date.today().replace(day=1)
+    for _ in range(NOTIFICATION_PARTITION_MONTHS_AHEAD):
+        last = _next_month(last)
+    while month <= last:
+        cur.execute(
+            f"CREATE TABLE IF NOT EXISTS notifications_p{month:%Y%m} PARTITION OF notifications "
+            "FOR VALUES FROM (%s) TO (%s)",
+            (f"{month.isoformat()} 00:00+00", f"{_next_month(month).isoformat()} 00:00+00")
+        )
+        month = _next_month(month)
+
+def _drop_expired_partitions(cur):
+    """Drop monthly partitions whose rows are all past the longest retention."""
+    horizon = date.today() - timedelta(days=max(NOTIFICATION_RETENTION_DAYS.values()))
+    cur.execute(
+        """
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = 'notifications'::regclass AND c.relname ~ '^notifications_p[0-9]{6}$'
+        ORDER BY c.relname
+        """
+    )
+    dropped = []
+    for (name,) in cur.fetchall():
+        month = date(int(name[-6:-2]), int(name[-2:]), 1)
+        if _next_month(month) > horizon:
+            continue
+        # Their owners' cached notification lists are now stale
+        cur.execute(f"""
+            INSERT INTO collection_versions (user_id, collection, version)
+            SELECT DISTINCT user_id, 'notifications', 1 FROM {name} WHERE user_id IS NOT NULL
+            ON CONFLICT (user_id, collection)
+            DO UPDATE SET version = collection_versions.version + 1
+        """)
+        cur.execute(f"DROP TABLE {name}")
+        dropped.append(name)
+    return dropped
+
+def partition_notifications():
+    """Convert notifications into a table range-partitioned by month on created_at.
+
+    Copies every row in one transaction while holding an exclusive lock, so
+    run it when traffic is low. Returns False if the table was already
+    partitioned.
+    """
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+            if _notifications_partitioned(cur):
+                return False
+            cur.execute("LOCK TABLE notifications IN ACCESS EXCLUSIVE MODE")
+            cur.execute("UPDATE notifications SET created_at = CURRENT_TIMESTAMP WHERE created_at IS NULL")
+            cur.execute("SELECT MIN(created_at) FROM notifications")
+            oldest = cur.fetchone()[0]
+            cur.execute("ALTER TABLE notifications RENAME TO notifications_unpartitioned")
+            cur.execute("""
+                CREATE TABLE notifications
+                    (LIKE notifications_unpartitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                PARTITION BY RANGE (created_at)
+            """)
+            cur.execute("CREATE TABLE notifications_default PARTITION OF notifications DEFAULT")
+            _ensure_notification_partitions(cur, oldest.date() if oldest else date.today())
+            cur.execute("INSERT INTO notifications SELECT * FROM notifications_unpartitioned")
+            cur.execute("DROP TABLE notifications_unpartitioned")
+            for statement in _PARTITIONED_NOTIFICATIONS_DDL:
+                cur.execute(statement)
+        conn.commit()
+    return True
+
+def sweep_expired_notifications(chunk_size=NOTIFICATION_SWEEP_CHUNK, budget=NOTIFICATION_SWEEP_BUDGET):
+    """Delete expired notifications in bounded chunks, one transaction each.
+
+    On a partitioned table, upcoming months are created and whole months
+    past the longest retention are dropped first. Stops after `budget`
+    seconds (None for no limit); the next run picks up where it left off.
+    Returns a summary dict.
+    """
+    started = time.monotonic()
+    dropped = []
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            if _notifications_partitioned(cur):
+                _ensure_notification_partitions(cur, date.today())
+                dropped = _drop_expired_partitions(cur)
+        conn.commit()
+
+    deleted = 0
+    while budget is None or time.monotonic() - started < budget:
+        with get_db_connection() as conn:
+            with conn.cursor() as cur:
+                cur.execute(_SWEEP_NOTIFICATIONS_SQL, {'limit': chunk_size})
+                count = cur.fetchone()[0]
+            conn.commit()
+        deleted += count
+        if count < chunk_size:
+            break
+    return {'deleted': deleted, 'partitions_dropped': dropped}
+
+@app.route('/api/cron/sweep-notifications', methods=['GET', 'POST'])
+def cron_sweep_notifications():
+    """Cron entry point that deletes expired notifications."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify({'success': True, **sweep_expired_notifications()})
+
+@app.cli.command('sweep-notifications')
+@click.option('--chunk-size', default=NOTIFICATION_SWEEP_CHUNK, show_default=True, help='Rows deleted per transaction.')
+def sweep_notifications_command(chunk_size):
+    """Delete every expired notification."""
+    result = sweep_expired_notifications(chunk_size=chunk_size, budget=None)
+    click.echo(f"Deleted {result['deleted']} expired notifications; "
+               f"dropped partitions: {', '.join(result['partitions_dropped']) or 'none'}")
+
+@app.cli.command('partition-notifications')
+def partition_notifications_command():
+    """Convert the notifications table to monthly partitions (one-off, locks the table)."""
+    if partition_notifications():
+        click.echo("notifications is now partitioned by month.")
+    else:
+        click.echo("notifications is already partitioned.")
+
+# --- Recommendations ---
+# Implicit-feedback strength of each collection; a title in several adds up
+RECOMMENDER_WEIGHTS = {'likes': 3.0, 'my_list': 2.0, 'trailers_watched': 1.0}
+RECOMMENDER_TOP_K = int(os.environ.get('RECOMMENDER_TOP_K', '50'))
+# Titles with fewer interested users than this get no neighbour list
+RECOMMENDER_MIN_USERS = int(os.environ.get('RECOMMENDER_MIN_USERS', '2'))
+RECOMMENDER_BLOCK = 2048
+RECOMMENDATION_SEEDS = 200
+RECOMMENDATIONS_MAX = 60
+
+def compute_title_neighbors(users, items, weights, top_k=RECOMMENDER_TOP_K, min_users=RECOMMENDER_MIN_USERS):
+    """Item-item cosine neighbours from implicit feedback.
+
+    `users`, `items` and `weights` are parallel arrays with one entry per
+    interaction (integer user and item codes). Returns parallel arrays
+    (item, neighbor, score, rank) holding each item's `top_k` most similar
+    items. Needs NumPy and SciPy, which the web app itself does not.
+    """
+    import numpy as np
+    from scipy import sparse
+
+    users = np.asarray(users, dtype=np.int64)
+    items = np.asarray(items, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    n_items = int(items.max()) + 1 if len(items) else 0
+    empty = (np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0, np.float32), np.empty(0, np.int16))
+    if n_items == 0:
+        return empty
+
+    matrix = sparse.csr_matrix((weights, (users, items)), shape=(int(users.max()) + 1, n_items))
+    matrix.sum_duplicates()
+    matrix.data = np.log1p(matrix.data)
+
+    # Damp heavy users so one binge-saver doesn't link everything they touched
+    per_user = np.diff(matrix.indptr)
+    matrix = sparse.diags(1.0 / np.log2(2.0 + per_user)).dot(matrix).tocsc()
+
+    per_item = np.diff(matrix.indptr)
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    keep = (per_item >= min_users) & (norms > 0)
+    scale = np.where(keep, 1.0 / np.where(norms > 0, norms, 1.0), 0.0)
+    matrix = matrix.dot(sparse.diags(scale.astype(np.float32))).tocsc()
+    item_major = matrix.T.tocsr()
+
+    out_items, out_neighbors, out_scores, out_ranks = [], [], [], []
+    for start in range(0, n_items, RECOMMENDER_BLOCK):
+        stop = min(start + RECOMMENDER_BLOCK, n_items)
+        block = item_major[start:stop].dot(matrix).tocsr()
+        for row in range(stop - start):
+            lo, hi = block.indptr[row], block.indptr[row + 1]
+            neighbors, scores = block.indices[lo:hi], block.data[lo:hi]
+            others = (neighbors != start + row) & (scores > 0)
+            neighbors, scores = neighbors[others], scores[others]
+            if not len(scores):
+                continue
+            if len(scores) > top_k:
+                top = np.argpartition(-scores, top_k - 1)[:top_k]
+                neighbors, scores = neighbors[top], scores[top]
+            order = np.argsort(-scores, kind='stable')
+            out_items.append(np.full(len(order), start + row, dtype=np.int64))
+            out_neighbors.append(neighbors[order].astype(np.int64))
+            out_scores.append(scores[order].astype(np.float32))
+            out_ranks.append(np.arange(1, len(order) + 1, dtype=np.int16))
+    if not out_items:
+        return empty
+    return (np.concatenate(out_items), np.concatenate(out_neighbors),
+            np.concatenate(out_scores), np.concatenate(out_ranks))
+
+def _load_interactions(conn):
+    """Stream every (user, title, weight) interaction into integer-coded arrays."""
+    from array import array
+    user_codes, title_codes = {}, {}
+    users, items, weights = array('q'), array('q'), array('f')
+    union = "\nUNION ALL\n".join(
+        f"SELECT user_id, media_type, tmdb_id, {weight}::real FROM {table}"
+        for table, weight in RECOMMENDER_WEIGHTS.items()
+    )
+    # A named cursor keeps millions of rows out of memory; it lives until commit
+    with conn.cursor(name='recommender_interactions') as cur:
+        cur.itersize = 50000
+        cur.execute(union)
+        for user_id, media_type, tmdb_id, weight in cur:
+            users.append(user_codes.setdefault(user_id, len(user_codes)))
+            items.append(title_codes.setdefault((media_type, tmdb_id), len(title_codes)))
+            weights.append(weight)
+    return users, items, weights, list(title_codes)
+
+def build_recommendations(top_k=RECOMMENDER_TOP_K):
+    """Recompute title_neighbors from likes, my_list and trailers_watched.
+
+    The old neighbour lists stay readable until the new ones commit.
+    Returns a summary dict of the run.
+    """
+    started = time.perf_counter()
+    with get_db_connection() as conn:
+        users, items, weights, titles = _load_interactions(conn)
+        conn.commit()
+        item_idx, neighbor_idx, scores, ranks = compute_title_neighbors(users, items, weights, top_k)
+
+        rows = (
+            (*titles[i], int(r), *titles[n], float(sc))
+            for i, n, sc, r in zip(item_idx.tolist(), neighbor_idx.tolist(), scores.tolist(), ranks.tolist())
+        )
+        with conn.cursor() as cur:
+            cur.execute("DELETE FROM title_neighbors")
+            psycopg2.extras.execute_values(
+                cur,
+                """
+                INSERT INTO title_neighbors
+                    (media_type, tmdb_id, rank, neighbor_media_type, neighbor_tmdb_id, score)
+                VALUES %s
+                """,
+                rows,
+                page_size=5000
+            )
+            summary = {
+                'interactions': len(items),
+                'titles': len(titles),
+                'neighbors': len(item_idx),
+                'seconds': round(time.perf_counter() - started, 2),
+            }
+            cur.execute(
+                """
+                INSERT INTO recommender_builds (interactions, titles, neighbors, seconds)
+                VALUES (%(interactions)s, %(titles)s, %(neighbors)s, %(seconds)s)
+                """,
+                summary
+            )
+        conn.commit()
+    return summary
+
+# Scores neighbours of the user's most recent titles, skipping what they already have
+_RECOMMENDATIONS_SQL = Statement('recommendations', """
+    WITH interactions AS (
+        """ + "\n        UNION ALL\n        ".join(
+            f"SELECT media_type, tmdb_id, {weight}::real AS weight, created_at FROM {table} WHERE user_id = %(user_id)s"
+            for table, weight in RECOMMENDER_WEIGHTS.items()
+        ) + """
+    ), seeds AS (
+        SELECT media_type, tmdb_id, SUM(weight) AS weight
+        FROM interactions
+        GROUP BY media_type, tmdb_id
+        ORDER BY MAX(created_at) DESC
+        LIMIT %(seeds)s
+    ), scored AS (
+        SELECT n.neighbor_media_type AS media_type, n.neighbor_tmdb_id AS tmdb_id,
+               SUM(n.score * s.weight) AS score
+        FROM seeds s
+        JOIN title_neighbors n ON n.media_type = s.media_type AND n.tmdb_id = s.tmdb_id
+        WHERE NOT EXISTS (
+            SELECT 1 FROM interactions i
+            WHERE i.media_type = n.neighbor_media_type AND i.tmdb_id = n.neighbor_tmdb_id
+        )
+        GROUP BY n.neighbor_media_type, n.neighbor_tmdb_id
+        ORDER BY score DESC
+        LIMIT %(limit)s
+    )
+    SELECT sc.media_type, sc.tmdb_id, t.data
+    FROM scored sc
+    LEFT JOIN titles t ON t.media_type = sc.media_type AND t.tmdb_id = sc.tmdb_id
+    ORDER BY sc.score DESC
+""")
+
+@app.route('/api/me/recommendations', methods=['GET'])
+@login_required
+def api_recommendations():
+    """A "Top Picks" row built from precomputed title neighbours.
+
+    Returns {"results": [...]} of TMDB-shaped title objects, best first;
+    empty until the recommender has run or the user has saved anything.
+    """
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), RECOMMENDATIONS_MAX))
+    except ValueError:
+        return jsonify({'error': 'limit must be an integer'}), 400
+    user_id = _uuid_str(current_user.id)
+    collections = list(RECOMMENDER_WEIGHTS)
+
+    with get_db_connection() as conn:
+        with conn.cursor() as cur:
+            versions = _collection_versions(cur, user_id, collections)
+            cur.execute("SELECT COALESCE(MAX(id), 0) FROM recommender_builds")
+            build = cur.fetchone()[0]
+            etag = _version_etag(user_id, [build, *versions.values()], request.query_string)
+            if request.if_none_match.contains(etag):
+                return _conditional_response(etag, None)
+            rows = run_statement(
+                cur, _RECOMMENDATIONS_SQL, {'user_id': user_id, 'seeds': RECOMMENDATION_SEEDS, 'limit': limit}
+            ).fetchall()
+
+    # Neighbours normally have stored metadata; anything missing comes from TMDB
+    missing = [(media_type, tmdb_id, '') for media_type, tmdb_id, data in rows if not data]
+    fetched = fetch_title_details(missing) if missing else {}
+    results = []
+    for media_type, tmdb_id, data in rows:
+        if not data:
+            data = fetched.get((media_type, tmdb_id, ''))
+            if not isinstance(data, dict):
+                continue
+            data = _slim_title(data)
+        results.append({**data, 'id': tmdb_id, 'media_type': media_type})
+    return _conditional_response(etag, lambda: jsonify({'results': results}))
+
+@app.cli.command('build-recommendations')
+@click.option('--top-k', default=RECOMMENDER_TOP_K, show_default=True, help='Neighbours kept per title.')
+def build_recommendations_command(top_k):
+    """Recompute similar-title lists (requires numpy and scipy)."""
+    try:
+        summary = build_recommendations(top_k)
+    except ImportError as e:
+        raise click.ClickException(f"{e}. Install numpy and scipy to build recommendations.")
+    click.echo(f"{summary['interactions']} interactions over {summary['titles']} titles -> "
+               f"{summary['neighbors']} neighbours in {summary['seconds']}s")
+
+# --- Internal Endpoints ---
+@app.route('/api/internal/pool-stats', methods=['GET'])
+def pool_stats():
+    """Connection pool counters and checkout wait-time histogram."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    return jsonify(get_pool().stats())
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus exposition of this instance's request, pool and hashing metrics."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+    lines = request_metrics.render()
+    if pool is not None:
+        stats = pool.stats()
+        for name in ('size', 'in_use', 'idle', 'waiting'):
+            lines.append(f'# TYPE db_pool_{name} gauge')
+            lines.append(f'db_pool_{name} {stats[name]}')
+        for name in ('checkouts', 'timeouts', 'connects', 'broken'):
+            lines.append(f'# TYPE db_pool_{name}_total counter')
+            lines.append(f'db_pool_{name}_total {stats[name]}')
+        lines.append('# TYPE db_pool_checkout_wait_seconds histogram')
+        cumulative = 0
+        for bound, count in stats['wait_seconds']['buckets'].items():
+            cumulative += count
+            lines.append(f'db_pool_checkout_wait_seconds_bucket{{le="{bound}"}} {cumulative}')
+        lines.append(f"db_pool_checkout_wait_seconds_sum {stats['wait_seconds']['sum']}")
+        lines.append(f"db_pool_checkout_wait_seconds_count {stats['wait_seconds']['count']}")
+    hashing = password_hasher.stats()
+    lines.append('# TYPE password_hash_completed_total counter')
+    lines.append(f"password_hash_completed_total {hashing['completed']}")
+    lines.append('# TYPE password_hash_rejected_total counter')
+    lines.append(f"password_hash_rejected_total {hashing['rejected']}")
+    return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/internal/tmdb-stats', methods=['GET'])
+def tmdb_stats():
+    """TMDB request budget usage per lane, throttling and stale-serving counters."""
+    if not _cron_authorized():
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    async def snapshot():
+        return _tmdb_scheduler().stats()
+
+    return jsonify({**_tmdb_runner.run(snapshot(), timeout=2), 'cache_entries': len(_tmdb_cache)})
+
+# --- Background Work ---
+_background_started = False
+_background_lock = threading.Lock()
+
+def start_background_work():
+    """Start optional process-level background threads, once per process.
+
+    Routes and config are registered on the module-level `app` as the module
+    loads; this only adds threads, and none of them touch the database until
+    they run. It is called from the first request rather than at import, so
+    importing the module (cold starts, CLI commands, the startup profiler)
+    starts nothing.
+    """
+    global _background_started
+    with _background_lock:
+        if _background_started:
+            return
+        _background_started = True
+    if CATALOG_REFRESH_INTERVAL > 0:
+        threading.Thread(target=_catalog_refresher, name='catalog-refresher', daemon=True).start()
+
+@app.before_request
+def _ensure_background_work():
+    if not _background_started:
+        start_background_work()
+
 # For Vercel deployment
 if __name__ == "__main__":
     app.run(debug=True, port=5002)
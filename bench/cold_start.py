@@ -0,0 +1,88 @@
+"""Measure import-to-first-request time of api/main.py.
+
+Each run starts a fresh interpreter (like a serverless cold start), imports
+the app, and serves one request through the Flask test client. Pass
+--baseline <git ref> to time that revision's api/main.py against the same
+database for a before/after comparison:
+
+    python bench/cold_start.py --runs 10 --baseline HEAD~1
+
+Needs POSTGRES_URL (or BENCH_POSTGRES_URL) pointing at a migrated database.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line of timings in ms.
+CHILD = r"""
+import json, sys, time
+t0 = time.perf_counter()
+sys.path.insert(0, sys.argv[1])
+import main
+t1 = time.perf_counter()
+response = main.app.test_client().get(sys.argv[2])
+t2 = time.perf_counter()
+print(json.dumps({'import_ms': (t1 - t0) * 1000, 'first_request_ms': (t2 - t1) * 1000,
+                  'total_ms': (t2 - t0) * 1000, 'status': response.status_code}))
+"""
+
+
+def checkout(ref, workdir):
+    """Write `ref`'s api/main.py into workdir with the templates/static it expects."""
+    source = subprocess.run(
+        ['git', 'show', f'{ref}:api/main.py'], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    api_dir = os.path.join(workdir, 'api')
+    os.makedirs(api_dir)
+    with open(os.path.join(api_dir, 'main.py'), 'w') as f:
+        f.write(source)
+    for name in ('templates', 'static'):
+        os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+    return api_dir
+
+
+def measure(api_dir, runs, path, env):
+    samples = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, '-c', CHILD, api_dir, path],
+            cwd=os.path.dirname(api_dir), env=env, check=True, capture_output=True, text=True
+        ).stdout
+        samples.append(json.loads(out.strip().splitlines()[-1]))
+    return samples
+
+
+def summarize(label, samples):
+    print(f"{label} ({len(samples)} runs, status {samples[-1]['status']})")
+    for key in ('import_ms', 'first_request_ms', 'total_ms'):
+        values = [s[key] for s in samples]
+        print(f"  {key:<17} median {statistics.median(values):8.1f}   min {min(values):8.1f}   max {max(values):8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/login', help='request served after import (default /login)')
+    parser.add_argument('--baseline', help='git ref to compare against, e.g. HEAD~1')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if env.get('BENCH_POSTGRES_URL'):
+        env['POSTGRES_URL'] = env['BENCH_POSTGRES_URL']
+    if not env.get('POSTGRES_URL'):
+        sys.exit('Set POSTGRES_URL or BENCH_POSTGRES_URL')
+
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as workdir:
+            summarize(f"baseline {args.baseline}", measure(checkout(args.baseline, workdir), args.runs, args.path, env))
+    summarize("working tree", measure(os.path.join(ROOT, 'api'), args.runs, args.path, env))
+
+
+if __name__ == '__main__':
+    main()
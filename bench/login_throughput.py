@@ -0,0 +1,94 @@
+"""Login throughput per core for the password hashing paths in api/main.py.
+
+Drives `check_password_hash` from many concurrent "request" threads, either
+inline on those threads (the old behaviour) or through `PasswordHasher`
+with process or thread workers. A probe thread runs a small pure-Python
+task throughout, standing in for the other requests on the same worker;
+its p95 latency shows how much the hashing starves them.
+
+    python bench/login_throughput.py
+    python bench/login_throughput.py --method scrypt:16384:8:1 --clients 32 --seconds 10
+
+Needs the app's requirements to import api/main.py. No database is used.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+from main import HashingBusy, PasswordHasher  # noqa: E402
+from werkzeug.security import check_password_hash, generate_password_hash  # noqa: E402
+
+
+def probe(stop, latencies):
+    """Time a ~1 ms slice of pure-Python work every 10 ms."""
+    while not stop.is_set():
+        started = time.perf_counter()
+        sum(i * i for i in range(20000))
+        latencies.append(time.perf_counter() - started)
+        time.sleep(0.01)
+
+
+def run(label, verify, clients, seconds, cores):
+    done, busy = [0], [0]
+    lock = threading.Lock()
+    stop = threading.Event()
+    probe_latencies = []
+
+    def client():
+        while not stop.is_set():
+            try:
+                verify()
+                with lock:
+                    done[0] += 1
+            except HashingBusy:
+                with lock:
+                    busy[0] += 1
+                time.sleep(0.005)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    threads.append(threading.Thread(target=probe, args=(stop, probe_latencies)))
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - started
+
+    probe_latencies.sort()
+    p95 = probe_latencies[int(len(probe_latencies) * 0.95) - 1] * 1000 if probe_latencies else float('nan')
+    rate = done[0] / wall
+    print(f"{label:<16} {rate:9.1f} logins/s {rate / cores:9.1f} per core   "
+          f"503s {busy[0]:6d}   probe p95 {p95:7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--method', default=os.environ.get('PASSWORD_HASH_METHOD', 'scrypt'))
+    parser.add_argument('--clients', type=int, default=16, help='concurrent login threads')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--queue', type=int, default=None, help='pending hashes before 503 (default 4 per worker)')
+    parser.add_argument('--seconds', type=float, default=5.0, help='duration of each run')
+    args = parser.parse_args()
+
+    pwhash = generate_password_hash('correct horse', args.method)
+    queue = args.workers * 4 if args.queue is None else args.queue
+    cores = min(args.workers, os.cpu_count() or 1)
+    print(f"method {pwhash.split('$', 1)[0]}, {args.clients} clients, {args.workers} workers, {os.cpu_count()} CPUs")
+
+    run("inline", lambda: check_password_hash(pwhash, 'correct horse'), args.clients, args.seconds, os.cpu_count() or 1)
+    for use_processes, label in ((True, 'process pool'), (False, 'thread pool')):
+        hasher = PasswordHasher(args.workers, queue, use_processes)
+        try:
+            run(label, lambda: hasher.verify(pwhash, 'correct horse'), args.clients, args.seconds, cores)
+        finally:
+            hasher.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""A local stand-in for the TMDB API with configurable latency and failures.
+
+    python bench/mock_tmdb.py --port 8765 --latency-ms 120 --fail-rate 0.02
+
+Point the app at it with TMDB_API_BASE=http://127.0.0.1:8765/3 and any
+TMDB_API_KEY. Every path answers 200 with a small plausible payload, except
+for the --fail-rate share of requests, which get a 503 (or a 429 with
+Retry-After when --throttle is set) to exercise the client's retries.
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+_DETAIL_RE = re.compile(r'^/3/(movie|tv)/(\d+)$')
+
+
+def payload_for(path):
+    match = _DETAIL_RE.match(path)
+    if match:
+        media_type, tmdb_id = match.group(1), int(match.group(2))
+        name_key = 'title' if media_type == 'movie' else 'name'
+        return {
+            'id': tmdb_id,
+            name_key: f"Title {tmdb_id}",
+            'overview': 'A mock title served by bench/mock_tmdb.py.',
+            'poster_path': f"/poster{tmdb_id}.jpg",
+            'backdrop_path': f"/backdrop{tmdb_id}.jpg",
+            'vote_average': 7.1,
+            'videos': {'results': [{'site': 'YouTube', 'type': 'Trailer', 'key': f"mock{tmdb_id}"}]},
+        }
+    return {
+        'page': 1,
+        'results': [
+            {'id': 1000 + i, 'title': f"Movie {i}", 'name': f"Show {i}", 'media_type': 'movie',
+             'poster_path': f"/p{i}.jpg", 'backdrop_path': f"/b{i}.jpg", 'overview': ''}
+            for i in range(20)
+        ],
+        'total_pages': 1,
+    }
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failures = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+
+def make_handler(args, stats):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API
+
+        def do_GET(self):
+            with stats.lock:
+                stats.requests += 1
+                stats.in_flight += 1
+                stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            try:
+                time.sleep(max(0.0, random.gauss(args.latency_ms, args.latency_ms * 0.1)) / 1000)
+                path = urlparse(self.path).path
+                if path == '/stats':
+                    self.send_json(200, {'requests': stats.requests, 'failures': stats.failures,
+                                         'peak_in_flight': stats.peak_in_flight})
+                elif random.random() < args.fail_rate:
+                    with stats.lock:
+                        stats.failures += 1
+                    headers = {'Retry-After': '1'} if args.throttle else {}
+                    self.send_json(429 if args.throttle else 503, {'status_message': 'mock failure'}, headers)
+                else:
+                    self.send_json(200, payload_for(path))
+            finally:
+                with stats.lock:
+                    stats.in_flight -= 1
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+def serve(port=8765, latency_ms=100.0, fail_rate=0.0, throttle=False):
+    """Start the mock on a daemon thread; returns the server (call .shutdown() to stop)."""
+    args = argparse.Namespace(latency_ms=latency_ms, fail_rate=fail_rate, throttle=throttle)
+    server = ThreadingHTTPServer(('127.0.0.1', port), make_handler(args, Stats()))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency-ms', type=float, default=100.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--throttle', action='store_true', help='fail with 429 + Retry-After instead of 503')
+    args = parser.parse_args()
+    server = serve(args.port, args.latency_ms, args.fail_rate, args.throttle)
+    print(f"Mock TMDB listening on http://127.0.0.1:{args.port}/3 (latency {args.latency_ms} ms)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""Build time of the title-neighbour recommender at increasing data sizes.
+
+Generates synthetic likes / my_list / trailers_watched interactions with a
+long-tail title popularity (a few titles are saved by many users, most by a
+handful) and times `compute_title_neighbors` from api/main.py on each size:
+
+    python bench/recommender_build.py
+    python bench/recommender_build.py --sizes 1e6 3e6 1e7 --users 500000 --titles 200000
+
+Needs numpy and scipy (the batch job's dependencies), plus the app's own
+requirements to import api/main.py. No database is used.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'api'))
+from main import RECOMMENDER_TOP_K, RECOMMENDER_WEIGHTS, compute_title_neighbors  # noqa: E402
+
+
+def synthetic_interactions(size, users, titles, seed):
+    """`size` (user, title, weight) rows; title ids follow a Zipf-like tail."""
+    rng = np.random.default_rng(seed)
+    user_ids = rng.integers(0, users, size)
+    title_ids = (rng.zipf(1.2, size) - 1) % titles
+    weights = rng.choice(list(RECOMMENDER_WEIGHTS.values()), size).astype(np.float32)
+    return user_ids, title_ids, weights
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=float, nargs='+', default=[1e5, 1e6, 3e6],
+                        help='interaction counts to time (default 1e5 1e6 3e6)')
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--titles', type=int, default=100000)
+    parser.add_argument('--top-k', type=int, default=RECOMMENDER_TOP_K)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'interactions':>13} {'titles':>8} {'neighbours':>11} {'build s':>9} {'rows/s':>11}")
+    for size in (int(s) for s in args.sizes):
+        users, items, weights = synthetic_interactions(size, args.users, args.titles, args.seed)
+        started = time.perf_counter()
+        item_idx, _, _, _ = compute_title_neighbors(users, items, weights, args.top_k)
+        elapsed = time.perf_counter() - started
+        print(f"{size:13d} {len(np.unique(items)):8d} {len(item_idx):11d} {elapsed:9.2f} {size / elapsed:11.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""Startup profile of api/main.py: import-time breakdown and time to first byte.
+
+Runs `python -X importtime` on the app module and reports the slowest
+imports, then starts the app in a fresh process and times how long the
+first response takes to arrive for each path:
+
+    python bench/startup_profile.py
+    python bench/startup_profile.py --path /static/css/styles.css --path /login
+    python bench/startup_profile.py --budget-ms 1500 --json
+
+With --budget-ms the exit status is 1 when any time to first byte exceeds
+the budget, so CI can catch cold-start regressions. Paths that need the
+database require POSTGRES_URL (or BENCH_POSTGRES_URL); static paths do not.
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+API_DIR = os.path.join(ROOT, 'api')
+
+SERVE = r"""
+import sys
+sys.path.insert(0, sys.argv[1])
+import main
+main.app.run(host='127.0.0.1', port=int(sys.argv[2]), use_reloader=False, threaded=True)
+"""
+
+
+def import_breakdown(env, top):
+    """Total import time of main plus its direct imports as (cumulative_us, self_us, module), slowest first."""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import sys; sys.path.insert(0, {API_DIR!r}); import main"],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"Importing api/main.py failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|', 2)
+        depth = (len(module) - len(module.lstrip()) - 1) // 2
+        rows.append((int(cumulative_us), int(self_us), module.strip(), depth))
+    # Children are printed before their parent, so main's direct imports are
+    # the depth-1 rows that precede it and follow the previous top-level row
+    main_index = max(i for i, r in enumerate(rows) if r[2] == 'main')
+    start = max((i for i, r in enumerate(rows[:main_index]) if r[3] == 0), default=-1) + 1
+    direct = [r[:3] for r in rows[start:main_index] if r[3] == 1]
+    return rows[main_index][0], sorted(direct, reverse=True)[:top]
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def time_to_first_byte(env, path, timeout):
+    """Seconds from process spawn until the first response byte for `path`."""
+    port = free_port()
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', SERVE, API_DIR, str(port)],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        while time.perf_counter() - started < timeout:
+            if proc.poll() is not None:
+                sys.exit(f"Server exited early:\n{proc.stderr.read().decode()[-2000:]}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=timeout) as response:
+                    response.read(1)
+                    return time.perf_counter() - started, response.status
+            except urllib.error.HTTPError as e:
+                return time.perf_counter() - started, e.code
+            except (ConnectionError, urllib.error.URLError):
+                time.sleep(0.01)
+        sys.exit(f"No response for {path} within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--path', action='append', help='path to request (repeatable; default /static/css/styles.css and /login)')
+    parser.add_argument('--top', type=int, default=15, help='number of slowest imports to list')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--budget-ms', type=float, help='fail when any time to first byte exceeds this')
+    parser.add_argument('--json', action='store_true', help='print a JSON report instead of text')
+    args = parser.parse_args()
+
+    env = dict(os.environ)
+    if env.get('BENCH_POSTGRES_URL'):
+        env['POSTGRES_URL'] = env['BENCH_POSTGRES_URL']
+
+    total_us, slowest = import_breakdown(env, args.top)
+    ttfb = {}
+    for path in args.path or ['/static/css/styles.css', '/login']:
+        seconds, status = time_to_first_byte(env, path, args.timeout)
+        ttfb[path] = {'ms': round(seconds * 1000, 1), 'status': status}
+
+    over_budget = [p for p, r in ttfb.items() if args.budget_ms and r['ms'] > args.budget_ms]
+    if args.json:
+        print(json.dumps({
+            'import_ms': round(total_us / 1000, 1),
+            'slowest_imports': [{'module': m, 'cumulative_ms': round(c / 1000, 1), 'self_ms': round(s / 1000, 1)}
+                                for c, s, m in slowest],
+            'ttfb': ttfb,
+            'budget_ms': args.budget_ms,
+            'over_budget': over_budget,
+        }, indent=2))
+    else:
+        print(f"import api/main.py: {total_us / 1000:.1f} ms")
+        print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+        for cumulative, self_us, module in slowest:
+            print(f"{cumulative / 1000:14.1f} {self_us / 1000:9.1f}  {module}")
+        print("time to first byte (process spawn -> first byte):")
+        for path, result in ttfb.items():
+            print(f"  {path:<30} {result['ms']:8.1f} ms  (HTTP {result['status']})")
+        for path in over_budget:
+            print(f"OVER BUDGET: {path} took {ttfb[path]['ms']} ms > {args.budget_ms} ms")
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,377 @@
+"""End-to-end benchmark of the hot endpoints against a seeded Postgres and mock TMDB.
+
+Starts a throwaway database, the mock TMDB (bench/mock_tmdb.py) and the app
+in a separate process. It then seeds users with My List, likes,
+notifications and due reminders, and drives scripted scenarios over HTTP:
+
+    login_storm        POST /login for every user at once
+    my_netflix         GET /my-netflix (server-rendered library)
+    notification_poll  first page of /api/notifications, then `since=` polls and unread counts
+    reminders          POST /api/me/reminders/process
+
+Each scenario reports throughput, p50/p99 latency and SQL statements per
+request (read from the Server-Timing header). With --check the exit status
+is 1 when a scenario breaks its limits in bench/budgets.json, so CI can
+catch regressions:
+
+    python bench/suite.py
+    python bench/suite.py --users 200 --concurrency 16 --check
+    python bench/suite.py --json > bench_output.json
+
+Postgres comes from BENCH_POSTGRES_URL (a scratch database is created on
+that server and dropped afterwards). Without it, initdb/pg_ctl on PATH are
+used to start a temporary cluster, or the `pgserver` package if installed.
+"""
+import argparse
+import glob
+import http.cookiejar
+import json
+import os
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, urlunparse
+
+import psycopg2
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_tmdb  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGETS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'budgets.json')
+PASSWORD = 'bench-password'
+CRON_SECRET = 'bench-secret'
+
+SERVE = r"""
+import sys
+sys.path.insert(0, sys.argv[1])
+import main
+main.app.run(host='127.0.0.1', port=int(sys.argv[2]), use_reloader=False, threaded=True)
+"""
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def with_database(url, name):
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(path=f'/{name}'))
+
+
+def start_postgres(workdir):
+    """Return (server URL, stop callable) for a Postgres the suite may create databases on."""
+    if os.environ.get('BENCH_POSTGRES_URL'):
+        return os.environ['BENCH_POSTGRES_URL'], lambda: None
+
+    bindirs = [os.path.dirname(shutil.which('initdb'))] if shutil.which('initdb') else []
+    bindirs += sorted(glob.glob('/usr/lib/postgresql/*/bin'), reverse=True)
+    for bindir in bindirs:
+        initdb, pg_ctl = os.path.join(bindir, 'initdb'), os.path.join(bindir, 'pg_ctl')
+        if not (os.path.exists(initdb) and os.path.exists(pg_ctl)):
+            continue
+        datadir, port = os.path.join(workdir, 'pgdata'), free_port()
+        subprocess.run([initdb, '-D', datadir, '-U', 'postgres', '-A', 'trust'], check=True, capture_output=True)
+        subprocess.run([pg_ctl, '-D', datadir, '-l', os.path.join(workdir, 'postgres.log'), '-w',
+                        '-o', f"-p {port} -k {workdir} -c listen_addresses=''", 'start'],
+                       check=True, capture_output=True)
+        stop = lambda: subprocess.run([pg_ctl, '-D', datadir, '-m', 'fast', 'stop'], capture_output=True)  # noqa: E731
+        return f'postgresql://postgres@/postgres?host={workdir}&port={port}', stop
+
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit('No Postgres: set BENCH_POSTGRES_URL, put initdb/pg_ctl on PATH, or pip install pgserver')
+    server = pgserver.get_server(os.path.join(workdir, 'pgserver'), cleanup_mode='stop')
+    return server.get_uri(), server.cleanup
+
+
+def seed(url, args):
+    """Users with collections, notifications and due reminders, all generated server-side."""
+    params = {
+        'users': args.users, 'titles': args.titles, 'my_list': args.my_list, 'likes': args.likes,
+        'notifications': args.notifications, 'reminders': args.reminders,
+        'hash': generate_password_hash(PASSWORD, os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')),
+    }
+    statements = [
+        """
+        INSERT INTO users (id, username, password_hash, email)
+        SELECT gen_random_uuid(), 'bench' || i, %(hash)s, 'bench' || i || '@example.com'
+        FROM generate_series(1, %(users)s) i
+        """,
+        """
+        INSERT INTO titles (media_type, tmdb_id, data)
+        SELECT CASE WHEN i %% 3 = 0 THEN 'tv' ELSE 'movie' END, i,
+               jsonb_build_object('title', 'Title ' || i, 'name', 'Title ' || i, 'poster_path', '/p' || i || '.jpg',
+                                  'backdrop_path', '/b' || i || '.jpg', 'vote_average', 7.0, 'overview', 'Seeded by bench/suite.py')
+        FROM generate_series(1, %(titles)s) i
+        """,
+        """
+        INSERT INTO my_list (user_id, media_type, tmdb_id)
+        SELECT u.id, t.media_type, t.tmdb_id
+        FROM users u CROSS JOIN generate_series(1, %(my_list)s) g
+        JOIN titles t ON t.tmdb_id = 1 + abs(hashtext(u.id::text || 'l' || g)) %% %(titles)s
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        INSERT INTO likes (user_id, media_type, tmdb_id)
+        SELECT u.id, t.media_type, t.tmdb_id
+        FROM users u CROSS JOIN generate_series(1, %(likes)s) g
+        JOIN titles t ON t.tmdb_id = 1 + abs(hashtext(u.id::text || 'k' || g)) %% %(titles)s
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        INSERT INTO collection_versions (user_id, collection, version)
+        SELECT id, c, 1 FROM users, unnest(ARRAY['my_list', 'likes', 'notifications', 'reminders']) c
+        """,
+        "INSERT INTO notification_settings (user_id) SELECT id FROM users",
+        """
+        INSERT INTO notifications (user_id, title, message, media_type, tmdb_id, notification_type, is_read,
+                                   created_at, expires_at)
+        SELECT u.id, 'Title ' || g, 'Title ' || g || ' is now available', 'movie', g, 'new_movie', g > 10,
+               CURRENT_TIMESTAMP - g * interval '1 hour', CURRENT_TIMESTAMP + interval '30 days'
+        FROM users u, generate_series(1, %(notifications)s) g
+        """,
+        """
+        INSERT INTO reminders (user_id, tmdb_id, media_type, title, release_date)
+        SELECT u.id, 1000000 + g, 'movie', 'Upcoming ' || g, CURRENT_DATE - 1
+        FROM users u, generate_series(1, %(reminders)s) g
+        """,
+        "ANALYZE",
+    ]
+    with psycopg2.connect(url) as conn:
+        with conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement, params)
+
+
+class NoRedirect(urllib.request.HTTPRedirectHandler):
+    """Surface redirects as responses, so a lost session (302 to /login) counts as an error."""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+
+class Client:
+    """One browser: a cookie jar and a urllib opener that does not follow redirects."""
+
+    def __init__(self, base, index):
+        self.base = base
+        self.index = index
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), NoRedirect())
+        self.poll_cursor = None
+        self.etag = None
+
+    def request(self, method, path, body=None, headers=None):
+        """Returns (status, seconds, sql statements, response headers, body bytes)."""
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.base + path, data=data, method=method, headers=headers or {})
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        started = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=60) as response:
+                payload = response.read()
+                status, response_headers = response.status, response.headers
+        except urllib.error.HTTPError as e:
+            payload, status, response_headers = e.read(), e.code, e.headers
+        elapsed = time.perf_counter() - started
+        return status, elapsed, sql_statements(response_headers.get('Server-Timing', '')), response_headers, payload
+
+
+def sql_statements(server_timing):
+    for metric in server_timing.split(','):
+        parts = [p.strip() for p in metric.split(';')]
+        if parts[0] == 'db':
+            for part in parts[1:]:
+                if part.startswith('desc='):
+                    return int(part[5:].strip('"'))
+    return 0
+
+
+# Each scenario step takes a logged-in Client and returns a list of Client.request results
+def login(client, patience=120):
+    """Retries after Retry-After for up to `patience` seconds while the hashing queue sheds load."""
+    results = []
+    deadline = time.monotonic() + patience
+    while True:
+        result = client.request('POST', '/login', {'identifier': f'bench{client.index}', 'password': PASSWORD})
+        results.append(result)
+        if result[0] != 503 or time.monotonic() > deadline:
+            return results
+        time.sleep(float(result[3].get('Retry-After') or 1))
+
+
+def my_netflix(client):
+    return [client.request('GET', '/my-netflix')]
+
+
+def notification_poll(client):
+    results = []
+    if client.poll_cursor is None:
+        result = client.request('GET', '/api/notifications?limit=50')
+        client.poll_cursor = result[3].get('X-Poll-Cursor')
+        results.append(result)
+    since = f'&since={client.poll_cursor}' if client.poll_cursor else ''
+    headers = {'If-None-Match': client.etag} if client.etag else {}
+    result = client.request('GET', f'/api/notifications?limit=50{since}', headers=headers)
+    client.etag = result[3].get('ETag') or client.etag
+    results.append(result)
+    results.append(client.request('GET', '/api/notifications/unread-count'))
+    return results
+
+
+def process_reminders(client):
+    return [client.request('POST', '/api/me/reminders/process')]
+
+
+SCENARIOS = [
+    ('login_storm', login, 1),
+    ('my_netflix', my_netflix, None),
+    ('notification_poll', notification_poll, None),
+    ('reminders', process_reminders, 1),
+]
+
+
+def run_scenario(clients, step, rounds, concurrency):
+    tasks = [client for _ in range(rounds) for client in clients]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = [r for batch in pool.map(step, tasks) for r in batch]
+    wall = time.perf_counter() - started
+    latencies = sorted(r[1] for r in results)
+    queries = [r[2] for r in results]
+    # 503s are load shedding (see PasswordHasher); anything else outside 2xx/304 is a failure
+    shed = sum(1 for r in results if r[0] == 503)
+    errors = sum(1 for r in results if r[0] >= 300 and r[0] not in (304, 503))
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'shed': shed,
+        'throughput_rps': round(len(results) / wall, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 1),
+        'p99_ms': round(latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000, 1),
+        'queries_per_request': round(statistics.mean(queries), 2),
+        'max_queries': max(queries),
+    }
+
+
+RATES = {'error_rate': 'errors', 'shed_rate': 'shed'}
+
+
+def check_budgets(report, budgets):
+    failures = []
+    for name, result in report.items():
+        for metric, limit in budgets.get(name, {}).items():
+            if metric in RATES:
+                value = round(result[RATES[metric]] / max(1, result['requests']), 3)
+            else:
+                value = result[metric]
+            if value > limit:
+                failures.append(f"{name}: {metric} {value} > budget {limit}")
+    return failures
+
+
+def wait_for(url, proc, log, timeout):
+    started = time.perf_counter()
+    while time.perf_counter() - started < timeout:
+        if proc.poll() is not None:
+            with open(log) as f:
+                sys.exit(f"App exited early:\n{f.read()[-2000:]}")
+        try:
+            with urllib.request.urlopen(url, timeout=timeout):
+                return
+        except urllib.error.HTTPError:
+            return
+        except (ConnectionError, urllib.error.URLError):
+            time.sleep(0.05)
+    sys.exit(f"App did not answer {url} within {timeout}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--titles', type=int, default=5000)
+    parser.add_argument('--my-list', type=int, default=40, help='My List titles per user')
+    parser.add_argument('--likes', type=int, default=60, help='liked titles per user')
+    parser.add_argument('--notifications', type=int, default=200, help='notifications per user')
+    parser.add_argument('--reminders', type=int, default=3, help='due reminders per user')
+    parser.add_argument('--rounds', type=int, default=3, help='repetitions of the read scenarios per user')
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--tmdb-latency-ms', type=float, default=50.0)
+    parser.add_argument('--check', action='store_true', help='exit 1 when a budget in bench/budgets.json is exceeded')
+    parser.add_argument('--json', action='store_true', help='print a JSON report instead of text')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='netflix-bench-')
+    server_url, stop_postgres = start_postgres(workdir)
+    database = f'netflix_bench_{os.getpid()}'
+    admin = psycopg2.connect(server_url)
+    admin.autocommit = True
+    admin.cursor().execute(f'CREATE DATABASE {database}')
+    app_proc = tmdb = None
+    try:
+        db_url = with_database(server_url, database)
+        tmdb_port, app_port = free_port(), free_port()
+        tmdb = mock_tmdb.serve(tmdb_port, args.tmdb_latency_ms)
+        env = dict(os.environ, POSTGRES_URL=db_url, TMDB_API_BASE=f'http://127.0.0.1:{tmdb_port}/3',
+                   TMDB_API_KEY='bench', CRON_SECRET=CRON_SECRET, REQUEST_LOG='0',
+                   CATALOG_REFRESH_INTERVAL='0', DB_POOL_MAX=str(max(10, args.concurrency)))
+        env.pop('VERCEL', None)
+
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'api/main.py', 'migrate'],
+                       cwd=ROOT, env=env, check=True, capture_output=True)
+        seed(db_url, args)
+
+        # The dev server logs every request; a file never fills up the way an undrained pipe does
+        app_log = os.path.join(workdir, 'app.log')
+        with open(app_log, 'wb') as log:
+            app_proc = subprocess.Popen([sys.executable, '-c', SERVE, os.path.join(ROOT, 'api'), str(app_port)],
+                                        cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+        base = f'http://127.0.0.1:{app_port}'
+        wait_for(base + '/login', app_proc, app_log, 30)
+
+        clients = [Client(base, i) for i in range(1, args.users + 1)]
+        report = {}
+        for name, step, rounds in SCENARIOS:
+            report[name] = run_scenario(clients, step, rounds or args.rounds, args.concurrency)
+    finally:
+        if app_proc is not None:
+            app_proc.terminate()
+            app_proc.wait()
+        if tmdb is not None:
+            tmdb.shutdown()
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS {database} WITH (FORCE)')
+        admin.close()
+        stop_postgres()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(BUDGETS) as f:
+        failures = check_budgets(report, json.load(f)) if args.check else []
+    if args.json:
+        print(json.dumps({'config': vars(args), 'scenarios': report, 'over_budget': failures}, indent=2))
+    else:
+        print(f"{args.users} users, concurrency {args.concurrency}")
+        print(f"{'scenario':<18} {'requests':>8} {'errors':>6} {'shed':>6} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'queries/req':>11}")
+        for name, r in report.items():
+            print(f"{name:<18} {r['requests']:8d} {r['errors']:6d} {r['shed']:6d} {r['throughput_rps']:8.1f} "
+                  f"{r['p50_ms']:8.1f} {r['p99_ms']:8.1f} {r['queries_per_request']:11.2f}")
+        for failure in failures:
+            print(f"OVER BUDGET: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
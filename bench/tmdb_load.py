@@ -0,0 +1,106 @@
+"""Load test of the server-side TMDB path against bench/mock_tmdb.py.
+
+Starts the mock, then in a fresh interpreter imports api/main.py with
+TMDB_API_BASE pointed at it and drives `fetch_title_details` (what
+POST /api/titles/batch and the catalog builder use) from several request
+threads at once. Every title id is unique, so each one is a real upstream
+call. Reports titles per second and latency per batch.
+
+    python bench/tmdb_load.py --threads 8 --batches 40 --latency-ms 120
+    python bench/tmdb_load.py --baseline HEAD~1   # compare with an older revision
+
+The working tree imports without a database. Older revisions may connect at
+import time and need POSTGRES_URL (or BENCH_POSTGRES_URL).
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import mock_tmdb  # noqa: E402
+from cold_start import ROOT, checkout  # noqa: E402
+
+CHILD = r"""
+import json, sys, threading, time
+sys.path.insert(0, sys.argv[1])
+threads, batches, batch_size = int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+import main
+
+latencies, errors = [], 0
+lock = threading.Lock()
+counter = iter(range(batches))
+
+def worker(thread_index):
+    global errors
+    for batch in iter(lambda: next(counter, None), None):
+        base = 1_000_000 + batch * batch_size
+        items = [('movie', base + i, '') for i in range(batch_size)]
+        started = time.perf_counter()
+        results = main.fetch_title_details(items)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            errors += sum(1 for v in results.values() if not isinstance(v, dict))
+
+started = time.perf_counter()
+pool = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+for t in pool: t.start()
+for t in pool: t.join()
+wall = time.perf_counter() - started
+latencies.sort()
+print(json.dumps({
+    'titles': batches * batch_size, 'errors': errors, 'wall_s': wall,
+    'titles_per_s': batches * batch_size / wall,
+    'batch_p50_ms': latencies[len(latencies) // 2] * 1000,
+    'batch_p95_ms': latencies[int(len(latencies) * 0.95) - 1] * 1000,
+}))
+"""
+
+
+def run(api_dir, args, env):
+    out = subprocess.run(
+        [sys.executable, '-c', CHILD, api_dir, str(args.threads), str(args.batches), str(args.batch_size)],
+        cwd=os.path.dirname(api_dir), env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def report(label, result):
+    print(f"{label}: {result['titles_per_s']:8.1f} titles/s   "
+          f"batch p50 {result['batch_p50_ms']:7.1f} ms   p95 {result['batch_p95_ms']:7.1f} ms   "
+          f"errors {result['errors']}/{result['titles']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=8, help='concurrent request threads')
+    parser.add_argument('--batches', type=int, default=40)
+    parser.add_argument('--batch-size', type=int, default=50)
+    parser.add_argument('--latency-ms', type=float, default=100.0, help='mock TMDB response time')
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--baseline', help='git ref to compare against, e.g. HEAD~1')
+    args = parser.parse_args()
+
+    server = mock_tmdb.serve(args.port, args.latency_ms, args.fail_rate)
+    env = dict(os.environ,
+               TMDB_API_BASE=f"http://127.0.0.1:{args.port}/3",
+               TMDB_API_KEY='bench',
+               TMDB_SHARED_CACHE='0',
+               CATALOG_REFRESH_INTERVAL='0')
+    if env.get('BENCH_POSTGRES_URL'):
+        env['POSTGRES_URL'] = env['BENCH_POSTGRES_URL']
+    try:
+        if args.baseline:
+            with tempfile.TemporaryDirectory() as workdir:
+                report(f"baseline {args.baseline}", run(checkout(args.baseline, workdir), args, env))
+        report("working tree", run(os.path.join(ROOT, 'api'), args, env))
+    finally:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
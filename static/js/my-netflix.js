@@ -1,4 +1,3 @@
-        const apiKey = 'f2d7ae9dee829174c475e32fe8f993dc';
         const posterBaseUrl = 'https://image.tmdb.org/t/p/w500';
         const backdropBaseUrl = 'https://image.tmdb.org/t/p/original';
         const playerBaseUrl = 'https://player.videasy.net';
@@ -8,6 +7,13 @@
         let unreadCount = 0;
         let notificationPollingInterval = null;
         let notificationWebSocket = null;
+        let notificationsPollCursor = null;
+
+        // Merge newly polled notifications ahead of the ones already shown
+        function mergeNotifications(fresh, existing) {
+            const seen = new Set(fresh.map(n => n.id));
+            return [...fresh, ...existing.filter(n => !seen.has(n.id))].slice(0, 50);
+        }
 
         const SERVER_SEED = (() => {
             try {
@@ -183,7 +189,7 @@
             }
 
             const playerUrl = `${playerBaseUrl}/${mediaType}/${itemId}`;
-            const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}&append_to_response=content_ratings`;
+            const url = `/api/tmdb/${mediaType}/${itemId}?append_to_response=content_ratings`;
 
             try {
                 let cachedReference = findCachedItem(mediaType, itemId);
@@ -453,7 +459,7 @@
             const cacheKey = `${mediaType}:${id}`;
             let fresh = MEDIA_DETAILS_CACHE.get(cacheKey);
             if (!fresh) {
-                fresh = await fetchData(`https://api.themoviedb.org/3/${mediaType}/${id}?api_key=${apiKey}`);
+                fresh = await fetchData(`/api/tmdb/${mediaType}/${id}`);
                 if (fresh) {
                     fresh.id = id;
                     fresh.media_type = mediaType;
@@ -472,8 +478,31 @@
             return hydrated;
         }
 
+        // Warm MEDIA_DETAILS_CACHE for every item missing artwork with one batched request
+        async function prefetchMediaDetails(items) {
+            const missing = [];
+            items.forEach(item => {
+                const normalized = normalizeMediaItem(item);
+                if (!normalized || normalized.poster_path) return;
+                const cacheKey = `${normalized.media_type}:${normalized.id}`;
+                if (!MEDIA_DETAILS_CACHE.has(cacheKey)) missing.push([normalized.media_type, normalized.id, '']);
+            });
+            for (let i = 0; i < missing.length; i += 50) {
+                try {
+                    const data = await apiSend('/api/titles/batch', 'POST', { items: missing.slice(i, i + 50) });
+                    (data.results || []).forEach(r => {
+                        if (!r.data) return;
+                        MEDIA_DETAILS_CACHE.set(`${r.media_type}:${r.tmdb_id}`, { ...r.data, id: r.tmdb_id, media_type: r.media_type });
+                    });
+                } catch (error) {
+                    console.warn('Batch title fetch failed:', error.message);
+                }
+            }
+        }
+
         async function hydrateItemCollection(items) {
             if (!Array.isArray(items) || items.length === 0) return [];
+            await prefetchMediaDetails(items);
             const hydrated = await Promise.all(items.map(item => hydrateMediaItem(item)));
             return hydrated.filter(Boolean);
         }
@@ -500,7 +529,7 @@
         }
 
         async function addTrailerToWatched(itemId, mediaType) {
-            const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`;
+            const url = `/api/tmdb/${mediaType}/${itemId}`;
             const itemData = await fetchData(url);
             if (itemData) {
                 const normalizedItem = normalizeMediaItem({ ...itemData, media_type: mediaType });
@@ -508,7 +537,7 @@
                 const trailersWatched = TRAILERS_WATCHED_CACHE || [];
                 const exists = trailersWatched.some(item => item.id == normalizedItem.id && item.media_type === normalizedItem.media_type);
                 if (!exists) {
-                    try { await apiSend('/api/me/trailers', 'POST', { tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }); } catch(e) { /* ignore */ }
+                    queueCollectionOp({ op: 'add', collection: 'trailers', tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }).catch(() => { /* ignore */ });
                     TRAILERS_WATCHED_CACHE = [normalizedItem, ...trailersWatched];
                     await displayTrailersWatched();
                 }
@@ -516,7 +545,7 @@
         }
 
         async function addToMyList(itemId, mediaType, buttonElement) {
-            const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`;
+            const url = `/api/tmdb/${mediaType}/${itemId}`;
             const rawData = await fetchData(url);
             if (!rawData) {
                 showToast('Error adding to My List');
@@ -532,12 +561,12 @@
             const existsIndex = myList.findIndex(item => item.id == normalizedItem.id && item.media_type === normalizedItem.media_type);
 
             if (existsIndex > -1) {
-                try { await apiSend('/api/me/my-list', 'DELETE', { tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type }); } catch(e) { /* ignore */ }
+                queueCollectionOp({ op: 'remove', collection: 'myList', tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type }).catch(() => { /* ignore */ });
                 myList.splice(existsIndex, 1);
                 MY_LIST_CACHE = myList;
                 showToast(`Removed "${displayTitle}" from My List`);
             } else {
-                try { await apiSend('/api/me/my-list', 'POST', { tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }); } catch(e) { /* ignore */ }
+                queueCollectionOp({ op: 'add', collection: 'myList', tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }).catch(() => { /* ignore */ });
                 myList.unshift(normalizedItem);
                 MY_LIST_CACHE = myList;
                 showToast(`Added "${displayTitle}" to My List`);
@@ -547,7 +576,7 @@
         }
 
         async function addToLikedList(itemId, mediaType, buttonElement) {
-            const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`;
+            const url = `/api/tmdb/${mediaType}/${itemId}`;
             const rawData = await fetchData(url);
             if (!rawData) {
                 showToast('Error updating Liked List');
@@ -563,12 +592,12 @@
             const existsIndex = likedList.findIndex(item => item.id == normalizedItem.id && item.media_type === normalizedItem.media_type);
 
             if (existsIndex > -1) {
-                try { await apiSend('/api/me/likes', 'DELETE', { tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type }); } catch(e) { /* ignore */ }
+                queueCollectionOp({ op: 'remove', collection: 'likes', tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type }).catch(() => { /* ignore */ });
                 likedList.splice(existsIndex, 1);
                 LIKED_LIST_CACHE = likedList;
                 showToast(`Removed "${displayTitle}" from Liked List`);
             } else {
-                try { await apiSend('/api/me/likes', 'POST', { tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }); } catch(e) { /* ignore */ }
+                queueCollectionOp({ op: 'add', collection: 'likes', tmdb_id: normalizedItem.id, media_type: normalizedItem.media_type, data: normalizedItem }).catch(() => { /* ignore */ });
                 likedList.unshift(normalizedItem);
                 LIKED_LIST_CACHE = likedList;
                 showToast(`Added "${displayTitle}" to Liked List`);
@@ -629,7 +658,7 @@
                                     const currentSeason = parts.length > 4 ? parts[4] : '1';
                                     const currentEpisode = parts.length > 5 ? parts[5] : '1';
                                     const nextEpisodeNumber = parseInt(currentEpisode, 10) + 1;
-                                    const seasonsUrl = `https://api.themoviedb.org/3/tv/${itemId}?api_key=${apiKey}`;
+                                    const seasonsUrl = `/api/tmdb/tv/${itemId}`;
                                     const seasonsData = await fetchData(seasonsUrl);
                                     const currentSeasonData = seasonsData?.seasons?.find(s => String(s.season_number) === String(currentSeason));
                                     if (currentSeasonData && nextEpisodeNumber <= currentSeasonData.episode_count) {
@@ -694,7 +723,7 @@
                     </div>
                 </div>`;
 
-            const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}&append_to_response=videos,content_ratings,credits`;
+            const url = `/api/tmdb/${mediaType}/${itemId}?append_to_response=videos,content_ratings,credits`;
             const data = await fetchData(url);
 
             if (!data) {
@@ -868,31 +897,15 @@
 
         // --- EVENT LISTENERS ---
         document.addEventListener('DOMContentLoaded', async function () {
-            // Load from server only, no local cache seeding for user lists
+            // The page is rendered with all three collections embedded; only fetch
+            // the combined library when that seed is missing.
             try {
-                const responses = await Promise.allSettled([
-                    apiGet('/api/me/my-list'),
-                    apiGet('/api/me/likes'),
-                    apiGet('/api/me/trailers')
-                ]);
-
-                if (responses[0].status === 'fulfilled') {
-                    MY_LIST_CACHE = normalizeCollection(responses[0].value || []);
-                } else if (responses[0].status === 'rejected') {
-                    console.warn('Failed to refresh My List from server', responses[0].reason);
-                }
-
-                if (responses[1].status === 'fulfilled') {
-                    LIKED_LIST_CACHE = normalizeCollection(responses[1].value || []);
-                } else if (responses[1].status === 'rejected') {
-                    console.warn('Failed to refresh Likes from server', responses[1].reason);
-                }
+                const hasSeed = ['myList', 'likes', 'trailers'].every(key => Array.isArray(SERVER_SEED[key]));
+                const library = hasSeed ? SERVER_SEED : await apiGet('/api/me/library');
 
-                if (responses[2].status === 'fulfilled') {
-                    TRAILERS_WATCHED_CACHE = normalizeCollection(responses[2].value || []);
-                } else if (responses[2].status === 'rejected') {
-                    console.warn('Failed to refresh Trailers from server', responses[2].reason);
-                }
+                MY_LIST_CACHE = normalizeCollection(library.myList || []);
+                LIKED_LIST_CACHE = normalizeCollection(library.likes || []);
+                TRAILERS_WATCHED_CACHE = normalizeCollection(library.trailers || []);
 
                 await Promise.all([
                     displayMyList(),
@@ -1055,7 +1068,7 @@
         }
 
         async function performSearch(query) {
-            const url = `https://api.themoviedb.org/3/search/multi?api_key=${apiKey}&query=${encodeURIComponent(query)}`;
+            const url = `/api/search?q=${encodeURIComponent(query)}`;
             const data = await fetchData(url);
             if (data) displaySearchResults(data.results, query);
         }
@@ -1094,11 +1107,19 @@
                     renderNotifications();
                 }
 
-                // 2) Fetch fresh notifications in background with cache busting
-                const allResponse = await fetch(`/api/notifications?limit=50&_t=${Date.now()}`);
+                // 2) Fetch fresh notifications in background; after the first load only
+                //    rows newer than the poll cursor come back
+                const since = notificationsPollCursor ? `&since=${encodeURIComponent(notificationsPollCursor)}` : '';
+                const allResponse = await fetch(`/api/notifications?limit=50${since}`, { cache: 'no-store' });
+                if (since && allResponse.status === 400) {
+                    // Cursor from an older server version; the next fetch does a full load
+                    notificationsPollCursor = null;
+                    return;
+                }
                 if (allResponse.ok) {
                     const allNotifications = await allResponse.json();
-                    notificationsCache = allNotifications;
+                    notificationsCache = since ? mergeNotifications(allNotifications, notificationsCache) : allNotifications;
+                    notificationsPollCursor = allResponse.headers.get('X-Poll-Cursor') || notificationsPollCursor;
                     cacheWrite(CACHE_KEYS.NOTIFICATIONS, notificationsCache);
                     updateNotificationBadge();
                     renderNotifications();
@@ -1122,6 +1143,7 @@
                 if (response.ok) {
                     const notifications = await response.json();
                     notificationsCache = notifications;
+                    notificationsPollCursor = response.headers.get('X-Poll-Cursor') || notificationsPollCursor;
                     updateNotificationBadge();
                     renderNotifications();
                 }
@@ -1267,8 +1289,30 @@
                 } catch (e) { /* ignore */ }
             })();
 
-            // Auto-refresh every 60s
-            setInterval(() => { fetchNotifications(); }, 60000);
+            // Live updates pushed by the server; poll every 60s only without EventSource
+            if (typeof openNotificationStream === 'function' && openNotificationStream()) {
+                window.addEventListener('notifications:notification', fetchNotifications);
+                window.addEventListener('notifications:resync', fetchNotifications);
+                window.addEventListener('notifications:read', (event) => {
+                    const { id, all } = event.detail || {};
+                    notificationsCache = notificationsCache.map(n => (all || n.id === id) ? { ...n, is_read: true } : n);
+                    cacheWrite(CACHE_KEYS.NOTIFICATIONS, notificationsCache);
+                    updateNotificationBadge();
+                    renderNotifications();
+                });
+                window.addEventListener('notifications:deleted', (event) => {
+                    notificationsCache = notificationsCache.filter(n => n.id !== (event.detail || {}).id);
+                    cacheWrite(CACHE_KEYS.NOTIFICATIONS, notificationsCache);
+                    updateNotificationBadge();
+                    renderNotifications();
+                });
+                window.addEventListener('notifications:reminder', (event) => {
+                    const titles = (event.detail || {}).titles || [];
+                    if (titles.length) showToast(`${titles[0].title || 'A title'} is now available`);
+                });
+            } else {
+                notificationPollingInterval = setInterval(() => { fetchNotifications(); }, 60000);
+            }
 
             // Setup mobile menu button
             const mobileMenuBtn = document.getElementById('mobile-menu-btn');
@@ -128,6 +128,38 @@ async function nh_fetchData(url) {
     }
 }
 
+// Fetch TMDB details for many titles in one round trip.
+// `items` is a list of [mediaType, id, append] tuples; returns a Map keyed by "type:id".
+async function nh_fetchTitleDetails(items) {
+    const details = new Map();
+    const chunks = [];
+    for (let i = 0; i < items.length; i += 50) chunks.push(items.slice(i, i + 50));
+    await Promise.all(chunks.map(async (chunk) => {
+        try {
+            const data = await nh_apiSend('/api/titles/batch', 'POST', { items: chunk });
+            (data.results || []).forEach(r => {
+                if (r.data) details.set(`${r.media_type}:${r.tmdb_id}`, r.data);
+            });
+        } catch (error) {
+            console.warn('Batch title fetch failed:', error.message);
+        }
+    }));
+    return details;
+}
+
+// Rows precomputed by the backend catalog refresher; null when no snapshot exists
+async function nh_catalogSection(name) {
+    if (typeof fetchCatalogSnapshot !== 'function') return null;
+    const snapshot = await fetchCatalogSnapshot('US');
+    const items = snapshot?.new_hot?.[name];
+    return items && items.length ? items : null;
+}
+
+function nh_trailerKey(details) {
+    const trailer = details?.videos?.results?.find(v => v.site === 'YouTube' && v.type === 'Trailer');
+    return trailer ? trailer.key : null;
+}
+
 function showToast(message) {
     const toast = document.getElementById('toast');
     toast.textContent = message;
@@ -178,18 +210,21 @@ async function loadComingSoon() {
                 return releaseDate >= today; // Only include releases from today onwards
             });
 
+            // Get detailed info from TMDB to get proper poster paths, trailers, and backdrop images
+            const upcoming = futureReleases.slice(0, 20); // Limit to 20 to avoid too many API calls
+            const detailsByKey = await nh_fetchTitleDetails(
+                upcoming
+                    .filter(item => item.tmdb_type && item.tmdb_id)
+                    .map(item => [item.tmdb_type, item.tmdb_id, 'videos,images'])
+            );
+
             // Convert Watchmode format to our expected format
-            for (const item of futureReleases.slice(0, 20)) { // Limit to 20 to avoid too many API calls
+            for (const item of upcoming) {
                 try {
-                    // Get detailed info from TMDB to get proper poster paths, trailers, and backdrop images
-                    const tmdbDetails = await nh_fetchData(`https://api.themoviedb.org/3/${item.tmdb_type}/${item.tmdb_id}?api_key=${apiKey}&append_to_response=videos,images`);
+                    const tmdbDetails = detailsByKey.get(`${item.tmdb_type}:${item.tmdb_id}`);
 
                     // Get trailer for coming soon items
-                    let trailerKey = null;
-                    if (tmdbDetails?.videos?.results) {
-                        const trailer = tmdbDetails.videos.results.find(v => v.site === 'YouTube' && v.type === 'Trailer');
-                        if (trailer) trailerKey = trailer.key;
-                    }
+                    const trailerKey = nh_trailerKey(tmdbDetails);
 
                     // Get horizontal backdrop image for coming soon items
                     let backdropPath = null;
@@ -270,22 +305,23 @@ async function loadEveryoneWatching() {
     container.innerHTML = createSkeletonCards();
 
     try {
-        const trendingData = await nh_fetchData(`https://api.themoviedb.org/3/trending/all/day?api_key=${apiKey}&region=US&language=en-US&page=1`);
+        const precomputed = await nh_catalogSection('everyone_watching');
+        if (precomputed) {
+            nh_displayContentRow(precomputed, container, 'mixed');
+            return;
+        }
+
+        const trendingData = await nh_fetchData(`/api/tmdb/trending/all/day?region=US&language=en-US&page=1`);
 
         if (trendingData?.results) {
             // Add trailer keys to trending items
-            const itemsWithTrailers = await Promise.all(trendingData.results.slice(0, 40).map(async (item) => {
-                try {
-                    const tmdbDetails = await nh_fetchData(`https://api.themoviedb.org/3/${item.media_type}/${item.id}?api_key=${apiKey}&append_to_response=videos`);
-                    let trailerKey = null;
-                    if (tmdbDetails?.videos?.results) {
-                        const trailer = tmdbDetails.videos.results.find(v => v.site === 'YouTube' && v.type === 'Trailer');
-                        if (trailer) trailerKey = trailer.key;
-                    }
-                    return { ...item, trailer_key: trailerKey };
-                } catch (error) {
-                    return { ...item, trailer_key: null };
-                }
+            const items = trendingData.results
+                .slice(0, 40)
+                .filter(item => item.media_type === 'movie' || item.media_type === 'tv');
+            const detailsByKey = await nh_fetchTitleDetails(items.map(item => [item.media_type, item.id, 'videos']));
+            const itemsWithTrailers = items.map(item => ({
+                ...item,
+                trailer_key: nh_trailerKey(detailsByKey.get(`${item.media_type}:${item.id}`))
             }));
 
             nh_displayContentRow(itemsWithTrailers, container, 'mixed');
@@ -304,22 +340,21 @@ async function loadTop10TVShows() {
     container.innerHTML = createSkeletonCards();
 
     try {
-        const tvData = await nh_fetchData(`https://api.themoviedb.org/3/trending/tv/day?api_key=${apiKey}&region=US&language=en-US&page=1`);
+        const precomputed = await nh_catalogSection('top_tv');
+        if (precomputed) {
+            nh_displayContentRow(precomputed, container, 'tv', true);
+            return;
+        }
+
+        const tvData = await nh_fetchData(`/api/tmdb/trending/tv/day?region=US&language=en-US&page=1`);
 
         if (tvData?.results) {
             // Add trailer keys to TV shows
-            const tvShowsWithTrailers = await Promise.all(tvData.results.slice(0, 10).map(async (item) => {
-                try {
-                    const tmdbDetails = await nh_fetchData(`https://api.themoviedb.org/3/tv/${item.id}?api_key=${apiKey}&append_to_response=videos`);
-                    let trailerKey = null;
-                    if (tmdbDetails?.videos?.results) {
-                        const trailer = tmdbDetails.videos.results.find(v => v.site === 'YouTube' && v.type === 'Trailer');
-                        if (trailer) trailerKey = trailer.key;
-                    }
-                    return { ...item, trailer_key: trailerKey };
-                } catch (error) {
-                    return { ...item, trailer_key: null };
-                }
+            const items = tvData.results.slice(0, 10);
+            const detailsByKey = await nh_fetchTitleDetails(items.map(item => ['tv', item.id, 'videos']));
+            const tvShowsWithTrailers = items.map(item => ({
+                ...item,
+                trailer_key: nh_trailerKey(detailsByKey.get(`tv:${item.id}`))
             }));
 
             nh_displayContentRow(tvShowsWithTrailers, container, 'tv', true);
@@ -338,22 +373,21 @@ async function loadTop10Movies() {
     container.innerHTML = createSkeletonCards();
 
     try {
-        const movieData = await nh_fetchData(`https://api.themoviedb.org/3/trending/movie/day?api_key=${apiKey}&region=US&language=en-US&page=1`);
+        const precomputed = await nh_catalogSection('top_movies');
+        if (precomputed) {
+            nh_displayContentRow(precomputed, container, 'movie', true);
+            return;
+        }
+
+        const movieData = await nh_fetchData(`/api/tmdb/trending/movie/day?region=US&language=en-US&page=1`);
 
         if (movieData?.results) {
             // Add trailer keys to movies
-            const moviesWithTrailers = await Promise.all(movieData.results.slice(0, 10).map(async (item) => {
-                try {
-                    const tmdbDetails = await nh_fetchData(`https://api.themoviedb.org/3/movie/${item.id}?api_key=${apiKey}&append_to_response=videos`);
-                    let trailerKey = null;
-                    if (tmdbDetails?.videos?.results) {
-                        const trailer = tmdbDetails.videos.results.find(v => v.site === 'YouTube' && v.type === 'Trailer');
-                        if (trailer) trailerKey = trailer.key;
-                    }
-                    return { ...item, trailer_key: trailerKey };
-                } catch (error) {
-                    return { ...item, trailer_key: null };
-                }
+            const items = movieData.results.slice(0, 10);
+            const detailsByKey = await nh_fetchTitleDetails(items.map(item => ['movie', item.id, 'videos']));
+            const moviesWithTrailers = items.map(item => ({
+                ...item,
+                trailer_key: nh_trailerKey(detailsByKey.get(`movie:${item.id}`))
             }));
 
             nh_displayContentRow(moviesWithTrailers, container, 'movie', true);
@@ -369,18 +403,19 @@ async function loadTop10Movies() {
 async function addToMyList(itemId, mediaType, button) {
     // Mirror main page: fetch full TMDB details to avoid null data
     try {
-        const details = await nh_fetchData(`https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`);
+        const details = await nh_fetchData(`/api/tmdb/${mediaType}/${itemId}`);
         const isAdded = button.classList.contains('added');
-        const method = isAdded ? 'DELETE' : 'POST';
-        const url = '/api/me/my-list';
 
-        const payload = {
+        const op = {
+            op: isAdded ? 'remove' : 'add',
+            collection: 'myList',
             tmdb_id: itemId,
             media_type: mediaType,
             data: details ? { ...details, media_type: mediaType } : undefined
         };
 
-        const response = await nh_apiSend(url, method, payload);
+        // Batched with any other My List changes made in the same moment
+        const response = await queueCollectionOp(op);
         if (response.success) {
             button.classList.toggle('added');
             const icon = button.querySelector('svg');
@@ -52,8 +52,6 @@ async function fetchData(url) {
     }
 }
 
-const apiKey = 'f2d7ae9dee829174c475e32fe8f993dc';
-
 function showToast(message) {
     const toast = document.getElementById('toast');
     toast.textContent = message;
@@ -70,6 +68,9 @@ function getUserIdForCache() {
     return el ? (el.textContent || '').trim() : 'default';
 }
 
+let NOTIFICATIONS = [];
+let NOTIFICATIONS_POLL_CURSOR = null;
+
 async function loadNotifications() {
     const notificationsList = document.getElementById('notifications-list');
     notificationsList.innerHTML = '<div class="loader"></div>';
@@ -85,8 +86,12 @@ async function loadNotifications() {
 
     // 2) Fetch fresh and update UI/cache
     try {
-        const notifications = await apiGet('/api/notifications?limit=50');
-        writeCache(CACHE_KEY, notifications || []);
+        const res = await fetch('/api/notifications?limit=50', { credentials: 'same-origin' });
+        if (!res.ok) throw new Error(`GET /api/notifications failed`);
+        const notifications = await res.json();
+        NOTIFICATIONS = notifications || [];
+        NOTIFICATIONS_POLL_CURSOR = res.headers.get('X-Poll-Cursor');
+        writeCache(CACHE_KEY, NOTIFICATIONS);
         displayNotifications(notifications);
     } catch (error) {
         console.error('Error loading notifications:', error);
@@ -96,6 +101,27 @@ async function loadNotifications() {
     }
 }
 
+// Fetch only notifications newer than the last one seen
+async function pollNotifications() {
+    if (!NOTIFICATIONS_POLL_CURSOR) return loadNotifications();
+    try {
+        const res = await fetch(`/api/notifications?limit=50&since=${encodeURIComponent(NOTIFICATIONS_POLL_CURSOR)}`, { credentials: 'same-origin' });
+        if (res.status === 400) {
+            // Cursor from an older server version; start over from a full load
+            NOTIFICATIONS_POLL_CURSOR = null;
+            return loadNotifications();
+        }
+        if (!res.ok) return;
+        const fresh = await res.json();
+        NOTIFICATIONS_POLL_CURSOR = res.headers.get('X-Poll-Cursor') || NOTIFICATIONS_POLL_CURSOR;
+        if (!fresh.length) return;
+        const seen = new Set(fresh.map(n => n.id));
+        NOTIFICATIONS = [...fresh, ...NOTIFICATIONS.filter(n => !seen.has(n.id))].slice(0, 50);
+        writeCache(`srv_notifications_v1_${getUserIdForCache()}`, NOTIFICATIONS);
+        displayNotifications(NOTIFICATIONS);
+    } catch (_) { /* keep current list */ }
+}
+
 function displayNotifications(notifications) {
     const notificationsList = document.getElementById('notifications-list');
 
@@ -172,7 +198,7 @@ async function loadUpcomingMovies() {
     container.innerHTML = '<div class="loader"></div>';
 
     try {
-        const data = await fetchData(`https://api.themoviedb.org/3/movie/upcoming?api_key=${apiKey}&language=en-US&page=1`);
+        const data = await fetchData(`/api/tmdb/movie/upcoming?language=en-US&page=1`);
         if (data?.results) {
             displayContentRow(data.results.slice(0, 20), container, 'movie');
         } else {
@@ -189,7 +215,7 @@ async function loadTrendingShows() {
     container.innerHTML = '<div class="loader"></div>';
 
     try {
-        const data = await fetchData(`https://api.themoviedb.org/3/trending/tv/week?api_key=${apiKey}&language=en-US&page=1`);
+        const data = await fetchData(`/api/tmdb/trending/tv/week?language=en-US&page=1`);
         if (data?.results) {
             displayContentRow(data.results.slice(0, 20), container, 'tv');
         } else {
@@ -206,7 +232,7 @@ async function loadPopularMovies() {
     container.innerHTML = '<div class="loader"></div>';
 
     try {
-        const data = await fetchData(`https://api.themoviedb.org/3/movie/popular?api_key=${apiKey}&language=en-US&page=1`);
+        const data = await fetchData(`/api/tmdb/movie/popular?language=en-US&page=1`);
         if (data?.results) {
             displayContentRow(data.results.slice(0, 20), container, 'movie');
         } else {
@@ -277,8 +303,22 @@ async function signOut() {
 
 document.addEventListener('DOMContentLoaded', () => {
     loadNotifications();
-    // Auto-refresh every 60s
-    setInterval(() => { loadNotifications(); }, 60000);
+    // Live updates pushed by the server; poll every 60s only without EventSource
+    if (typeof openNotificationStream === 'function' && openNotificationStream()) {
+        window.addEventListener('notifications:notification', pollNotifications);
+        window.addEventListener('notifications:resync', pollNotifications);
+        window.addEventListener('notifications:read', (event) => {
+            const { id, all } = event.detail || {};
+            NOTIFICATIONS = NOTIFICATIONS.map(n => (all || n.id === id) ? { ...n, is_read: true } : n);
+            displayNotifications(NOTIFICATIONS);
+        });
+        window.addEventListener('notifications:deleted', (event) => {
+            NOTIFICATIONS = NOTIFICATIONS.filter(n => n.id !== (event.detail || {}).id);
+            displayNotifications(NOTIFICATIONS);
+        });
+    } else {
+        setInterval(() => { pollNotifications(); }, 60000);
+    }
 
     // Setup mobile menu button
     const mobileMenuBtn = document.getElementById('mobile-menu-btn');
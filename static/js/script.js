@@ -1,4 +1,3 @@
-const apiKey = 'f2d7ae9dee829174c475e32fe8f993dc';
 const posterBaseUrl = 'https://image.tmdb.org/t/p/w500';
 const backdropBaseUrl = 'https://image.tmdb.org/t/p/original';
 const playerBaseUrl = 'https://player.videasy.net';
@@ -47,6 +46,50 @@ async function apiSend(path, method, body) {
     return res.json();
 }
 
+// My List / likes / trailers writes made within a short window are sent
+// together to /api/me/collections/batch instead of one request each.
+const COLLECTION_BATCH_DELAY_MS = 150;
+const COLLECTION_BATCH_MAX = 500;
+let pendingCollectionOps = [];
+let collectionFlushTimer = null;
+let COLLECTION_VERSIONS = {};
+
+function queueCollectionOp(op) {
+    return new Promise((resolve, reject) => {
+        pendingCollectionOps.push({ op, resolve, reject });
+        if (pendingCollectionOps.length >= COLLECTION_BATCH_MAX) {
+            flushCollectionOps();
+        } else if (!collectionFlushTimer) {
+            collectionFlushTimer = setTimeout(flushCollectionOps, COLLECTION_BATCH_DELAY_MS);
+        }
+    });
+}
+
+async function flushCollectionOps() {
+    clearTimeout(collectionFlushTimer);
+    collectionFlushTimer = null;
+    const batch = pendingCollectionOps;
+    pendingCollectionOps = [];
+    if (batch.length === 0) return;
+    try {
+        const data = await apiSend('/api/me/collections/batch', 'POST', { ops: batch.map(entry => entry.op) });
+        COLLECTION_VERSIONS = data.versions || COLLECTION_VERSIONS;
+        batch.forEach(entry => entry.resolve(data));
+    } catch (error) {
+        batch.forEach(entry => entry.reject(error));
+    }
+}
+
+// Don't lose a pending batch when the user navigates away mid-window
+window.addEventListener('pagehide', () => {
+    if (pendingCollectionOps.length === 0) return;
+    clearTimeout(collectionFlushTimer);
+    collectionFlushTimer = null;
+    const body = JSON.stringify({ ops: pendingCollectionOps.map(entry => entry.op) });
+    pendingCollectionOps = [];
+    navigator.sendBeacon('/api/me/collections/batch', new Blob([body], { type: 'application/json' }));
+});
+
 function createPosterCard(item, mediaType) {
     if (!item.poster_path) return null;
     const posterElement = document.createElement('div');
@@ -88,7 +131,7 @@ async function fetchAndPopulateHoverCard(card) {
     const mediaType = card.dataset.type;
     const itemId = card.dataset.id;
     const playerUrl = `${playerBaseUrl}/${mediaType}/${itemId}`;
-    const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}&append_to_response=content_ratings`;
+    const url = `/api/tmdb/${mediaType}/${itemId}?append_to_response=content_ratings`;
 
     const data = await fetchData(url);
     if (!data) return;
@@ -189,36 +232,16 @@ function shuffleArray(array) {
     }
 }
 
-async function createAndDisplayShuffledRows() {
-    const mainContainer = document.getElementById('shuffled-rows-container');
-    if (!mainContainer) return; // Element not found on this page
-    // Helper to create skeleton rows
-    const createSkeletonRows = () => {
-        let skeletons = '';
-        for (let i = 0; i < 3; i++) {
-            skeletons += `
-                <div class="skeleton-row-container">
-                    <div class="skeleton-row-title skeleton"></div>
-                    <div class="skeleton-row-scroll">
-                        ${Array(6).fill('<div class="skeleton-card skeleton"></div>').join('')}
-                    </div>
-                </div>`;
-        }
-        return skeletons;
-    };
-
-    mainContainer.innerHTML = createSkeletonRows();
-
-    // Fetch user's location to get relevant trending data
-    let countryDetails = { region: 'US', countryName: 'the U.S.' };
-    try {
-        const geoResponse = await fetch('https://ipapi.co/json/');
-        const geoData = await geoResponse.json();
-        if (geoData && geoData.country_code) {
-            countryDetails = { region: geoData.country_code, countryName: geoData.country_name };
-        }
-    } catch (error) { console.warn('Could not fetch user location, defaulting to US.', error); }
+// Precomputed browse / New & Hot rows built by the backend refresher (see /api/catalog)
+const CATALOG_SNAPSHOTS = {};
+function fetchCatalogSnapshot(region = 'US') {
+    if (!CATALOG_SNAPSHOTS[region]) {
+        CATALOG_SNAPSHOTS[region] = apiGet(`/api/catalog/${region}`).catch(() => null);
+    }
+    return CATALOG_SNAPSHOTS[region];
+}
 
+async function fetchRowsFromTMDB(countryDetails) {
     // 1. Define all rows to be displayed, including trending and custom categories
     const allRowDefinitions = [
         // Trending Rows
@@ -226,13 +249,13 @@ async function createAndDisplayShuffledRows() {
             name: `Top 10 Movies in ${countryDetails.countryName} Today`,
             type: 'movie',
             isRanked: true,
-            url: `https://api.themoviedb.org/3/trending/movie/day?api_key=${apiKey}&region=${countryDetails.region}`
+            url: `/api/tmdb/trending/movie/day?region=${countryDetails.region}`
         },
         {
             name: `Top 10 TV Shows in ${countryDetails.countryName} Today`,
             type: 'tv',
             isRanked: true,
-            url: `https://api.themoviedb.org/3/trending/tv/day?api_key=${apiKey}&region=${countryDetails.region}`
+            url: `/api/tmdb/trending/tv/day?region=${countryDetails.region}`
         },
         // Custom Category Rows
         ...customCategories.slice(0, 8).map(category => {
@@ -244,7 +267,7 @@ async function createAndDisplayShuffledRows() {
                 name: title,
                 type: category.type,
                 isRanked: false,
-                url: `https://api.themoviedb.org/3/discover/${category.type}?api_key=${apiKey}&${category.params}`
+                url: `/api/tmdb/discover/${category.type}?${category.params}`
             }
         })
     ];
@@ -254,7 +277,7 @@ async function createAndDisplayShuffledRows() {
     const allResults = await Promise.all(rowDataPromises);
 
     // 3. Prepare a list of renderable rows (filter out failed fetches or empty results)
-    let renderableRows = [];
+    const renderableRows = [];
     allResults.forEach((data, index) => {
         if (data?.results && data.results.length > 0) {
             renderableRows.push({
@@ -265,6 +288,58 @@ async function createAndDisplayShuffledRows() {
             });
         }
     });
+    return renderableRows;
+}
+
+async function createAndDisplayShuffledRows() {
+    const mainContainer = document.getElementById('shuffled-rows-container');
+    if (!mainContainer) return; // Element not found on this page
+    // Helper to create skeleton rows
+    const createSkeletonRows = () => {
+        let skeletons = '';
+        for (let i = 0; i < 3; i++) {
+            skeletons += `
+                <div class="skeleton-row-container">
+                    <div class="skeleton-row-title skeleton"></div>
+                    <div class="skeleton-row-scroll">
+                        ${Array(6).fill('<div class="skeleton-card skeleton"></div>').join('')}
+                    </div>
+                </div>`;
+        }
+        return skeletons;
+    };
+
+    mainContainer.innerHTML = createSkeletonRows();
+    // Personal row from precomputed title neighbours (empty until the recommender has run)
+    const topPicksPromise = apiGet('/api/me/recommendations').catch(() => null);
+
+    // Fetch user's location to get relevant trending data
+    let countryDetails = { region: 'US', countryName: 'the U.S.' };
+    try {
+        const geoResponse = await fetch('https://ipapi.co/json/');
+        const geoData = await geoResponse.json();
+        if (geoData && geoData.country_code) {
+            countryDetails = { region: geoData.country_code, countryName: geoData.country_name };
+        }
+    } catch (error) { console.warn('Could not fetch user location, defaulting to US.', error); }
+
+    // Render from the precomputed snapshot when the backend has one for this region
+    let renderableRows;
+    const snapshot = await fetchCatalogSnapshot(countryDetails.region);
+    if (snapshot?.browse?.rows?.length) {
+        const rankedTitles = {
+            trending_movie: `Top 10 Movies in ${countryDetails.countryName} Today`,
+            trending_tv: `Top 10 TV Shows in ${countryDetails.countryName} Today`
+        };
+        renderableRows = snapshot.browse.rows.map(row => ({
+            title: rankedTitles[row.key] || row.name,
+            type: row.type,
+            isRanked: row.is_ranked,
+            items: row.items
+        }));
+    } else {
+        renderableRows = await fetchRowsFromTMDB(countryDetails);
+    }
 
     // 4. Shuffle the list of categories
     shuffleArray(renderableRows);
@@ -285,12 +360,17 @@ async function createAndDisplayShuffledRows() {
         }
     }
 
+    const topPicks = await topPicksPromise;
+    if (topPicks?.results?.length) {
+        renderableRows.unshift({ title: 'Top Picks for You', type: null, isRanked: false, items: topPicks.results });
+    }
+
     // 6. Render the final shuffled and adjusted list of rows
     mainContainer.innerHTML = ''; // Clear loader
     renderableRows.forEach(rowData => {
         const row = document.createElement('div');
         row.classList.add('content-row');
-        row.dataset.contentType = rowData.type; // Set for filtering logic
+        row.dataset.contentType = rowData.type || 'all'; // Set for filtering logic
 
         row.innerHTML = `<h2>${rowData.title}</h2><div class="content-scroll"></div>`;
         mainContainer.appendChild(row);
@@ -325,9 +405,9 @@ async function setupHeroSection(mediaType = 'all') {
     try {
         let trendingUrl;
         if (mediaType === 'all') {
-            trendingUrl = `https://api.themoviedb.org/3/trending/all/day?api_key=${apiKey}&language=en-US`;
+            trendingUrl = `/api/tmdb/trending/all/day?language=en-US`;
         } else {
-            trendingUrl = `https://api.themoviedb.org/3/trending/${mediaType}/day?api_key=${apiKey}&language=en-US`;
+            trendingUrl = `/api/tmdb/trending/${mediaType}/day?language=en-US`;
         }
 
         const trendingData = await fetchData(trendingUrl);
@@ -340,7 +420,7 @@ async function setupHeroSection(mediaType = 'all') {
             const playerUrl = `${playerBaseUrl}/${featuredMediaType}/${featured.id}`;
 
             if (isMobile) {
-                const detailsUrl = `https://api.themoviedb.org/3/${featuredMediaType}/${featured.id}?api_key=${apiKey}`;
+                const detailsUrl = `/api/tmdb/${featuredMediaType}/${featured.id}`;
                 const details = await fetchData(detailsUrl);
                 const genreTags = details.genres.slice(0, 5).map(g => `<span>${g.name}</span>`).join('');
                 const myList = MY_LIST_CACHE || [];
@@ -436,7 +516,7 @@ function openPlayerModal(url, mediaType, itemId) {
                 nextEpisodeButton.onclick = async () => {
                     const [_, __, currentSeason, currentEpisode] = url.split('/');
                     const nextEpisodeNumber = parseInt(currentEpisode) + 1;
-                    const seasonsUrl = `https://api.themoviedb.org/3/tv/${itemId}?api_key=${apiKey}`;
+                    const seasonsUrl = `/api/tmdb/tv/${itemId}`;
                     const seasonsData = await fetchData(seasonsUrl);
                     const currentSeasonData = seasonsData?.seasons?.find(s => s.season_number == currentSeason);
                     if (currentSeasonData && nextEpisodeNumber <= currentSeasonData.episode_count) {
@@ -515,7 +595,7 @@ async function openInfoModal(mediaType, itemId) {
 
     // Fetch details in background with timeout; then enhance UI
     const appendToResponse = 'videos,content_ratings,credits' + (mediaType === 'tv' ? ',season/1' : '');
-    const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}&append_to_response=${appendToResponse}`;
+    const url = `/api/tmdb/${mediaType}/${itemId}?append_to_response=${appendToResponse}`;
 
     const data = await fetchData(url);
     if (!data) {
@@ -638,7 +718,7 @@ async function openInfoModal(mediaType, itemId) {
         seasonButtons.forEach(btn => {
             btn.addEventListener('click', async () => {
                 const seasonNumber = btn.dataset.seasonNumber;
-                const episodesUrl = `https://api.themoviedb.org/3/tv/${itemId}/season/${seasonNumber}?api_key=${apiKey}`;
+                const episodesUrl = `/api/tmdb/tv/${itemId}/season/${seasonNumber}`;
                 const episodesData = await fetchData(episodesUrl);
                 if (episodesData && episodesData.episodes) {
                     const episodesListContainer = infoModal.querySelector('.episodes-list');
@@ -758,7 +838,7 @@ async function openActorWorksPopup(personId, personName) {
     `;
     actorWorksPopup.classList.add('active');
 
-    const url = `https://api.themoviedb.org/3/person/${personId}/combined_credits?api_key=${apiKey}`;
+    const url = `/api/tmdb/person/${personId}/combined_credits`;
     const data = await fetchData(url);
 
     if (!data || !data.cast) {
@@ -845,7 +925,7 @@ function closeSearch() {
 }
 
 async function performSearch(query) {
-    const url = `https://api.themoviedb.org/3/search/multi?api_key=${apiKey}&query=${encodeURIComponent(query)}`;
+    const url = `/api/search?q=${encodeURIComponent(query)}`;
     const data = await fetchData(url);
     if (data) displaySearchResults(data.results, query);
 }
@@ -873,11 +953,15 @@ function displaySearchResults(results, query) {
 document.addEventListener('DOMContentLoaded', initializePage);
 // Load server state before other UI wiring to reflect correct button states
 document.addEventListener('DOMContentLoaded', async () => {
-    // Load from server only, no local cache seeding for user lists
-    [MY_LIST_CACHE, LIKED_LIST_CACHE] = await Promise.all([
-        apiGet('/api/me/my-list'),
-        apiGet('/api/me/likes')
-    ]);
+    // Load from server only, no local cache seeding for user lists.
+    // Pages like My Netflix embed the library in the HTML, which saves the request.
+    let library = null;
+    try { library = JSON.parse(document.getElementById('my-netflix-payload')?.textContent || 'null'); } catch (_) { }
+    if (!library || !Array.isArray(library.myList) || !Array.isArray(library.likes)) {
+        library = await apiGet('/api/me/library');
+    }
+    MY_LIST_CACHE = library.myList || [];
+    LIKED_LIST_CACHE = library.likes || [];
     cacheWrite(CACHE_KEYS.MY_LIST, MY_LIST_CACHE);
     cacheWrite(CACHE_KEYS.LIKES, LIKED_LIST_CACHE);
 });
@@ -942,15 +1026,39 @@ function setupNavFiltering() {
     });
 }
 
+// Realtime notification events over Server-Sent Events. Each server event is
+// re-dispatched on window as `notifications:<type>`; `notifications:resync`
+// fires after a reconnect so pages can catch up on anything missed meanwhile.
+// Only servers with long-lived workers offer the stream (the page's body is
+// marked data-notification-stream); elsewhere pages keep polling.
+let NOTIFICATION_STREAM = null;
+function openNotificationStream() {
+    if (NOTIFICATION_STREAM || typeof EventSource === 'undefined') return NOTIFICATION_STREAM;
+    if (!document.body || !('notificationStream' in document.body.dataset)) return null;
+    NOTIFICATION_STREAM = new EventSource('/api/notifications/stream');
+    let opened = false;
+    NOTIFICATION_STREAM.addEventListener('open', () => {
+        if (opened) window.dispatchEvent(new CustomEvent('notifications:resync'));
+        opened = true;
+    });
+    ['notification', 'read', 'deleted', 'reminder'].forEach(type => {
+        NOTIFICATION_STREAM.addEventListener(type, (event) => {
+            let detail = {};
+            try { detail = JSON.parse(event.data); } catch (_) { }
+            window.dispatchEvent(new CustomEvent(`notifications:${type}`, { detail }));
+        });
+    });
+    return NOTIFICATION_STREAM;
+}
+
 document.addEventListener('DOMContentLoaded', () => {
     // Global notification badge updater (desktop header)
     const globalBadge = document.getElementById('global-notification-badge');
     async function refreshGlobalNotificationBadge() {
         try {
-            const res = await fetch('/api/notifications?limit=50', { credentials: 'same-origin' });
+            const res = await fetch('/api/notifications/unread-count', { credentials: 'same-origin' });
             if (!res.ok) return;
-            const all = await res.json();
-            const unread = Array.isArray(all) ? all.filter(n => !n.is_read).length : 0;
+            const unread = (await res.json()).count || 0;
             if (globalBadge) {
                 if (unread > 0) {
                     globalBadge.textContent = unread > 99 ? '99+' : String(unread);
@@ -962,7 +1070,13 @@ document.addEventListener('DOMContentLoaded', () => {
         } catch (_) { /* ignore */ }
     }
     refreshGlobalNotificationBadge();
-    setInterval(refreshGlobalNotificationBadge, 60000);
+    if (openNotificationStream()) {
+        ['notification', 'read', 'deleted', 'resync'].forEach(type => {
+            window.addEventListener(`notifications:${type}`, refreshGlobalNotificationBadge);
+        });
+    } else {
+        setInterval(refreshGlobalNotificationBadge, 60000);
+    }
     setupMobileFiltering();
     setupNavFiltering();
     setupMobileSearch();
@@ -1022,8 +1136,8 @@ async function loadMobileSearchResults() {
     mobileSearchResultsList.innerHTML = '<div class="loader"></div>';
 
     try {
-        const movieUrl = `https://api.themoviedb.org/3/trending/movie/day?api_key=${apiKey}&language=en-US`;
-        const tvUrl = `https://api.themoviedb.org/3/trending/tv/day?api_key=${apiKey}&language=en-US`;
+        const movieUrl = `/api/tmdb/trending/movie/day?language=en-US`;
+        const tvUrl = `/api/tmdb/trending/tv/day?language=en-US`;
 
         const [movieData, tvData] = await Promise.all([
             fetchData(movieUrl),
@@ -1045,7 +1159,7 @@ async function performMobileSearch(query) {
     mobileSearchResultsList.innerHTML = '<div class="loader"></div>';
 
     try {
-        const url = `https://api.themoviedb.org/3/search/multi?api_key=${apiKey}&query=${encodeURIComponent(query)}`;
+        const url = `/api/search?q=${encodeURIComponent(query)}`;
         const data = await fetchData(url);
 
         if (data?.results) {
@@ -1280,7 +1394,7 @@ async function loadNewHotPreview() {
 
     try {
         // Load trending content for preview
-        const trendingData = await fetchData(`https://api.themoviedb.org/3/trending/all/day?api_key=f2d7ae9dee829174c475e32fe8f993dc&language=en-US&page=1`);
+        const trendingData = await fetchData(`/api/tmdb/trending/all/day?language=en-US&page=1`);
         if (trendingData?.results) {
             displayContentRow(trendingData.results.slice(0, 6), container, 'mixed');
         } else {
@@ -1333,7 +1447,7 @@ function updateAllButtons(itemId, mediaType) {
 }
 
 async function addToMyList(itemId, mediaType) {
-    const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`;
+    const url = `/api/tmdb/${mediaType}/${itemId}`;
     const data = await fetchData(url);
     if (!data) {
         showToast('Error updating My List');
@@ -1343,12 +1457,12 @@ async function addToMyList(itemId, mediaType) {
     const existsIndex = myList.findIndex(item => item.id == itemId && (item.media_type || (item.title ? 'movie' : 'tv')) === mediaType);
 
     if (existsIndex > -1) {
-        try { await apiSend('/api/me/my-list', 'DELETE', { tmdb_id: itemId, media_type: mediaType }); } catch (e) { /* ignore */ }
+        queueCollectionOp({ op: 'remove', collection: 'myList', tmdb_id: itemId, media_type: mediaType }).catch(() => { /* ignore */ });
         myList.splice(existsIndex, 1);
         showToast(`Removed "${data.title || data.name}" from My List`);
     } else {
         data.media_type = mediaType;
-        try { await apiSend('/api/me/my-list', 'POST', { tmdb_id: itemId, media_type: mediaType, data }); } catch (e) { /* ignore */ }
+        queueCollectionOp({ op: 'add', collection: 'myList', tmdb_id: itemId, media_type: mediaType, data }).catch(() => { /* ignore */ });
         myList.unshift(data);
         showToast(`Added "${data.title || data.name}" to My List`);
     }
@@ -1358,7 +1472,7 @@ async function addToMyList(itemId, mediaType) {
 }
 
 async function addToLikedList(itemId, mediaType) {
-    const url = `https://api.themoviedb.org/3/${mediaType}/${itemId}?api_key=${apiKey}`;
+    const url = `/api/tmdb/${mediaType}/${itemId}`;
     const data = await fetchData(url);
     if (!data) {
         showToast('Error updating Liked List');
@@ -1367,12 +1481,12 @@ async function addToLikedList(itemId, mediaType) {
     let likedList = LIKED_LIST_CACHE || [];
     const existsIndex = likedList.findIndex(item => item.id == itemId && (item.media_type || (item.title ? 'movie' : 'tv')) === mediaType);
     if (existsIndex > -1) {
-        try { await apiSend('/api/me/likes', 'DELETE', { tmdb_id: itemId, media_type: mediaType }); } catch (e) { /* ignore */ }
+        queueCollectionOp({ op: 'remove', collection: 'likes', tmdb_id: itemId, media_type: mediaType }).catch(() => { /* ignore */ });
         likedList.splice(existsIndex, 1);
         showToast(`Removed "${data.title || data.name}" from Liked List`);
     } else {
         data.media_type = mediaType;
-        try { await apiSend('/api/me/likes', 'POST', { tmdb_id: itemId, media_type: mediaType, data }); } catch (e) { /* ignore */ }
+        queueCollectionOp({ op: 'add', collection: 'likes', tmdb_id: itemId, media_type: mediaType, data }).catch(() => { /* ignore */ });
         likedList.unshift(data);
         showToast(`Added "${data.title || data.name}" to Liked List`);
     }
@@ -0,0 +1,84 @@
+"""Shared fixtures: the app module against a scratch Postgres database.
+
+The tests need a real server. TEST_POSTGRES_URL (or the bench suite's
+BENCH_POSTGRES_URL) names one on which throwaway databases are created and
+dropped afterwards; without either the tests are skipped.
+"""
+import os
+import sys
+import uuid
+from urllib.parse import urlparse, urlunparse
+
+import psycopg2
+import pytest
+
+API_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'api')
+SERVER_URL = os.environ.get('TEST_POSTGRES_URL') or os.environ.get('BENCH_POSTGRES_URL')
+
+
+def with_database(url, name):
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(path=f'/{name}'))
+
+
+@pytest.fixture(scope='session')
+def create_database():
+    """Factory for empty databases on the test server, dropped at the end of the session."""
+    if not SERVER_URL:
+        pytest.skip('set TEST_POSTGRES_URL (or BENCH_POSTGRES_URL) to run the database tests')
+    admin = psycopg2.connect(SERVER_URL)
+    admin.autocommit = True
+    created = []
+
+    def create(label):
+        name = f'netflix_test_{os.getpid()}_{label}'
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+        admin.cursor().execute(f'CREATE DATABASE {name}')
+        created.append(name)
+        return with_database(SERVER_URL, name)
+
+    yield create
+    for name in created:
+        admin.cursor().execute(f'DROP DATABASE IF EXISTS {name} WITH (FORCE)')
+    admin.close()
+
+
+@pytest.fixture(scope='session')
+def main(create_database):
+    """api/main.py imported against a fully migrated database."""
+    os.environ.update(
+        POSTGRES_URL=create_database('app'), TMDB_API_KEY='test', TMDB_API_BASE='http://127.0.0.1:9/3',
+        REQUEST_LOG='0', CATALOG_REFRESH_INTERVAL='0', REALTIME_NOTIFICATIONS='0',
+    )
+    os.environ.pop('VERCEL', None)
+    sys.path.insert(0, API_DIR)
+    import main as module
+    module.get_pool()
+    yield module
+    module.pool.closeall()
+
+
+@pytest.fixture
+def user(main):
+    new_user, error = main.create_user(f'{uuid.uuid4().hex[:12]}@example.com', 'unused-hash')
+    assert new_user is not None, error
+    return new_user
+
+
+@pytest.fixture
+def client(main, user):
+    """Test client logged in as `user`."""
+    test_client = main.app.test_client()
+    with test_client.session_transaction() as session:
+        session['_user_id'] = str(user.id)
+        session['_fresh'] = True
+    return test_client
+
+
+@pytest.fixture
+def db(main):
+    """Autocommit connection for arranging and inspecting rows outside the app's pool."""
+    conn = psycopg2.connect(os.environ['POSTGRES_URL'])
+    conn.autocommit = True
+    yield conn
+    conn.close()
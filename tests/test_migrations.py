@@ -0,0 +1,100 @@
+"""The migration runner: fresh installs, upgrades and concurrent boots."""
+import json
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import psycopg2.errors
+import pytest
+
+
+@pytest.fixture
+def migration_pool(main, create_database):
+    """A pool on a new, empty database."""
+    pool = main.ConnectionPool(create_database(f'migrations_{uuid.uuid4().hex[:8]}'), minconn=1, maxconn=4)
+    yield pool
+    pool.closeall()
+
+
+def run(pool, sql, params=None):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            cur.execute(sql, params)
+            rows = cur.fetchall() if cur.description else None
+        conn.commit()
+        return rows
+    finally:
+        pool.putconn(conn)
+
+
+def migrate_to(main, monkeypatch, pool, version):
+    """Apply migrations up to and including `version`, as an older release would have."""
+    with monkeypatch.context() as patch:
+        patch.setattr(main, 'MIGRATIONS', [m for m in main.MIGRATIONS if m[0] <= version])
+        return main.apply_migrations(pool)
+
+
+def schema_version(main, pool):
+    conn = pool.getconn()
+    try:
+        with conn.cursor() as cur:
+            return main.current_schema_version(cur)
+    finally:
+        pool.putconn(conn)
+
+
+def test_fresh_database_gets_every_migration_once(main, migration_pool):
+    assert schema_version(main, migration_pool) == 0
+    assert main.apply_migrations(migration_pool) == [version for version, _, _ in main.MIGRATIONS]
+    assert main.apply_migrations(migration_pool) == []
+    assert schema_version(main, migration_pool) == main.SCHEMA_VERSION
+
+
+def test_concurrent_boots_migrate_once(main, migration_pool):
+    with ThreadPoolExecutor(2) as executor:
+        results = list(executor.map(lambda _: main.apply_migrations(migration_pool), range(2)))
+
+    assert sorted(results, key=len) == [[], [version for version, _, _ in main.MIGRATIONS]]
+    assert run(migration_pool, "SELECT COUNT(*) FROM schema_migrations") == [(main.SCHEMA_VERSION,)]
+
+
+def test_upgrade_moves_legacy_blobs_into_titles(main, monkeypatch, migration_pool):
+    migrate_to(main, monkeypatch, migration_pool, 6)
+    user_id = run(migration_pool, """
+        INSERT INTO users (id, username, password_hash, email)
+        VALUES (gen_random_uuid(), 'legacy', 'x', 'legacy@example.com')
+        RETURNING id
+    """)[0][0]
+    blob = {'title': 'Old Movie', 'poster_path': '/old.jpg', 'credits': {'cast': ['not kept']}}
+    for table in ('my_list', 'likes'):
+        run(migration_pool, f"INSERT INTO {table} (user_id, tmdb_id, media_type, data) VALUES (%s, 5, 'movie', %s)",
+            (user_id, json.dumps(blob)))
+
+    assert main.apply_migrations(migration_pool) == [version for version, _, _ in main.MIGRATIONS if version > 6]
+    assert run(migration_pool, "SELECT data FROM titles WHERE media_type = 'movie' AND tmdb_id = 5") == [
+        ({'title': 'Old Movie', 'poster_path': '/old.jpg'},)
+    ]
+    assert run(migration_pool, """
+        SELECT table_name FROM information_schema.columns
+        WHERE column_name = 'data' AND table_name IN ('my_list', 'likes', 'trailers_watched')
+    """) == []
+    assert run(migration_pool, "SELECT COUNT(*) FROM my_list") == [(1,)]
+
+
+def test_unique_email_keeps_legacy_duplicates_and_blocks_new_ones(main, monkeypatch, migration_pool):
+    migrate_to(main, monkeypatch, migration_pool, 14)
+    rows = run(migration_pool, """
+        INSERT INTO users (id, username, password_hash, email, created_at) VALUES
+            (gen_random_uuid(), 'first', 'x', 'Shared@example.com', CURRENT_TIMESTAMP - INTERVAL '1 day'),
+            (gen_random_uuid(), 'second', 'x', 'shared@example.com', CURRENT_TIMESTAMP)
+        RETURNING username, id
+    """)
+    ids = dict(rows)
+
+    main.apply_migrations(migration_pool)
+    assert run(migration_pool, "SELECT username, email_duplicate_of FROM users ORDER BY username") == [
+        ('first', None), ('second', ids['first'])
+    ]
+    with pytest.raises(psycopg2.errors.UniqueViolation):
+        run(migration_pool, "INSERT INTO users (id, username, password_hash, email) "
+                            "VALUES (gen_random_uuid(), 'third', 'x', 'SHARED@example.com')")
@@ -0,0 +1,90 @@
+"""`since=` polling of /api/notifications."""
+import os
+from datetime import datetime, timezone
+
+import psycopg2
+import pytest
+
+
+def notify(conn, user_id, title):
+    """Insert one notification in its own transaction (autocommit) or the caller's."""
+    with conn.cursor() as cur:
+        cur.execute("""
+            INSERT INTO notifications (user_id, title, message, media_type, tmdb_id, notification_type, expires_at)
+            VALUES (%s, %s, 'test', 'movie', 1, 'new_movie', CURRENT_TIMESTAMP + INTERVAL '1 day')
+            RETURNING id::text
+        """, (str(user_id), title))
+        return cur.fetchone()[0]
+
+
+def poll(client, since, limit=20):
+    response = client.get('/api/notifications', query_string={'since': since, 'limit': limit})
+    assert response.status_code == 200
+    return [n['id'] for n in response.get_json()], response.headers['X-Poll-Cursor']
+
+
+@pytest.fixture
+def cursor(client):
+    """Poll cursor from the first page, before the test adds anything."""
+    response = client.get('/api/notifications')
+    assert response.status_code == 200
+    return response.headers['X-Poll-Cursor']
+
+
+def test_poll_pages_through_more_rows_than_the_limit(client, db, user, cursor):
+    added = [notify(db, user.id, f'title {i}') for i in range(5)]
+
+    seen = []
+    for expected in (2, 2, 1, 0):
+        ids, cursor = poll(client, cursor, limit=2)
+        assert len(ids) == expected
+        seen += ids
+    assert sorted(seen) == sorted(added)
+
+
+def test_poll_returns_newest_first(client, db, user, cursor):
+    added = [notify(db, user.id, f'title {i}') for i in range(3)]
+
+    ids, _ = poll(client, cursor)
+    assert ids == added[::-1]
+
+
+def test_poll_waits_for_an_earlier_transaction_to_commit(client, db, user, cursor):
+    # The earlier transaction takes its xid first but commits last
+    slow = psycopg2.connect(os.environ['POSTGRES_URL'])
+    try:
+        late = notify(slow, user.id, 'slow')
+        fast = notify(db, user.id, 'fast')
+
+        ids, cursor = poll(client, cursor)
+        assert ids == []
+
+        slow.commit()
+        ids, cursor = poll(client, cursor)
+        assert sorted(ids) == sorted([late, fast])
+    finally:
+        slow.close()
+
+    assert poll(client, cursor)[0] == []
+
+
+def test_poll_is_not_modified_until_something_changes(client, db, user, cursor):
+    first = client.get('/api/notifications', query_string={'since': cursor})
+    again = client.get('/api/notifications', query_string={'since': cursor},
+                       headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.headers['X-Poll-Cursor'] == first.headers['X-Poll-Cursor']
+
+    notify(db, user.id, 'new')
+    changed = client.get('/api/notifications', query_string={'since': cursor},
+                         headers={'If-None-Match': first.headers['ETag']})
+    assert changed.status_code == 200
+    assert len(changed.get_json()) == 1
+
+
+def test_poll_rejects_malformed_and_legacy_cursors(client, main):
+    # Polls used to hand out (created_at, id) cursors; clients start over on a 400
+    legacy = main._encode_cursor(datetime.now(timezone.utc), main._NIL_UUID)
+    for since in ('not-a-cursor', legacy):
+        response = client.get('/api/notifications', query_string={'since': since})
+        assert response.status_code == 400
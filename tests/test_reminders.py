@@ -0,0 +1,76 @@
+"""Reminder dispatch: every due reminder fires exactly one notification."""
+from datetime import date, timedelta
+
+
+def remind(db, user_id, tmdb_id, days_from_today=0, media_type='movie'):
+    with db.cursor() as cur:
+        cur.execute("""
+            INSERT INTO reminders (user_id, tmdb_id, media_type, title, release_date)
+            VALUES (%s, %s, %s, %s, %s)
+        """, (str(user_id), tmdb_id, media_type, f'Title {tmdb_id}', date.today() + timedelta(days=days_from_today)))
+
+
+def notifications_for(db, user_id):
+    with db.cursor() as cur:
+        cur.execute("""
+            SELECT tmdb_id, notification_type, event_id IS NOT NULL FROM notifications
+            WHERE user_id = %s ORDER BY tmdb_id, event_id NULLS LAST
+        """, (str(user_id),))
+        return cur.fetchall()
+
+
+def pending(db, user_id):
+    with db.cursor() as cur:
+        cur.execute("SELECT tmdb_id FROM reminders WHERE user_id = %s AND NOT notified ORDER BY tmdb_id",
+                    (str(user_id),))
+        return [row[0] for row in cur.fetchall()]
+
+
+def test_dispatch_fires_due_reminders_only(main, db, user):
+    remind(db, user.id, 1, days_from_today=-3)
+    remind(db, user.id, 2, media_type='tv')
+    remind(db, user.id, 3, days_from_today=7)
+
+    assert main.dispatch_due_reminders(user_id=str(user.id)) == 2
+    assert notifications_for(db, user.id) == [(1, 'new_movie', False), (2, 'hot_show', False)]
+    assert pending(db, user.id) == [3]
+
+    assert main.dispatch_due_reminders(user_id=str(user.id)) == 0
+
+
+def test_feed_notification_does_not_swallow_a_reminder(main, db, user):
+    # The feed already told this user about the title; the reminder still fires
+    with db.cursor() as cur:
+        cur.execute("""
+            INSERT INTO notification_events (feed, notification_type, media_type, tmdb_id, title, message)
+            VALUES ('test', 'new_movie', 'movie', 42, 'Feed title', 'In the feed')
+            RETURNING id
+        """)
+        event_id = cur.fetchone()[0]
+        cur.execute("""
+            INSERT INTO notifications (user_id, event_id, media_type, tmdb_id, notification_type)
+            VALUES (%s, %s, 'movie', 42, 'new_movie')
+        """, (str(user.id), event_id))
+    remind(db, user.id, 42)
+
+    assert main.dispatch_due_reminders(user_id=str(user.id)) == 1
+    assert notifications_for(db, user.id) == [(42, 'new_movie', True), (42, 'new_movie', False)]
+    assert pending(db, user.id) == []
+
+
+def test_dispatch_loops_over_full_chunks(main, db, user):
+    for tmdb_id in range(1, 6):
+        remind(db, user.id, tmdb_id)
+
+    assert main.dispatch_due_reminders(user_id=str(user.id), chunk_size=2) == 5
+    assert len(notifications_for(db, user.id)) == 5
+    assert pending(db, user.id) == []
+
+
+def test_process_endpoint_reports_created_notifications(client, db, user):
+    remind(db, user.id, 7)
+    remind(db, user.id, 8)
+
+    response = client.post('/api/me/reminders/process')
+    assert response.get_json() == {'success': True, 'notifications_created': 2}
+    assert client.get('/api/notifications/unread-count').get_json() == {'count': 2}